@@ -0,0 +1,99 @@
+"""
+触发规则微基准：对比旧的逐词扫描和预编译匹配器的每秒处理消息数
+
+用法: python benchmarks/bench_trigger.py [--words 6] [--messages 5000] [--rounds 20]
+"""
+from pathlib import Path
+import argparse
+import importlib.util
+import random
+import time
+
+from nonebot.adapters.onebot.v11 import Message, MessageSegment
+
+root_path = Path(__file__).resolve().parents[1]
+
+# 直接按文件加载，避免导入插件包时初始化 NoneBot 和模型
+spec = importlib.util.spec_from_file_location(
+    "trigger", root_path / "plugins" / "llm_chat" / "trigger.py"
+)
+trigger = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(trigger)
+
+BASE_WORDS = ["剑来", "剑仙", "@剑仙", "AI剑仙", "柳如烟", "@AI剑仙"]
+FILLER = "今天群里好热闹啊，大家晚饭吃的什么，有没有人一起打游戏"
+
+
+def legacy_rule(message: Message, trigger_mode, trigger_words) -> bool:
+    """改造前的 chat_rule 实现(不含 @ 判断)"""
+    msg = str(message)
+    if "keyword" in trigger_mode:
+        for word in trigger_words:
+            if word in msg:
+                return True
+    if "prefix" in trigger_mode:
+        for word in trigger_words:
+            if msg.startswith(word):
+                return True
+    return False
+
+
+def matcher_rule(message: Message, trigger_mode, trigger_words) -> bool:
+    """当前 chat_rule 的实现(不含 @ 判断)"""
+    matcher = trigger.get_trigger_matcher(trigger_words)
+    keyword_hit, prefix_hit = matcher.scan(message.extract_plain_text())
+    return ("keyword" in trigger_mode and keyword_hit) or ("prefix" in trigger_mode and prefix_hit)
+
+
+def build_messages(count: int, words, hit_ratio: float = 0.05):
+    """生成混合了文本、图片、@、回复的群消息，少量消息包含触发词"""
+    messages = []
+    for i in range(count):
+        message = Message()
+        if random.random() < 0.2:
+            message += MessageSegment.reply(i)
+        if random.random() < 0.2:
+            message += MessageSegment.at(10000 + i)
+        text = FILLER[: random.randint(5, len(FILLER))] * random.randint(1, 4)
+        if random.random() < hit_ratio:
+            text = random.choice(words) + text
+        message += MessageSegment.text(text)
+        if random.random() < 0.2:
+            message += MessageSegment.image(f"https://example.com/{i}.png")
+        messages.append(message)
+    return messages
+
+
+def bench(rule, messages, trigger_mode, trigger_words, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for message in messages:
+            rule(message, trigger_mode, trigger_words)
+    return rounds * len(messages) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="触发规则微基准")
+    parser.add_argument("--words", type=int, default=len(BASE_WORDS), help="触发词数量")
+    parser.add_argument("--messages", type=int, default=5000, help="消息数量")
+    parser.add_argument("--rounds", type=int, default=20, help="重复轮数")
+    args = parser.parse_args()
+
+    random.seed(0)
+    words = (BASE_WORDS + [f"口令{i}" for i in range(args.words)])[: args.words]
+    messages = build_messages(args.messages, words)
+    trigger_mode = ["keyword", "prefix", "at"]
+
+    # 两种实现的判定结果必须一致
+    for message in messages:
+        assert legacy_rule(message, trigger_mode, words) == matcher_rule(message, trigger_mode, words)
+
+    legacy = bench(legacy_rule, messages, trigger_mode, words, args.rounds)
+    current = bench(matcher_rule, messages, trigger_mode, words, args.rounds)
+    print(f"触发词数量: {len(words)}  消息数量: {len(messages)}  轮数: {args.rounds}")
+    print(f"逐词扫描:   {legacy:>12,.0f} msg/s")
+    print(f"预编译匹配: {current:>12,.0f} msg/s  ({current / legacy:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+压测用的 OpenAI 兼容模型服务
+按配置的首字延迟和生成速率返回回复，可按比例返回工具调用，支持流式和非流式
+
+用法: python benchmarks/loadtest/fake_llm.py [--port 18081] [--latency 0.5] [--token-rate 50] [--tool-ratio 0.1]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+REPLY_TEXT = "吾乃剑仙，御剑千里，一念可斩星河。汝所问之事，吾已知晓，且听吾细细道来。"
+
+
+def create_app(latency: float, token_rate: float, tool_ratio: float, reply_tokens: int,
+               tool_name: str, tool_args: str) -> FastAPI:
+    app = FastAPI()
+    stats = {"requests": 0, "tool_calls": 0}
+
+    def tokens_for_reply():
+        # 按每个 token 2 个字符切分回复
+        text = (REPLY_TEXT * (reply_tokens * 2 // len(REPLY_TEXT) + 1))[: reply_tokens * 2]
+        return [text[i:i + 2] for i in range(0, len(text), 2)]
+
+    def choose_tool_call(body: dict):
+        """最后一条是用户消息且请求中带有指定工具时，按比例返回工具调用"""
+        messages = body.get("messages") or []
+        names = [t["function"]["name"] for t in body.get("tools") or []]
+        if not messages or messages[-1]["role"] != "user" or tool_name not in names:
+            return None
+        if random.random() >= tool_ratio:
+            return None
+        stats["tool_calls"] += 1
+        return {
+            "id": "call_" + uuid.uuid4().hex[:12],
+            "type": "function",
+            "function": {"name": tool_name, "arguments": tool_args},
+        }
+
+    def chunk_event(model: str, delta: dict, finish_reason=None) -> str:
+        data = {
+            "id": "chatcmpl-loadtest",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        model = body.get("model", "fake")
+        tool_call = choose_tool_call(body)
+        tokens = [] if tool_call else tokens_for_reply()
+
+        if body.get("stream"):
+            async def generate():
+                await asyncio.sleep(latency)
+                if tool_call:
+                    yield chunk_event(model, {"role": "assistant", "tool_calls": [{
+                        "index": 0, "id": tool_call["id"], "type": "function",
+                        "function": {"name": tool_name, "arguments": ""},
+                    }]})
+                    yield chunk_event(model, {"tool_calls": [{"index": 0, "function": {"arguments": tool_args}}]})
+                    yield chunk_event(model, {}, "tool_calls")
+                else:
+                    for token in tokens:
+                        yield chunk_event(model, {"role": "assistant", "content": token})
+                        await asyncio.sleep(1 / token_rate)
+                    yield chunk_event(model, {}, "stop")
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(generate(), media_type="text/event-stream")
+
+        await asyncio.sleep(latency + len(tokens) / token_rate)
+        if tool_call:
+            message = {"role": "assistant", "content": None, "tool_calls": [tool_call]}
+            finish_reason = "tool_calls"
+        else:
+            message = {"role": "assistant", "content": "".join(tokens)}
+            finish_reason = "stop"
+        return JSONResponse({
+            "id": "chatcmpl-loadtest",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": len(tokens), "total_tokens": len(tokens) + 1},
+        })
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="压测用的 OpenAI 兼容模型服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18081)
+    parser.add_argument("--latency", type=float, default=0.5, help="首字延迟(秒)")
+    parser.add_argument("--token-rate", type=float, default=50, help="生成速率(token/秒)")
+    parser.add_argument("--tool-ratio", type=float, default=0.1, help="返回工具调用的比例")
+    parser.add_argument("--reply-tokens", type=int, default=40, help="每条回复的 token 数")
+    parser.add_argument("--tool-name", default="get_time", help="返回调用的工具名")
+    parser.add_argument("--tool-args", default='{"timezone": "Asia/Shanghai"}', help="工具调用参数(JSON)")
+    args = parser.parse_args()
+
+    app = create_app(args.latency, args.token_rate, args.tool_ratio, args.reply_tokens,
+                     args.tool_name, args.tool_args)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+压测用的 OneBot v11 反向 WebSocket 客户端
+模拟 NapCat 连接到 NoneBot，按配置的比例发送群聊/私聊消息事件，并记录每条消息到首条回复的延迟
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import itertools
+import json
+import random
+import time
+
+import websockets
+
+SELF_ID = 10000
+BASE_GROUP = 700000
+BASE_USER = 800000
+
+# 消息类型 -> 权重
+DEFAULT_MIX = {
+    "keyword": 4,  # 群聊中包含触发词
+    "at": 2,  # 群聊中 @机器人
+    "image": 1,  # 群聊中触发词 + 图片
+    "reply": 1,  # 群聊中回复一条消息并带触发词
+    "private": 2,  # 私聊
+    "chatter": 10,  # 群聊中不触发机器人的闲聊，不等待回复
+}
+
+FILLER = ["今天吃什么", "这题怎么做", "讲个笑话", "天气如何", "推荐一本书", "现在几点了"]
+
+
+@dataclass
+class LoadResult:
+    sent: int = 0
+    replied: int = 0
+    timeouts: int = 0
+    chatter: int = 0
+    latencies: List[float] = field(default_factory=list)
+    started_at: float = 0.0
+    finished_at: float = 0.0
+
+
+class FakeOneBot:
+    """模拟的 OneBot 实现端"""
+
+    def __init__(self, url: str, trigger_word: str, mix: Optional[Dict[str, int]] = None,
+                 timeout: float = 60.0, self_id: int = SELF_ID):
+        self.url = url
+        self.self_id = self_id
+        self.trigger_word = trigger_word
+        self.mix = mix or DEFAULT_MIX
+        self.timeout = timeout
+        self.ws = None
+        self.message_ids = itertools.count(1)
+        # 目标 -> 等待首条回复的 future
+        self.waiters: Dict[Tuple[str, int], asyncio.Future] = {}
+        self.extra_replies = 0
+        self._send_lock = asyncio.Lock()
+
+    async def connect(self) -> None:
+        headers = {"X-Self-ID": str(self.self_id), "X-Client-Role": "Universal"}
+        self.ws = await websockets.connect(self.url, additional_headers=headers, max_size=None)
+        asyncio.create_task(self._receive_loop())
+
+    async def close(self) -> None:
+        if self.ws is not None:
+            await self.ws.close()
+
+    async def _send(self, data: dict) -> None:
+        async with self._send_lock:
+            await self.ws.send(json.dumps(data, ensure_ascii=False))
+
+    async def _receive_loop(self) -> None:
+        try:
+            async for raw in self.ws:
+                request = json.loads(raw)
+                if "action" in request:
+                    await self._send(self._handle_api(request))
+        except websockets.ConnectionClosed:
+            pass
+
+    def _handle_api(self, request: dict) -> dict:
+        action = request["action"]
+        params = request.get("params") or {}
+        data = None
+        if action in ("send_msg", "send_group_msg", "send_private_msg"):
+            if params.get("group_id"):
+                target = ("group", int(params["group_id"]))
+            else:
+                target = ("private", int(params["user_id"]))
+            waiter = self.waiters.pop(target, None)
+            if waiter is not None and not waiter.done():
+                waiter.set_result(time.perf_counter())
+            else:
+                self.extra_replies += 1
+            data = {"message_id": next(self.message_ids)}
+        elif action == "get_msg":
+            data = {
+                "time": int(time.time()),
+                "message_type": "group",
+                "message_id": params.get("message_id"),
+                "real_id": params.get("message_id"),
+                "sender": {"user_id": BASE_USER, "nickname": "路人"},
+                "message": [{"type": "text", "data": {"text": "被回复的消息"}}],
+            }
+        elif action == "get_group_member_info":
+            data = {"user_id": params.get("user_id"), "nickname": f"用户{params.get('user_id')}", "card": ""}
+        elif action == "get_group_member_list":
+            data = []
+        elif action == "get_stranger_info":
+            data = {"user_id": params.get("user_id"), "nickname": f"用户{params.get('user_id')}"}
+        elif action == "get_login_info":
+            data = {"user_id": self.self_id, "nickname": "剑仙"}
+        return {"status": "ok", "retcode": 0, "data": data, "echo": request.get("echo")}
+
+    def _build_event(self, kind: str, index: int) -> Tuple[dict, Optional[Tuple[str, int]]]:
+        """构造消息事件，返回 (事件, 需要等待回复的目标)"""
+        user_id = BASE_USER + index
+        group_id = BASE_GROUP + index
+        text = random.choice(FILLER)
+        segments = []
+        if kind == "at":
+            segments.append({"type": "at", "data": {"qq": str(self.self_id)}})
+            segments.append({"type": "text", "data": {"text": " " + text}})
+        elif kind == "reply":
+            segments.append({"type": "reply", "data": {"id": str(next(self.message_ids))}})
+            segments.append({"type": "text", "data": {"text": f"{self.trigger_word} {text}"}})
+        elif kind == "chatter":
+            segments.append({"type": "text", "data": {"text": text}})
+        else:
+            segments.append({"type": "text", "data": {"text": f"{self.trigger_word} {text}"}})
+        if kind == "image":
+            segments.append({"type": "image", "data": {
+                "file": f"{index}.png", "url": f"https://example.com/{index}.png",
+            }})
+
+        event = {
+            "time": int(time.time()),
+            "self_id": self.self_id,
+            "post_type": "message",
+            "message_id": next(self.message_ids),
+            "user_id": user_id,
+            "message": segments,
+            "raw_message": "",
+            "font": 0,
+            "sender": {"user_id": user_id, "nickname": f"用户{user_id}", "card": ""},
+        }
+        if kind == "private":
+            event.update(message_type="private", sub_type="friend")
+            return event, ("private", user_id)
+        event.update(message_type="group", sub_type="normal", group_id=group_id, anonymous=None)
+        event["sender"]["role"] = "member"
+        if kind == "chatter":
+            return event, None
+        return event, ("group", group_id)
+
+    async def _virtual_user(self, index: int, budget: "itertools.count", total: int,
+                            result: LoadResult, on_progress) -> None:
+        """单个虚拟用户：发送一条消息并等待回复后再发送下一条"""
+        kinds = list(self.mix)
+        weights = [self.mix[kind] for kind in kinds]
+        while next(budget) < total:
+            kind = random.choices(kinds, weights)[0]
+            event, target = self._build_event(kind, index)
+            if target is None:
+                await self._send(event)
+                result.chatter += 1
+                result.sent += 1
+                on_progress(result)
+                continue
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters[target] = waiter
+            start = time.perf_counter()
+            await self._send(event)
+            result.sent += 1
+            try:
+                replied_at = await asyncio.wait_for(waiter, self.timeout)
+                result.latencies.append(replied_at - start)
+                result.replied += 1
+            except asyncio.TimeoutError:
+                self.waiters.pop(target, None)
+                result.timeouts += 1
+            on_progress(result)
+
+    async def run(self, total: int, concurrency: int, on_progress=lambda result: None) -> LoadResult:
+        """以 concurrency 个虚拟用户共发送 total 条消息"""
+        result = LoadResult(started_at=time.perf_counter())
+        budget = itertools.count()
+        await asyncio.gather(*(
+            self._virtual_user(index, budget, total, result, on_progress)
+            for index in range(concurrency)
+        ))
+        result.finished_at = time.perf_counter()
+        return result
@@ -0,0 +1,176 @@
+"""
+回放录制的真实流量
+以回放模式启动 bot.py(模型和工具使用录制的输出)，按录制时的时间间隔(可加速)重新发送消息事件，
+报告吞吐、端到端延迟分位数，并与录制时的延迟对比
+
+录制: 在 config.toml 中设置 [recorder] mode = "record"，运行一段时间后得到 data/trace.jsonl
+用法: python benchmarks/loadtest/replay.py data/trace.jsonl [--speed 1] [--latency-scale 1]
+"""
+from collections import deque
+from pathlib import Path
+from typing import Deque, Dict, Tuple
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import toml
+import tomli
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from onebot_client import FakeOneBot  # noqa: E402
+from run import percentile, read_rss_kb, wait_for_port  # noqa: E402
+
+root_path = Path(__file__).resolve().parents[2]
+
+
+class ReplayClient(FakeOneBot):
+    """按录制的事件回放，回复按目标先进先出对应到发出的消息"""
+
+    def __init__(self, url: str, replies: Dict[int, dict], self_id: int, timeout: float):
+        super().__init__(url, "", timeout=timeout, self_id=self_id)
+        # 被回复消息的 message_id -> 录制时的消息内容，用于应答 get_msg
+        self.replies = replies
+        self.pending: Dict[Tuple[str, int], Deque[float]] = {}
+        self.latencies = []
+
+    def _handle_api(self, request: dict) -> dict:
+        action = request["action"]
+        params = request.get("params") or {}
+        if action in ("send_msg", "send_group_msg", "send_private_msg"):
+            if params.get("group_id"):
+                target = ("group", int(params["group_id"]))
+            else:
+                target = ("private", int(params["user_id"]))
+            queue = self.pending.get(target)
+            if queue:
+                self.latencies.append(time.perf_counter() - queue.popleft())
+            else:
+                self.extra_replies += 1
+            return {"status": "ok", "retcode": 0, "data": {"message_id": next(self.message_ids)},
+                    "echo": request.get("echo")}
+        if action == "get_msg" and params.get("message_id") in self.replies:
+            return {"status": "ok", "retcode": 0, "data": self.replies[params["message_id"]],
+                    "echo": request.get("echo")}
+        return super()._handle_api(request)
+
+    def outstanding(self) -> int:
+        return sum(len(queue) for queue in self.pending.values())
+
+    async def replay(self, events, turns: Dict[int, float], speed: float) -> float:
+        """按录制的时间间隔发送事件，返回发送耗时"""
+        first = events[0]["t"]
+        start = time.perf_counter()
+        for record in events:
+            delay = (record["t"] - first) / speed - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            event = record["event"]
+            if event["message_id"] in turns:
+                if event["message_type"] == "group":
+                    target = ("group", event["group_id"])
+                else:
+                    target = ("private", event["user_id"])
+                self.pending.setdefault(target, deque()).append(time.perf_counter())
+            await self._send(event)
+        return time.perf_counter() - start
+
+
+def load_trace(path: Path):
+    events, turns, replies = [], {}, {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record["kind"] == "event":
+                events.append(record)
+                if record.get("reply"):
+                    replies[record["reply"]["message_id"]] = record["reply"]
+            elif record["kind"] == "turn":
+                turns[record["message_id"]] = record["latency"]
+    return events, turns, replies
+
+
+def format_percentiles(values) -> str:
+    ordered = sorted(values)
+    return "  ".join(f"p{int(q * 100)}={percentile(ordered, q) * 1000:.0f}ms" for q in (0.5, 0.95, 0.99))
+
+
+async def drive(args, events, turns, replies, bot_pid: int):
+    client = ReplayClient(
+        f"ws://127.0.0.1:{args.port}/onebot/v11/ws",
+        replies,
+        self_id=events[0]["event"]["self_id"],
+        timeout=args.timeout,
+    )
+    await client.connect()
+    rss_start = read_rss_kb(bot_pid)
+    start = time.perf_counter()
+    send_elapsed = await client.replay(events, turns, args.speed)
+    # 等待剩余的回复
+    deadline = time.perf_counter() + args.timeout
+    while client.outstanding() and time.perf_counter() < deadline:
+        await asyncio.sleep(0.1)
+    elapsed = time.perf_counter() - start
+    rss_end = read_rss_kb(bot_pid)
+    await client.close()
+
+    print(f"事件: {len(events)}  需回复: {len(turns)}  收到回复: {len(client.latencies)}  "
+          f"未回复: {client.outstanding()}  多余回复: {client.extra_replies}")
+    print(f"发送耗时: {send_elapsed:.1f}s  总耗时: {elapsed:.1f}s  吞吐: {len(events) / elapsed:.1f} msg/s")
+    print(f"回放延迟: {format_percentiles(client.latencies)}")
+    print(f"录制延迟: {format_percentiles(turns.values())}  (录制时从进入 handle_chat 到模型返回)")
+    print(f"内存(RSS): {rss_start / 1024:.1f}MB -> {rss_end / 1024:.1f}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回放录制的流量")
+    parser.add_argument("trace", help="录制文件(JSONL)")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放速度倍数")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="模型、工具耗时的缩放倍数，0 表示不等待")
+    parser.add_argument("--config", default=str(root_path / "config.toml"), help="基础配置文件")
+    parser.add_argument("--timeout", type=float, default=60.0, help="发送完成后等待剩余回复的时间(秒)")
+    parser.add_argument("--port", type=int, default=18082, help="bot 监听端口")
+    args = parser.parse_args()
+
+    trace_path = Path(args.trace).resolve()
+    events, turns, replies = load_trace(trace_path)
+    if not events:
+        raise SystemExit("录制文件中没有消息事件")
+
+    with open(args.config, "rb") as f:
+        config = tomli.load(f)
+    config["recorder"] = {"mode": "replay", "path": str(trace_path), "latency_scale": args.latency_scale}
+    # 每条回复只发送一条消息，才能把回复对应到触发它的事件
+    config.setdefault("chunk", {}).update(enable=False, stream=False)
+    # 加速回放时不限制发送频率，延迟只反映处理耗时
+    config.setdefault("outbox", {}).update(global_rpm=0, target_interval_ms=0)
+    workdir = Path(tempfile.mkdtemp(prefix="llmq-replay-"))
+    config_path = workdir / "config.toml"
+    with open(config_path, "w", encoding="utf-8") as f:
+        toml.dump(config, f)
+
+    bot_log = open(workdir / "bot.log", "w")
+    env = dict(os.environ, LLMQ_CONFIG=str(config_path), LLMQ_PORT=str(args.port), LOG_LEVEL="WARNING")
+    bot = subprocess.Popen(
+        [sys.executable, str(root_path / "bot.py")],
+        cwd=root_path, env=env, stdout=bot_log, stderr=subprocess.STDOUT,
+    )
+    try:
+        wait_for_port(args.port, bot)
+        print(f"回放 {trace_path.name}  速度: {args.speed}x  耗时缩放: {args.latency_scale}")
+        asyncio.run(drive(args, events, turns, replies, bot.pid))
+        print(f"bot 日志: {workdir / 'bot.log'}")
+    finally:
+        bot.terminate()
+        bot.wait()
+        bot_log.close()
+
+
+if __name__ == "__main__":
+    main()
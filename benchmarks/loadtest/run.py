@@ -0,0 +1,197 @@
+"""
+llm_chat 插件离线压测
+启动假模型服务和 bot.py，用模拟的 OneBot 客户端发送消息，报告吞吐、端到端延迟分位数和内存增长
+
+用法: python benchmarks/loadtest/run.py [--messages 10000] [--concurrency 50] [--mode async] [--latency 0.5]
+"""
+from pathlib import Path
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from onebot_client import DEFAULT_MIX, FakeOneBot, LoadResult  # noqa: E402
+
+root_path = Path(__file__).resolve().parents[2]
+TRIGGER_WORD = "剑仙"
+
+CONFIG_TEMPLATE = """
+[llm]
+model = "loadtest-model"
+api_key = "sk-loadtest"
+base_url = "http://127.0.0.1:{llm_port}/v1"
+system_prompt = "你是剑仙"
+max_context_messages = 10
+
+[plugin_settings]
+trigger_words = ["{trigger_word}"]
+trigger_mode = ["keyword", "prefix", "at"]
+group_chat_isolation = false
+enable_username = true
+enable_private = true
+enable_group = true
+superusers = "1"
+command_start = "/"
+async_mode = {async_mode}
+max_concurrency = {max_concurrency}
+
+[chunk]
+enable = false
+stream = {stream}
+
+[outbox]
+global_rpm = 0
+target_interval_ms = 0
+
+[responses]
+"""
+
+TOOLS_CONFIG = """
+[tools]
+builtin = []
+enabled = ["get_time"]
+"""
+
+
+def read_rss_kb(pid: int) -> int:
+    """读取进程常驻内存(KB)"""
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def wait_for_port(port: int, process: subprocess.Popen, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"进程在监听端口 {port} 前已退出")
+        with socket.socket() as sock:
+            if sock.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.2)
+    raise RuntimeError(f"等待端口 {port} 超时")
+
+
+def percentile(ordered, q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def report(result: LoadResult, rss_samples, extra_replies: int) -> None:
+    elapsed = result.finished_at - result.started_at
+    ordered = sorted(result.latencies)
+    print(f"消息总数: {result.sent}  (需回复 {result.sent - result.chatter}, 闲聊 {result.chatter})")
+    print(f"收到回复: {result.replied}  超时: {result.timeouts}  多余回复: {extra_replies}")
+    print(f"耗时: {elapsed:.1f}s  吞吐: {result.sent / elapsed:.1f} msg/s  回复: {result.replied / elapsed:.1f} msg/s")
+    print(
+        "端到端延迟: "
+        + "  ".join(f"p{int(q * 100)}={percentile(ordered, q) * 1000:.0f}ms" for q in (0.5, 0.95, 0.99))
+        + f"  max={(ordered[-1] if ordered else 0) * 1000:.0f}ms"
+    )
+    (start_count, start_rss), (end_count, end_rss) = rss_samples[0], rss_samples[-1]
+    print(f"内存(RSS): {start_rss / 1024:.1f}MB -> {end_rss / 1024:.1f}MB")
+    if end_count > start_count:
+        growth = (end_rss - start_rss) / (end_count - start_count) * 10000
+        print(f"内存增长: {growth / 1024:.2f}MB / 1万条消息")
+
+
+async def drive(args, bot_pid: int):
+    client = FakeOneBot(
+        f"ws://127.0.0.1:{args.port}/onebot/v11/ws",
+        TRIGGER_WORD,
+        mix=DEFAULT_MIX if not args.no_chatter else {k: v for k, v in DEFAULT_MIX.items() if k != "chatter"},
+        timeout=args.timeout,
+    )
+    await client.connect()
+    # 预热：让模型、工具和连接池完成初始化后再开始计时
+    await client.run(args.concurrency, args.concurrency)
+
+    rss_samples = [(0, read_rss_kb(bot_pid))]
+    next_sample = [args.sample_every]
+
+    def on_progress(result: LoadResult) -> None:
+        if result.sent >= next_sample[0]:
+            rss_samples.append((result.sent, read_rss_kb(bot_pid)))
+            print(f"  已发送 {result.sent} 条  RSS {rss_samples[-1][1] / 1024:.1f}MB", flush=True)
+            next_sample[0] += args.sample_every
+
+    result = await client.run(args.messages, args.concurrency, on_progress)
+    rss_samples.append((result.sent, read_rss_kb(bot_pid)))
+    await client.close()
+    report(result, rss_samples, client.extra_replies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="llm_chat 插件离线压测")
+    parser.add_argument("--messages", type=int, default=10000, help="发送消息总数")
+    parser.add_argument("--concurrency", type=int, default=50, help="虚拟用户数(每个用户独占一个群或私聊)")
+    parser.add_argument("--mode", choices=["sync", "async", "stream"], default="async", help="插件执行模式")
+    parser.add_argument("--max-concurrency", type=int, default=32, help="插件的 max_concurrency")
+    parser.add_argument("--latency", type=float, default=0.5, help="假模型首字延迟(秒)")
+    parser.add_argument("--token-rate", type=float, default=50, help="假模型生成速率(token/秒)")
+    parser.add_argument("--tool-ratio", type=float, default=0.1, help="假模型返回工具调用的比例")
+    parser.add_argument("--reply-tokens", type=int, default=40, help="每条回复的 token 数")
+    parser.add_argument("--no-chatter", action="store_true", help="不发送不触发机器人的闲聊消息")
+    parser.add_argument("--timeout", type=float, default=60.0, help="等待回复的超时时间(秒)")
+    parser.add_argument("--sample-every", type=int, default=2000, help="每发送多少条消息采样一次内存")
+    parser.add_argument("--port", type=int, default=18082, help="bot 监听端口")
+    parser.add_argument("--llm-port", type=int, default=18081, help="假模型服务端口")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="llmq-loadtest-"))
+    config_path = workdir / "config.toml"
+    config_path.write_text(CONFIG_TEMPLATE.format(
+        llm_port=args.llm_port,
+        trigger_word=TRIGGER_WORD,
+        async_mode=str(args.mode != "sync").lower(),
+        stream=str(args.mode == "stream").lower(),
+        max_concurrency=args.max_concurrency,
+    ), encoding="utf-8")
+    tools_config_path = workdir / "config-tools.toml"
+    tools_config_path.write_text(TOOLS_CONFIG, encoding="utf-8")
+
+    llm_server = subprocess.Popen([
+        sys.executable, str(Path(__file__).resolve().parent / "fake_llm.py"),
+        "--port", str(args.llm_port),
+        "--latency", str(args.latency),
+        "--token-rate", str(args.token_rate),
+        "--tool-ratio", str(args.tool_ratio),
+        "--reply-tokens", str(args.reply_tokens),
+    ])
+    bot_log = open(workdir / "bot.log", "w")
+    env = dict(
+        os.environ,
+        LLMQ_CONFIG=str(config_path),
+        LLMQ_TOOLS_CONFIG=str(tools_config_path),
+        LLMQ_PORT=str(args.port),
+        LOG_LEVEL="WARNING",
+    )
+    bot = subprocess.Popen(
+        [sys.executable, str(root_path / "bot.py")],
+        cwd=root_path, env=env, stdout=bot_log, stderr=subprocess.STDOUT,
+    )
+    try:
+        wait_for_port(args.llm_port, llm_server)
+        wait_for_port(args.port, bot)
+        print(f"模式: {args.mode}  虚拟用户: {args.concurrency}  假模型延迟: {args.latency}s  "
+              f"速率: {args.token_rate} token/s  工具调用比例: {args.tool_ratio}")
+        asyncio.run(drive(args, bot.pid))
+        print(f"bot 日志: {workdir / 'bot.log'}")
+    finally:
+        bot.terminate()
+        llm_server.terminate()
+        bot.wait()
+        llm_server.wait()
+        bot_log.close()
+
+
+if __name__ == "__main__":
+    main()
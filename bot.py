@@ -1,14 +1,16 @@
 import nonebot
 from nonebot.adapters.onebot.v11 import Adapter
 import toml
+import os
 from pathlib import Path
 
-config_path = Path(__file__).parent / "config.toml"
+# 环境变量 LLMQ_CONFIG / LLMQ_PORT 可覆盖配置文件和端口(如压测)
+config_path = Path(os.environ.get("LLMQ_CONFIG", Path(__file__).parent / "config.toml"))
 config = toml.load(config_path)
 nonebot.init(
     superusers={config['plugin_settings']['superusers']},
     host="0.0.0.0",
-    port=8082,command_start={config['plugin_settings']['command_start']},
+    port=int(os.environ.get("LLMQ_PORT", 8082)),command_start={config['plugin_settings']['command_start']},
     command_sep={"."})
 
 driver = nonebot.get_driver()
@@ -19,5 +21,28 @@ driver.register_adapter(Adapter)
 nonebot.load_plugins("plugins")
 # nonebot.load_from_toml("config.toml", encoding="utf-8")
 
+# Prometheus 指标，挂载在 NoneBot 的 FastAPI 应用上，需在 [metrics] 中开启
+# 配置了 token 时校验 Bearer 令牌，否则只允许本机访问
+metrics_config = config.get("metrics", {})
+if metrics_config.get("enable", False):
+    import secrets
+    from fastapi import Request
+    from fastapi.responses import PlainTextResponse
+    from plugins.llm_chat.metrics import registry as metrics
+
+    app = nonebot.get_app()
+    metrics_token = metrics_config.get("token", "")
+
+    def metrics_allowed(request: Request) -> bool:
+        if metrics_token:
+            return secrets.compare_digest(request.headers.get("authorization", ""), f"Bearer {metrics_token}")
+        return request.client is not None and request.client.host in ("127.0.0.1", "::1")
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def export_metrics(request: Request):
+        if not metrics_allowed(request):
+            return PlainTextResponse("forbidden", status_code=403)
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     nonebot.run()
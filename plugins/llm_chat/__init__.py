@@ -1,4 +1,5 @@
 from nonebot.adapters.onebot.v11 import (
+    Bot,
     Message,
     MessageEvent,
     GroupMessageEvent,
@@ -6,21 +7,42 @@ from nonebot.adapters.onebot.v11 import (
     MessageSegment,
 )
 from nonebot.permission import SUPERUSER
-from nonebot import on_message, on_command
+from nonebot import on_message, on_command, get_driver
 from nonebot.params import CommandArg, EventMessage, EventPlainText
 from nonebot.exception import MatcherException
 from nonebot.plugin import PluginMetadata
-from nonebot.adapters.onebot.v11.exception import ActionFailed
-from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
-from langgraph.checkpoint.memory import MemorySaver
-from .graph import build_graph, get_llm, format_messages_for_print
-from typing import Dict
-from datetime import datetime
+from nonebot.message import event_preprocessor
+from langchain_core.messages import HumanMessage, AIMessage, AIMessageChunk, ToolMessage
+from .graph import build_graph, get_llm, format_messages_for_print, backend_pools, hedger, ainvoke_pooled
 from random import choice
+from pathlib import Path
 from .config import Config
+from .mailbox import Mailbox
+from .session import SessionStore
+from .checkpoint import CompactingSaver
+from .stream import StreamSplitter
+from .trigger import get_trigger_matcher
+from .names import UserNameResolver
+from .coalesce import BurstCoalescer
+from .outbox import Outbox
+from .metrics import registry as metrics, tool_timer, on_calling_api, on_called_api
+from .recorder import TraceRecorder, ReplayStore, ReplayChatModel, stub_tools
+from .tools import load_tools
+from .bulkhead import bulkheads
+from .toolcache import tool_caches
+from .compaction import compactors
+from .log import logger, setup_logging, TurnSampler, turn_messages
+from .models import ModelRegistry
+from .tokens import get_counter
+from .summary import Summarizer
+from .router import ToolRouter
+from .fastpath import FastPath
+from typing import Optional
 import asyncio
+import time
 import os
 import re
+import sys
 
 
 
@@ -34,52 +56,168 @@ __plugin_meta__ = PluginMetadata(
 
 plugin_config = Config.load_config()
 
+# 日志改为队列写入，对话内容按比例和速率采样记录
+setup_logging(plugin_config.plugin.log.enqueue)
+turn_sampler = TurnSampler(plugin_config.plugin.log.sample_rate, plugin_config.plugin.log.max_per_second)
+
 os.environ["OPENAI_API_KEY"] = plugin_config.llm.api_key
 os.environ["OPENAI_BASE_URL"] = plugin_config.llm.base_url
 os.environ["GOOGLE_API_KEY"] = plugin_config.llm.google_api_key
 
 
-# 会话模板
-class Session:
-    def __init__(self, thread_id: str):
-        self.thread_id = thread_id
-        self.memory = MemorySaver()
-        # 最后访问时间
-        self.last_accessed = datetime.now()
-        self.graph = None
+# 所有会话共享的检查点存储，按 thread_id 区分
+checkpoint_config = plugin_config.plugin.checkpoint
+checkpointer = CompactingSaver(
+    path=(
+        str(Path(__file__).resolve().parents[2] / checkpoint_config.path)
+        if checkpoint_config.backend == "sqlite"
+        else None
+    ),
+    keep_last=checkpoint_config.keep_last,
+    flush_interval=checkpoint_config.flush_interval,
+    flush_batch=checkpoint_config.flush_batch,
+)
+
+def evict_checkpoint(thread_id: str) -> None:
+    """
+    会话被淘汰时从内存卸载其检查点，持久化模式下再次访问会从磁盘恢复
+    信箱中还有该会话排队或执行中的消息时等其处理完再卸载，期间会话重新活跃则不再卸载
+    """
+    def evict():
+        if thread_id not in sessions:
+            checkpointer.evict(thread_id)
+
+    mailbox.when_idle(thread_id, evict)
 
 # "group_123456_789012": Session对象1
-sessions: Dict[str, Session] = {}
+sessions = SessionStore(
+    plugin_config.plugin.max_sessions,
+    ttl=plugin_config.plugin.session_ttl,
+    on_evict=evict_checkpoint,
+)
 
-# 添加异步锁保护sessions字典
-sessions_lock = asyncio.Lock()
+driver = get_driver()
+_sweeper_task = None
 
-async def get_or_create_session(thread_id: str) -> Session:
-    """异步获取或创建会话"""
-    async with sessions_lock:
-        if thread_id not in sessions:
-            sessions[thread_id] = Session(thread_id)
-        session = sessions[thread_id]
-        session.last_accessed = datetime.now()
-    return session
-
-async def cleanup_old_sessions():
-    """异步清理过期的会话"""
-    async with sessions_lock:
-        if len(sessions) > plugin_config.plugin.max_sessions:
-            # 按最后访问时间排序，删除最旧的会话
-            sorted_sessions = sorted(
-                sessions.items(),
-                key=lambda x: x[1].last_accessed,
-                reverse=True
-            )
-            # 保留配置指定数量的会话
-            for thread_id, _ in sorted_sessions[plugin_config.plugin.max_sessions:]:
-                del sessions[thread_id]
+@driver.on_startup
+async def start_session_sweeper():
+    """启动后台会话过期清理任务"""
+    global _sweeper_task
+    if plugin_config.plugin.session_ttl:
+        _sweeper_task = asyncio.create_task(
+            sessions.run_sweeper(plugin_config.plugin.session_sweep_interval)
+        )
+
+@driver.on_shutdown
+async def stop_session_sweeper():
+    if _sweeper_task:
+        _sweeper_task.cancel()
+    if summarizer:
+        await summarizer.close()
+    # 写入缓冲中的检查点
+    checkpointer.close()
+    await outbox.close(plugin_config.plugin.outbox.shutdown_timeout)
+    if recorder:
+        recorder.close()
+    # 关闭工具共用的 HTTP 连接池(仅在有工具加载过它时)
+    http_client = sys.modules.get("tools.http_client")
+    if http_client:
+        await http_client.aclose()
+    for bulkhead in bulkheads.values():
+        bulkhead.shutdown()
+
+# 发送者名称缓存，消息缺少昵称时优先从缓存获取，减少 OneBot API 调用
+user_names = UserNameResolver(
+    plugin_config.plugin.username_cache_size,
+    plugin_config.plugin.username_cache_ttl,
+)
+
+@event_preprocessor
+async def remember_sender_name(event: MessageEvent):
+    """从收到的每条消息中顺带记录发送者名称"""
+    if plugin_config.plugin.enable_username:
+        user_names.remember(event)
+
+# 连发消息合并
+coalescer = BurstCoalescer(
+    plugin_config.plugin.coalesce.window_ms / 1000,
+    plugin_config.plugin.coalesce.max_wait_ms / 1000,
+)
+
+# 会话信箱：同一会话串行处理，不同会话并行
+mailbox = Mailbox(plugin_config.plugin.max_concurrency)
+
+# 出站队列：回复按群/私聊排队限速发送，handler 入队后即返回
+outbox_config = plugin_config.plugin.outbox
+outbox = Outbox(
+    outbox_config.global_rpm,
+    outbox_config.target_interval_ms / 1000,
+    outbox_config.retries,
+    outbox_config.retry_backoff_ms / 1000,
+)
+
+# 流量录制/回放
+recorder_config = plugin_config.plugin.recorder
+trace_path = str(Path(__file__).resolve().parents[2] / recorder_config.path)
+recorder = TraceRecorder(trace_path) if recorder_config.mode == "record" else None
+replay = ReplayStore.load(trace_path, recorder_config.latency_scale) if recorder_config.mode == "replay" else None
+graph_callbacks = [tool_timer] + ([recorder.handler] if recorder else [])
+
+@event_preprocessor
+async def record_event(event: MessageEvent):
+    if recorder:
+        recorder.record_event(event)
+
+# 初始化模型和对话图，图只编译一次，所有会话共享并通过 thread_id 区分检查点
+# 回放模式下模型和工具都替换为录制的输出，工具在包装前替换，回放时仍经过压缩、隔舱和缓存
+graph_tools = load_tools(stub=(lambda tools: stub_tools(tools, replay)) if replay else None)
+# 模型按名称缓存，各会话/群可固定使用不同模型，切换模型不影响历史
+models = ModelRegistry(
+    (lambda name, backend=None: ReplayChatModel(store=replay)) if replay else get_llm,
+    plugin_config.llm.model,
+    plugin_config.plugin.model_pins,
+)
+models.get()
+# 工具路由：每次调用模型只绑定与本轮消息相关的工具，减少请求中的工具定义
+router_config = plugin_config.plugin.router
+router = ToolRouter(
+    graph_tools,
+    router_config.keywords,
+    router_config.always,
+    router_config.threshold,
+    router_config.similarity,
+    router_config.sticky_turns,
+) if router_config.enable and graph_tools else None
+graph = build_graph(plugin_config, models, graph_tools, router).compile(checkpointer=checkpointer)
+
+# 快速应答：简单意图在调用模型前按规则直接回复
+fastpath = FastPath(
+    plugin_config.plugin.fastpath.rules,
+    {
+        "tools": "、".join(tool.name for tool in graph_tools) or "无",
+        "triggers": "、".join(plugin_config.plugin.trigger_words) or "@我",
+    },
+) if plugin_config.plugin.fastpath.enable else None
+
+# 滚动摘要：回复后在后台把超出预算的早期轮次折叠成摘要(回放模式下不启用)
+summary_config = plugin_config.plugin.summary
+summarizer = Summarizer(
+    graph,
+    # 摘要模型不绑定工具，经后端池调用，不对冲
+    lambda name, messages: ainvoke_pooled(name, messages, lambda backend: models.get(name, backend), hedge=False),
+    mailbox,
+    plugin_config.llm.max_context_tokens,
+    summary_config.keep_ratio,
+    summary_config.max_summary_tokens,
+    summary_config.model or None,
+) if summary_config.enable and not replay else None
 
-# 初始化模型和对话图
-llm = get_llm()
-graph_builder = build_graph(plugin_config, llm)
+# 指标：OneBot API(发送消息等)耗时和运行状态
+Bot.on_calling_api(on_calling_api)
+Bot.on_called_api(on_called_api)
+metrics.gauge("llm_chat_sessions_resident", lambda: len(sessions))
+metrics.gauge("llm_chat_mailbox_pending", lambda: mailbox.total)
+metrics.gauge("llm_chat_outbox_pending", lambda: outbox.pending)
 
 
 
@@ -94,20 +232,22 @@ graph_builder = build_graph(plugin_config, llm)
 
 def chat_rule(event: Event) -> bool:
     """定义触发规则"""
+    with metrics.span("llm_chat_rule_seconds"):
+        return _match_trigger(event)
+
+def _match_trigger(event: Event) -> bool:
     trigger_mode = plugin_config.plugin.trigger_mode
-    trigger_words = plugin_config.plugin.trigger_words
-    msg = str(event.get_message())
 
     if "at" in trigger_mode and event.is_tome():
         return True
-    if "keyword" in trigger_mode:
-        for word in trigger_words:
-            if word in msg:
-                return True
-    if "prefix" in trigger_mode:
-        for word in trigger_words:
-            if msg.startswith(word):
-                return True
+    if "keyword" in trigger_mode or "prefix" in trigger_mode:
+        # 只扫描纯文本部分，一次扫描同时得到关键词和前缀的匹配结果
+        matcher = get_trigger_matcher(plugin_config.plugin.trigger_words)
+        keyword_hit, prefix_hit = matcher.scan(event.get_plaintext())
+        if "keyword" in trigger_mode and keyword_hit:
+            return True
+        if "prefix" in trigger_mode and prefix_hit:
+            return True
     if not trigger_mode:
         return event.is_tome()
     return False
@@ -123,13 +263,26 @@ def remove_trigger_words(text: str, message: Message) -> str:
             text = text.replace(str(seg), "").strip()
     
     # 移除命令前缀
-    if hasattr(plugin_config.plugin, 'trigger_words'):
-        for cmd in plugin_config.plugin.trigger_words:
-            if text.startswith(cmd):
-                text = text[len(cmd):].strip()
-                break
-    
-    return text
+    return get_trigger_matcher(plugin_config.plugin.trigger_words).strip_prefix(text)
+
+def get_thread_id(event: MessageEvent) -> str:
+    """构建会话ID"""
+    if isinstance(event, GroupMessageEvent):
+        if plugin_config.plugin.group_chat_isolation:
+            return f"group_{event.group_id}_{event.user_id}"
+        return f"group_{event.group_id}"
+    return f"private_{event.user_id}"
+
+def get_group_scope(event: Event) -> Optional[str]:
+    """群级别的模型固定作用域"""
+    if isinstance(event, GroupMessageEvent):
+        return f"group_{event.group_id}"
+    return None
+
+MEDIA_URL_PATTERN = re.compile(
+    r'https?://[^\s]+?\.(?:png|jpg|jpeg|gif|bmp|webp|mp4|avi|mov|mkv|mp3|wav|ogg|aac|flac)',
+    re.IGNORECASE,
+)
 
 def calculate_typing_delay(text: str) -> float:
     """
@@ -139,30 +292,96 @@ def calculate_typing_delay(text: str) -> float:
     delay = len(text) / plugin_config.plugin.chunk.char_per_s
     return min(delay, plugin_config.plugin.chunk.max_time)
 
-async def send_in_chunks(response: str) -> bool:
+def send_in_chunks(bot: Bot, event: MessageEvent, response: str) -> bool:
     """
-    分段发送逻辑, 返回True表示已完成发送, 否则False
+    分段发送逻辑, 返回True表示已全部放入出站队列, 否则False
+    分段之间的打字延迟由出站队列等待，不占用 handler
     """
     for sep in plugin_config.plugin.chunk.words:
         if sep in response:
-            chunks = response.split(sep)
-            for i, chunk in enumerate(chunks):
-                chunk = chunk.strip()
-                if not chunk:
-                    continue
+            delay = 0.0
+            for chunk in response.split(sep):
                 for word in plugin_config.plugin.chunk.words:
                     chunk = chunk.replace(word, "")
                 chunk = chunk.strip()
-                if i == len(chunks) - 1:
-                    await chat_handler.finish(Message(chunk))
-                else:
-                    await chat_handler.send(Message(chunk))
-                    await asyncio.sleep(calculate_typing_delay(chunk))
+                if not chunk:
+                    continue
+                outbox.put(bot, event, Message(chunk), delay=delay)
+                delay = calculate_typing_delay(chunk)
             return True
     return False
 
+async def finish_reply(bot: Bot, event: MessageEvent, message, fallback=None):
+    """把回复放入出站队列后结束处理"""
+    outbox.put(bot, event, message, fallback)
+    await chat_handler.finish()
+
+def extract_response(messages: list) -> str:
+    """从对话图结果中提取回复文本"""
+    if not messages:
+        return "对不起，我现在无法回答。"
+    last_message = messages[-1]
+    if isinstance(last_message, AIMessage):
+        if last_message.invalid_tool_calls:
+            if isinstance(last_message.invalid_tool_calls, list) and last_message.invalid_tool_calls:
+                return f"工具调用失败: {last_message.invalid_tool_calls[0]['error']}"
+            return "工具调用失败，但没有错误信息"
+        if last_message.content:
+            return last_message.content.strip()
+        return "对不起，我没有理解您的问题。"
+    if isinstance(last_message, ToolMessage) and last_message.content:
+        return (
+            last_message.content
+            if isinstance(last_message.content, str)
+            else str(last_message.content)
+        )
+    return "对不起，我没有理解您的问题。"
+
+async def stream_reply(bot: Bot, event: MessageEvent, graph_input: dict, graph_config: dict):
+    """
+    流式执行对话图，chatbot 每生成完整的一段就立即放入出站队列
+    返回 (最终状态, 尚未发送的剩余文本)，没有发送过任何分段时剩余文本为 None
+    """
+    chunk_config = plugin_config.plugin.chunk
+    splitter = StreamSplitter(chunk_config.words, chunk_config.sentence_ends)
+    result = None
+    current_turn = None
+    # 含媒体链接的分段留到最后统一按媒体消息发送
+    held = []
+    sent_count = 0
+    start = time.monotonic()
+    async for mode, payload in graph.astream(
+        graph_input, graph_config, stream_mode=["messages", "values"]
+    ):
+        if mode == "values":
+            result = payload
+            continue
+        chunk, metadata = payload
+        if metadata.get("langgraph_node") != "chatbot" or not isinstance(chunk, AIMessageChunk):
+            continue
+        if chunk.id != current_turn:
+            # 新的一轮生成开始，丢弃上一轮(工具调用轮)未成段的文本
+            current_turn = chunk.id
+            splitter.flush()
+        if not isinstance(chunk.content, str) or not chunk.content:
+            continue
+        for piece in splitter.feed(chunk.content):
+            if held or MEDIA_URL_PATTERN.search(piece):
+                held.append(piece)
+                continue
+            outbox.put(bot, event, Message(piece))
+            if not sent_count:
+                logger.debug(f"首段回复耗时: {time.monotonic() - start:.2f}s")
+                metrics.observe("llm_chat_stage_seconds", time.monotonic() - start, stage="first_segment")
+            sent_count += 1
+    if not sent_count:
+        return result, None
+    held.append(splitter.flush())
+    return result, "\n".join(piece for piece in held if piece)
+
 @chat_handler.handle()
 async def handle_chat(
+    bot: Bot,
     # 提取消息全部对象
     event: MessageEvent,
     # 提取各种消息段
@@ -170,27 +389,17 @@ async def handle_chat(
     # 提取纯文本
     plain_text: str = EventPlainText()
 ):
+    request_start = time.perf_counter()
     # 检查群聊/私聊开关，判断消息对象是否是群聊/私聊的实例
     if (isinstance(event, GroupMessageEvent) and not plugin_config.plugin.enable_group) or \
        (not isinstance(event, GroupMessageEvent) and not plugin_config.plugin.enable_private):
-        await chat_handler.finish(plugin_config.responses.disabled_message)
+        await finish_reply(bot, event, plugin_config.responses.disabled_message)
         
     # 获取用户名
     user_name = ""  # 初始化为空字符串
     if plugin_config.plugin.enable_username:
-        user_name = event.sender.nickname if event.sender.nickname else event.sender.card
-        if not user_name:
-            try:
-                if isinstance(event, GroupMessageEvent):
-                    user_info = await event.bot.get_group_member_info(group_id=event.group_id, user_id=event.user_id)
-                    user_name = user_info.get("nickname") or user_info.get("card") or str(event.user_id)
-                else:
-                    user_info = await event.bot.get_stranger_info(user_id=event.user_id)
-                    user_name = user_info.get("nickname") or str(event.user_id)
-            except Exception as e:
-                print(f"获取用户信息失败: {e}")
-                user_name = str(event.user_id)
-    print(user_name)
+        with metrics.span("llm_chat_stage_seconds", stage="username"):
+            user_name = await user_names.resolve(bot, event)
     image_urls = [
         seg.data["url"]
         for seg in message
@@ -234,7 +443,14 @@ async def handle_chat(
     # 如果全是空白字符,使用配置中的随机回复
     if not full_content.strip():
         reply = choice(plugin_config.responses.empty_message_replies)
-        await chat_handler.finish(Message(reply))
+        await finish_reply(bot, event, Message(reply))
+
+    # 不带图片/音视频的简单意图直接回复，不调用模型
+    if fastpath and not (image_urls or video_urls or audio_urls):
+        reply = fastpath.answer(full_content)
+        if reply is not None:
+            metrics.observe("llm_chat_stage_seconds", time.perf_counter() - request_start, stage="fastpath")
+            await finish_reply(bot, event, Message(reply))
     
     if image_urls:
         full_content += "\n图片URL：" + "\n".join(image_urls)
@@ -244,70 +460,90 @@ async def handle_chat(
         full_content += "\n音频URL：" + "\n".join(audio_urls)
     
     # 构建会话ID
-    if isinstance(event, GroupMessageEvent):
-        if plugin_config.plugin.group_chat_isolation:
-            thread_id = f"group_{event.group_id}_{event.user_id}"
-        else:
-            thread_id = f"group_{event.group_id}"
+    thread_id = get_thread_id(event)
+    logger.debug(f"Current thread: {thread_id}  user: {user_name}")
+    # 在发送给 LangGraph 的消息内容中添加用户名
+    if plugin_config.plugin.enable_username and user_name:
+        message_content = f"{user_name}: {full_content}"
     else:
-        thread_id = f"private_{event.user_id}"
-    print(f"Current thread: {thread_id}")
-    await cleanup_old_sessions()
-    session = await get_or_create_session(thread_id)
-    # 如果当前会话没有图，则创建一个
-    if session.graph is None:
-        session.graph = graph_builder.compile(checkpointer=session.memory)
+        message_content = full_content
+    if plugin_config.plugin.coalesce.enable:
+        # 合并同一会话短时间内的连发消息，只调用一次模型
+        with metrics.span("llm_chat_stage_seconds", stage="coalesce"):
+            collected = await coalescer.collect(thread_id, message_content, full_content)
+        if collected is None:
+            # 已并入同一会话正在等待的消息，由其统一回复
+            await chat_handler.finish()
+        message_content, full_content = collected
+    # 标记会话活跃，长期不活跃的会话由会话存储淘汰并卸载检查点
+    sessions.get_or_create(thread_id)
     try:
-        # 在发送给 LangGraph 的消息内容中添加用户名
-        if plugin_config.plugin.enable_username and user_name:
-            message_content = f"{user_name}: {full_content}"
-        else:
-            message_content = full_content
-        loop = asyncio.get_running_loop()
-        result = await loop.run_in_executor(
-            None,
-            session.graph.invoke,
-            {"messages": [HumanMessage(content=message_content)]},
-            {"configurable": {"thread_id": thread_id}},
-        )
-        formatted_output = format_messages_for_print(result["messages"])
-        print(formatted_output)
-        if not result["messages"]:
-            response = "对不起，我现在无法回答。"
-        else:
-            last_message = result["messages"][-1]
-            if isinstance(last_message, AIMessage):
-                if last_message.invalid_tool_calls:
-                    if isinstance(last_message.invalid_tool_calls, list) and last_message.invalid_tool_calls:
-                        response = f"工具调用失败: {last_message.invalid_tool_calls[0]['error']}"
-                    else:
-                        response = "工具调用失败，但没有错误信息"
-                elif last_message.content:
-                    response = last_message.content.strip()
+        graph_input = {"messages": [HumanMessage(content=message_content)]}
+        graph_config = {
+            "configurable": {
+                "thread_id": thread_id,
+                "model": models.resolve(thread_id, get_group_scope(event)),
+                # 工具路由只看用户原文，不受添加的用户名影响
+                "route_text": full_content,
+            },
+            "callbacks": graph_callbacks,
+        }
+        streamed_tail = None
+        queued_at = time.perf_counter()
+        # 同一会话的消息排队串行执行，避免并发读写同一 thread_id 的检查点
+        async with mailbox.slot(thread_id):
+            metrics.observe("llm_chat_stage_seconds", time.perf_counter() - queued_at, stage="queue")
+            with metrics.span("llm_chat_stage_seconds", stage="graph"):
+                if plugin_config.plugin.chunk.stream:
+                    # 流式模式：边生成边分段发送
+                    result, streamed_tail = await stream_reply(bot, event, graph_input, graph_config)
+                elif plugin_config.plugin.async_mode:
+                    # 异步模式：直接在事件循环上执行对话图
+                    result = await graph.ainvoke(graph_input, graph_config)
                 else:
-                    response = "对不起，我没有理解您的问题。"
-            elif isinstance(last_message, ToolMessage) and last_message.content:
-                response = (
-                    last_message.content
-                    if isinstance(last_message.content, str)
-                    else str(last_message.content)
-                )
-            else:
-                response = "对不起，我没有理解您的问题。"
+                    loop = asyncio.get_running_loop()
+                    result = await loop.run_in_executor(
+                        None,
+                        graph.invoke,
+                        graph_input,
+                        graph_config,
+                    )
+        metrics.observe("llm_chat_request_seconds", time.perf_counter() - request_start)
+        if summarizer:
+            summarizer.schedule(thread_id, graph_config["configurable"]["model"])
+        if recorder:
+            recorder.record(
+                "turn",
+                message_id=event.message_id,
+                thread_id=thread_id,
+                latency=round(time.perf_counter() - request_start, 3),
+            )
+        if turn_sampler():
+            # 只格式化本轮新增的消息，且只在日志等级允许时才格式化
+            logger.opt(lazy=True).info(
+                "[{}] 本轮消息:\n{}",
+                lambda: thread_id,
+                lambda: format_messages_for_print(turn_messages(result["messages"])),
+            )
+        response = extract_response(result["messages"])
+        if streamed_tail is not None:
+            # 已经流式发送了前面的分段，只需发送剩余部分
+            response = streamed_tail
     except Exception as e:
         error_message = str(e)
-        print(f"调用 LangGraph 时发生错误: {error_message}")
+        logger.opt(exception=e).error(f"调用 LangGraph 时发生错误: {error_message}")
         
-        async with sessions_lock:
-            if thread_id in sessions:
-                del sessions[thread_id]
+        sessions.remove(thread_id)
+        await checkpointer.adelete_thread(thread_id)
         
         # 只处理两种情况：list strip错误和其他所有错误
         if "'list' object has no attribute 'strip'" in error_message:
-            print("max_tokens设置过小，导致生成的工具参数不完整")
+            logger.warning("max_tokens设置过小，导致生成的工具参数不完整")
             response = plugin_config.responses.token_limit_error
         else:
             response = plugin_config.responses.general_error
+    if not response.strip():
+        await chat_handler.finish()
     # 检查是否有图片或视频链接或音频链接，并发送图片或视频或音频或文本消息
     image_match = re.search(r'https?://[^\s]+?\.(?:png|jpg|jpeg|gif|bmp|webp)', response, re.IGNORECASE)
     video_match = re.search(r'https?://[^\s]+?\.(?:mp4|avi|mov|mkv)', response, re.IGNORECASE)
@@ -318,47 +554,32 @@ async def handle_chat(
         message_content = re.sub(r'!\[.*?\]\((.*?)\)', r'\1', response)
         message_content = re.sub(r'\[.*?\]\((.*?)\)', r'\1', message_content)
         message_content = message_content.replace(image_url, "").strip()
-        try:
-            await chat_handler.finish(MessageSegment.image(image_url))
-        except ActionFailed:
-            await chat_handler.finish(Message(message_content) + MessageSegment.text(" (图片发送失败)"))
-        except MatcherException:
-            raise
-        except Exception as e :
-            await chat_handler.finish(Message(message_content) + MessageSegment.text(f" (未知错误： {e})"))
+        await finish_reply(
+            bot, event, MessageSegment.image(image_url),
+            fallback=Message(message_content) + MessageSegment.text(" (图片发送失败)"),
+        )
     elif video_match:
         video_url = video_match.group(0)
         message_content = re.sub(r'!\[.*?\]\((.*?)\)', r'\1', response)
         message_content = re.sub(r'\[.*?\]\((.*?)\)', r'\1', message_content)
         message_content = message_content.replace(video_url, "").strip()
-        try:
-            await chat_handler.finish(MessageSegment.video(video_url))
-        except ActionFailed:
-            await chat_handler.finish(Message(message_content) + MessageSegment.text(" (视频发送失败)"))
-        except MatcherException:
-            raise
-        except Exception as e:
-            await chat_handler.finish(Message(message_content) + MessageSegment.text(f" (未知错误： {e})"))
+        await finish_reply(
+            bot, event, MessageSegment.video(video_url),
+            fallback=Message(message_content) + MessageSegment.text(" (视频发送失败)"),
+        )
     elif audio_match:
         audio_url = audio_match.group(0)
         message_content = re.sub(r'!\[.*?\]\((.*?)\)', r'\1', response)
         message_content = re.sub(r'\[.*?\]\((.*?)\)', r'\1', message_content)
         message_content = message_content.replace(audio_url, "").strip()
-        try:
-            await chat_handler.finish(MessageSegment.record(audio_url))
-        except ActionFailed:
-            await chat_handler.finish(Message(message_content) + MessageSegment.text(" (音频发送失败)"))
-        except MatcherException:
-            raise
-        except Exception as e:
-            await chat_handler.finish(Message(message_content) + MessageSegment.text(f" (音频发送失败：{e})"))
+        await finish_reply(
+            bot, event, MessageSegment.record(audio_url),
+            fallback=Message(message_content) + MessageSegment.text(" (音频发送失败)"),
+        )
     else:
-        if plugin_config.plugin.chunk.enable:
-            if await send_in_chunks(response):
-                return
-            await chat_handler.finish(Message(response))
-        else:
-            await chat_handler.finish(Message(response))
+        if plugin_config.plugin.chunk.enable and send_in_chunks(bot, event, response):
+            await chat_handler.finish()
+        await finish_reply(bot, event, Message(response))
 
 
 
@@ -384,44 +605,78 @@ chat_command = on_command(
 @chat_command.handle()
 async def handle_chat_command(args: Message = CommandArg(), event: Event = None):
     """处理 chat model、chat clear、chat group 等命令"""
-    global llm, graph_builder, sessions, plugin_config
+    global plugin_config
 
     command_args = args.extract_plain_text().strip().split(maxsplit=1)
     if not command_args:
         await chat_command.finish(
             """请输入有效的命令：
-            'chat model <模型名字>' 切换模型 
+            'chat model <模型名字>' 切换默认模型
+            'chat pin <模型名字> [群号]' 为当前会话或指定群固定模型
+            'chat unpin [群号]' 取消当前会话或指定群的模型固定
             'chat clear' 清理会话
             'chat group <true/false>' 切换群聊会话隔离
             'chat down' 关闭对话功能
             'chat up' 开启对话功能
-            'chat chunk <true/false>' 切换分开发送功能"""
+            'chat chunk <true/false>' 切换分开发送功能
+            'chat async <true/false>' 切换异步执行模式
+            'chat queue' 查看会话排队情况
+            'chat stats' 查看会话统计
+            'chat backends' 查看模型后端状态
+            'chat tools' 查看工具隔舱、结果缓存和输出压缩统计"""
             )
     command = command_args[0].lower()
     if command == "model":
-        # 处理模型切换
+        # 处理默认模型切换，已固定模型的会话不受影响，历史保存在共享检查点中不会丢失
         if len(command_args) < 2:
-            try:
-                current_model = llm.model_name
-            except AttributeError:
-                current_model = llm.model
-            await chat_command.finish(f"当前模型: {current_model}")
-        model_name = command_args[1]
+            lines = [f"默认模型: {models.default}"]
+            if isinstance(event, MessageEvent):
+                lines.append(f"当前会话模型: {models.resolve(get_thread_id(event), get_group_scope(event))}")
+            lines.extend(f"{scope}: {name}" for scope, name in models.pins.items())
+            await chat_command.finish("\n".join(lines))
+        model_name = command_args[1].strip()
         try:
-            llm = get_llm(model_name)
-            graph_builder = build_graph(plugin_config, llm)
-            async with sessions_lock:
-                sessions.clear()
-            await chat_command.finish(f"已切换到模型: {model_name}")
+            models.set_default(model_name)
+            await chat_command.finish(f"已切换默认模型: {models.default}")
         except MatcherException:
             raise
         except Exception as e:
             await chat_command.finish(f"切换模型失败: {str(e)}")
+
+    elif command == "pin":
+        # 为当前会话或指定群固定模型
+        pin_args = command_args[1].split() if len(command_args) > 1 else []
+        if not pin_args:
+            await chat_command.finish("请输入模型名字，如 'chat pin <模型名字> [群号]'")
+        if len(pin_args) > 1:
+            scope = f"group_{pin_args[1]}"
+        elif isinstance(event, MessageEvent):
+            scope = get_thread_id(event)
+        else:
+            await chat_command.finish("请指定群号")
+        try:
+            models.pin(scope, pin_args[0])
+            await chat_command.finish(f"{scope} 已固定使用模型: {models.pins[scope]}")
+        except MatcherException:
+            raise
+        except Exception as e:
+            await chat_command.finish(f"固定模型失败: {str(e)}")
+
+    elif command == "unpin":
+        if len(command_args) > 1:
+            scope = f"group_{command_args[1].strip()}"
+        elif isinstance(event, MessageEvent):
+            scope = get_thread_id(event)
+        else:
+            await chat_command.finish("请指定群号")
+        if models.unpin(scope):
+            await chat_command.finish(f"{scope} 已取消模型固定，改用默认模型: {models.default}")
+        await chat_command.finish(f"{scope} 没有固定模型")
             
     elif command == "clear":
         # 处理清理历史会话
-        async with sessions_lock:
-            sessions.clear()
+        sessions.clear()
+        await checkpointer.adelete_all()
         await chat_command.finish("已清理所有历史会话。")
     
     elif command == "group":
@@ -439,19 +694,16 @@ async def handle_chat_command(args: Message = CommandArg(), event: Event = None)
             await chat_command.finish("请输入 true 或 false")
 
         # 清理对应会话
-        keys_to_remove = []
         if isinstance(event, GroupMessageEvent):
             prefix = f"group_{event.group_id}"
             if plugin_config.plugin.group_chat_isolation:
-                keys_to_remove = [key for key in sessions if key.startswith(f"{prefix}_")]
+                should_remove = lambda key: key.startswith(f"{prefix}_")
             else:
-                keys_to_remove = [key for key in sessions if key == prefix]
+                should_remove = lambda key: key == prefix
         else:
-            keys_to_remove = [key for key in sessions if key.startswith("private_")]
-
-        async with sessions_lock:
-            for key in keys_to_remove:
-                del sessions[key]
+            should_remove = lambda key: key.startswith("private_")
+        sessions.remove_where(should_remove)
+        await checkpointer.adelete_where(should_remove)
 
         await chat_command.finish(
             f"已{'禁用' if not plugin_config.plugin.group_chat_isolation else '启用'}群聊会话隔离，已清理对应会话"
@@ -476,5 +728,95 @@ async def handle_chat_command(args: Message = CommandArg(), event: Event = None)
             await chat_command.finish("已关闭分开发送回复功能")
         else:
             await chat_command.finish("请输入 true 或 false")
+    elif command == "async":
+        if len(command_args) < 2:
+            await chat_command.finish(f"当前异步执行模式: {plugin_config.plugin.async_mode}")
+        async_str = command_args[1].strip().lower()
+        if async_str == "true":
+            plugin_config.plugin.async_mode = True
+            await chat_command.finish("已开启异步执行模式")
+        elif async_str == "false":
+            plugin_config.plugin.async_mode = False
+            await chat_command.finish("已关闭异步执行模式，改为线程池执行")
+        else:
+            await chat_command.finish("请输入 true 或 false")
+    elif command == "queue":
+        hot_sessions = mailbox.depths()
+        if not hot_sessions:
+            await chat_command.finish("当前没有排队中的会话")
+        lines = [f"{thread_id}: {depth}" for thread_id, depth in hot_sessions]
+        await chat_command.finish(f"排队消息总数: {mailbox.total}\n" + "\n".join(lines))
+    elif command == "stats":
+        stats = sessions.stats()
+        name_stats = user_names.stats()
+        token_stats = get_counter(models.default).stats()
+        summary_stats = summarizer.stats() if summarizer else None
+        router_stats = router.stats() if router else None
+        fastpath_stats = fastpath.stats() if fastpath else None
+        await chat_command.finish(
+            f"常驻会话: {stats['resident']}/{sessions.max_sessions}\n"
+            f"命中: {stats['hits']}  新建: {stats['misses']}\n"
+            f"容量淘汰: {stats['evictions']}  过期清理: {stats['expirations']}\n"
+            f"用户名缓存: {name_stats['size']} 条  命中率: {name_stats['hit_rate']:.1%}  API 调用: {name_stats['api_calls']}\n"
+            f"连发合并: 收到 {coalescer.messages} 条，提交 {coalescer.turns} 轮\n"
+            f"token 计数({token_stats['encoding']}): 缓存 {token_stats['cached']} 条  "
+            f"命中 {token_stats['hits']}  计算 {token_stats['misses']}"
+            + (
+                f"\n滚动摘要: 折叠 {summary_stats['folds']} 次，共 {summary_stats['folded_messages']} 条消息"
+                if summarizer else ""
+            )
+            + (
+                f"\n工具路由: 按消息选择 {router_stats['routed']} 次  绑定全部 {router_stats['fallbacks']} 次  "
+                f"节省工具定义 {router_stats['schema_tokens_saved']} tokens"
+                if router else ""
+            )
+            + (
+                f"\n快速应答: {fastpath_stats['handled']}/{fastpath_stats['checked']} 条 "
+                f"({fastpath_stats['rate']:.1%})"
+                if fastpath else ""
+            )
+        )
+    elif command == "backends":
+        if not backend_pools:
+            await chat_command.finish("未配置模型后端池，使用 [llm] 中的单个密钥")
+        lines = []
+        for provider, pool in backend_pools.items():
+            for backend in pool.stats():
+                lines.append(
+                    f"[{provider}] {backend['name']}: {backend['state']}  权重 {backend['weight']}  "
+                    f"请求 {backend['requests']}  失败 {backend['failures']}"
+                )
+        if hedger is not None:
+            hedge_stats = hedger.stats()
+            lines.append(
+                f"对冲: 请求 {hedge_stats['requests']}  触发 {hedge_stats['fired']}  备用胜出 {hedge_stats['won']}"
+            )
+        await chat_command.finish("\n".join(lines))
+    elif command == "tools":
+        if not bulkheads and not tool_caches and not compactors:
+            await chat_command.finish("没有启用工具隔舱、结果缓存和输出压缩")
+        lines = []
+        for bulkhead in bulkheads.values():
+            tool_stats = bulkhead.stats()
+            lines.append(
+                f"{tool_stats['name']}: 执行中 {tool_stats['running']}/{tool_stats['max_concurrency']}  "
+                f"排队 {tool_stats['queued']}/{tool_stats['max_queue']}  调用 {tool_stats['calls']}  "
+                f"繁忙拒绝 {tool_stats['rejected']}  超时 {tool_stats['timeouts']}"
+            )
+        for cache in tool_caches.values():
+            cache_stats = cache.stats()
+            lines.append(
+                f"{cache_stats['name']} 缓存: {cache_stats['size']} 条  命中率 {cache_stats['hit_rate']:.1%}  "
+                f"合并并发 {cache_stats['shared']}"
+            )
+        for compactor in compactors.values():
+            compact_stats = compactor.stats()
+            if compact_stats["calls"]:
+                lines.append(
+                    f"{compact_stats['name']} 输出压缩: {compact_stats['calls']} 次  "
+                    f"{compact_stats['raw_tokens']} -> {compact_stats['compacted_tokens']} tokens  "
+                    f"节省 {compact_stats['saved']:.1%}"
+                )
+        await chat_command.finish("\n".join(lines))
     else:
         await chat_command.finish("无效的命令，请使用 'chat model <模型名字>'、'chat clear' 或 'chat group <true/false>'。")
@@ -0,0 +1,182 @@
+from typing import Any, Dict, Iterator, List, Optional, Set
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    令牌桶限流
+    rpm 为每分钟请求数，0 表示不限制；预约令牌时允许透支，返回需要等待的秒数
+    """
+
+    def __init__(self, rpm: int, burst: Optional[int] = None):
+        self.rate = rpm / 60
+        self.capacity = float(burst or max(1, rpm // 6)) if rpm else 0.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """获取一个令牌需要等待的秒数(不消耗令牌)"""
+        if not self.rate:
+            return 0.0
+        self._refill(time.monotonic())
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def reserve(self) -> float:
+        """预约一个令牌，返回需要等待的秒数"""
+        if not self.rate:
+            return 0.0
+        self._refill(time.monotonic())
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class CircuitBreaker:
+    """
+    熔断器
+    连续失败 threshold 次后熔断 cooldown 秒，之后放行一个试探请求，成功则恢复，失败则重新熔断
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.probing:
+            return True
+        return False
+
+    def on_attempt(self) -> None:
+        if self.state == "half_open":
+            self.probing = True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.probing = False
+        if self.opened_at is not None or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+class Backend:
+    """一个模型服务后端(服务商 + 地址 + 密钥)"""
+
+    def __init__(self, name: str, provider: str, base_url: str, api_key: str, weight: int,
+                 rpm: int, failure_threshold: int, cooldown: float):
+        self.name = name
+        self.provider = provider
+        self.base_url = base_url
+        self.api_key = api_key
+        self.weight = weight
+        self.bucket = TokenBucket(rpm)
+        self.breaker = CircuitBreaker(failure_threshold, cooldown)
+        # 平滑加权轮询的当前权重
+        self.current_weight = 0
+        self.requests = 0
+        self.failures = 0
+
+
+def is_retryable(error: BaseException) -> bool:
+    """限流(429)、服务端错误(5xx)、连接失败和超时可以换后端重试"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        # google api_core 的异常用 code 表示 HTTP 状态码
+        code = getattr(error, "code", None)
+        status = code if isinstance(code, int) else None
+    if status is not None:
+        return status == 429 or status >= 500
+    name = type(error).__name__
+    return "Connection" in name or "Timeout" in name or "ServiceUnavailable" in name
+
+
+class BackendPool:
+    """
+    同一服务商的后端池
+    按平滑加权轮询选择后端，跳过熔断中的后端并优先选择有令牌的后端，失败时依次换下一个后端
+    """
+
+    def __init__(self, backends: List[Backend]):
+        self.backends = backends
+        self._lock = threading.Lock()
+
+    def _select(self, tried: Set[str]) -> Optional[Backend]:
+        candidates = [b for b in self.backends if b.name not in tried and b.breaker.allow()]
+        if not candidates:
+            return None
+        ready = [b for b in candidates if b.bucket.wait_time() == 0]
+        if not ready:
+            # 都没有令牌时选择最快可用的后端
+            return min(candidates, key=lambda b: b.bucket.wait_time())
+        total = sum(b.weight for b in ready)
+        for backend in ready:
+            backend.current_weight += backend.weight
+        chosen = max(ready, key=lambda b: b.current_weight)
+        chosen.current_weight -= total
+        return chosen
+
+    def attempts(self) -> Iterator[tuple]:
+        """
+        依次产出 (后端, 需要等待的秒数)，调用方等待后发起请求并通过 record_success/record_failure 反馈结果
+        每个后端最多尝试一次，全部熔断时放行最早熔断的后端作为最后的尝试
+        """
+        tried: Set[str] = set()
+        while True:
+            with self._lock:
+                backend = self._select(tried)
+                if backend is None:
+                    if tried:
+                        return
+                    backend = min(self.backends, key=lambda b: b.breaker.opened_at or 0)
+                tried.add(backend.name)
+                backend.breaker.on_attempt()
+                backend.requests += 1
+                delay = backend.bucket.reserve()
+            yield backend, delay
+
+    def record_success(self, backend: Backend) -> None:
+        with self._lock:
+            backend.breaker.record_success()
+
+    def record_cancel(self, backend: Backend) -> None:
+        """请求被取消(如对冲落败)或因请求本身的错误失败，不计成败，只释放试探名额"""
+        with self._lock:
+            backend.breaker.probing = False
+
+    def record_failure(self, backend: Backend) -> None:
+        with self._lock:
+            backend.failures += 1
+            backend.breaker.record_failure()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "name": b.name,
+                "state": b.breaker.state,
+                "requests": b.requests,
+                "failures": b.failures,
+                "weight": b.weight,
+            }
+            for b in self.backends
+        ]
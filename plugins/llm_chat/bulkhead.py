@@ -0,0 +1,214 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict
+import asyncio
+import concurrent.futures
+import threading
+import time
+
+from langchain_core.messages import ToolMessage
+from langchain_core.tools import BaseTool, StructuredTool, ToolException
+
+from .log import logger
+from .metrics import registry as metrics
+
+BUSY_MESSAGE = "工具 {name} 当前繁忙(并发和排队已满)，本次没有执行，请不要重复调用，直接根据已有信息回复用户"
+TIMEOUT_MESSAGE = "工具 {name} 执行超时(超过 {timeout:g} 秒)，结果未知，请不要重复调用，直接根据已有信息回复用户"
+
+
+class Bulkhead:
+    """
+    工具隔舱
+    每个工具有独立的并发上限、排队上限、线程池和截止时间，一个工具的依赖变慢或挂起时只占用自己的名额，
+    不会耗尽默认线程池拖住其他对话。名额已满时立即拒绝，超过截止时间时不再等待结果，
+    两种情况都抛出 ToolException，由工具返回 status="error" 的 ToolMessage
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, timeout: float):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix=f"tool-{name}")
+        self._lock = threading.Lock()
+        # 已接纳(执行中 + 排队中)和执行中的调用数
+        self.admitted = 0
+        self.running = 0
+        self._semaphores: Dict[asyncio.AbstractEventLoop, asyncio.Semaphore] = {}
+        self.calls = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    @property
+    def queued(self) -> int:
+        return self.admitted - self.running
+
+    def _admit(self) -> None:
+        with self._lock:
+            if self.admitted >= self.max_concurrency + self.max_queue:
+                self.rejected += 1
+                metrics.inc("llm_chat_tool_rejected_total", tool=self.name, reason="busy")
+                logger.warning(f"工具 {self.name} 繁忙，拒绝本次调用")
+                raise ToolException(BUSY_MESSAGE.format(name=self.name))
+            self.admitted += 1
+            self.calls += 1
+
+    def _release(self, *_: Any) -> None:
+        with self._lock:
+            self.admitted -= 1
+
+    def _timed_out(self) -> ToolException:
+        self.timeouts += 1
+        metrics.inc("llm_chat_tool_rejected_total", tool=self.name, reason="timeout")
+        logger.warning(f"工具 {self.name} 超过 {self.timeout:g} 秒未返回")
+        return ToolException(TIMEOUT_MESSAGE.format(name=self.name, timeout=self.timeout))
+
+    def _execute(self, func: Callable[[], Any], queued_at: float) -> Any:
+        metrics.observe("llm_chat_tool_queue_seconds", time.monotonic() - queued_at, tool=self.name)
+        with self._lock:
+            self.running += 1
+        try:
+            return func()
+        finally:
+            with self._lock:
+                self.running -= 1
+
+    def _submit(self, func: Callable[[], Any]) -> Future:
+        self._admit()
+        future = self.executor.submit(self._execute, func, time.monotonic())
+        # 名额在线程真正结束(或排队中被取消)时才归还，超时返回不会让挂起的调用越过并发上限
+        future.add_done_callback(self._release)
+        return future
+
+    def run(self, func: Callable[[], Any]) -> Any:
+        """在隔舱线程池中执行同步调用，阻塞至结果返回或截止时间"""
+        future = self._submit(func)
+        try:
+            return future.result(timeout=self.timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise self._timed_out() from None
+
+    async def arun_sync(self, func: Callable[[], Any]) -> Any:
+        """在隔舱线程池中执行同步调用，事件循环上等待结果"""
+        future = self._submit(func)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            raise self._timed_out() from None
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    async def arun(self, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """在事件循环上执行异步调用，排队等待的时间计入截止时间"""
+        self._admit()
+        queued_at = time.monotonic()
+
+        async def guarded():
+            async with self._semaphore():
+                metrics.observe("llm_chat_tool_queue_seconds", time.monotonic() - queued_at, tool=self.name)
+                with self._lock:
+                    self.running += 1
+                try:
+                    return await factory()
+                finally:
+                    with self._lock:
+                        self.running -= 1
+
+        try:
+            return await asyncio.wait_for(guarded(), self.timeout)
+        except asyncio.TimeoutError:
+            raise self._timed_out() from None
+        finally:
+            self._release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "running": self.running,
+            "queued": self.queued,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "calls": self.calls,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+        }
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def has_coroutine(tool: BaseTool) -> bool:
+    """工具是否有原生的异步实现(没有时 ainvoke 会占用默认线程池)"""
+    if isinstance(tool, StructuredTool):
+        return tool.coroutine is not None
+    return type(tool)._arun is not BaseTool._arun
+
+
+# 内层调用不传递回调，耗时和录制只记录在外层工具上
+_INNER_CONFIG = {"callbacks": []}
+
+
+def _tool_call(tool: BaseTool, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    return {"type": "tool_call", "name": tool.name, "args": kwargs, "id": f"inner-{tool.name}"}
+
+
+def _unwrap(output: Any) -> Any:
+    """取出内层工具的输出，内层已处理的错误(status="error")重新抛出，让外层同样按错误返回"""
+    if isinstance(output, ToolMessage):
+        if output.status == "error":
+            raise ToolException(output.content)
+        return output.content
+    return output
+
+
+def invoke_inner(tool: BaseTool, kwargs: Dict[str, Any]) -> Any:
+    return _unwrap(tool.invoke(_tool_call(tool, kwargs), _INNER_CONFIG))
+
+
+async def ainvoke_inner(tool: BaseTool, kwargs: Dict[str, Any]) -> Any:
+    return _unwrap(await tool.ainvoke(_tool_call(tool, kwargs), _INNER_CONFIG))
+
+
+def isolate(tool: BaseTool, bulkhead: Bulkhead) -> BaseTool:
+    """把工具包装为在隔舱中执行的同名工具，参数结构保持不变"""
+
+    def func(**kwargs: Any) -> Any:
+        return bulkhead.run(lambda: invoke_inner(tool, kwargs))
+
+    async def coroutine(**kwargs: Any) -> Any:
+        if has_coroutine(tool):
+            return await bulkhead.arun(lambda: ainvoke_inner(tool, kwargs))
+        return await bulkhead.arun_sync(lambda: invoke_inner(tool, kwargs))
+
+    return StructuredTool.from_function(
+        func=func,
+        coroutine=coroutine,
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+        return_direct=tool.return_direct,
+        handle_tool_error=True,
+    )
+
+
+# 工具名 -> 隔舱
+bulkheads: Dict[str, Bulkhead] = {}
+
+
+def get_bulkhead(name: str, options: Dict[str, Any]) -> Bulkhead:
+    bulkhead = bulkheads.get(name)
+    if bulkhead is None:
+        bulkhead = bulkheads[name] = Bulkhead(
+            name,
+            max_concurrency=options.get("max_concurrency", 4),
+            max_queue=options.get("max_queue", 8),
+            timeout=options.get("timeout", 60),
+        )
+        metrics.gauge("llm_chat_tool_running", lambda: bulkhead.running, tool=name)
+        metrics.gauge("llm_chat_tool_queued", lambda: bulkhead.queued, tool=name)
+    return bulkhead
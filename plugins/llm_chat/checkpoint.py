@@ -0,0 +1,358 @@
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Sequence, Tuple
+from pathlib import Path
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import ChannelVersions, Checkpoint, CheckpointMetadata
+from langgraph.checkpoint.memory import MemorySaver
+from .log import logger
+import asyncio
+import sqlite3
+import threading
+
+
+class CompactingSaver(MemorySaver):
+    """
+    只保留每个会话最近 N 个检查点的检查点存储
+    - 未指定 path 时为纯内存存储
+    - 指定 path 时使用 SQLite(WAL) 持久化：写入先进入内存缓冲，由后台线程批量落盘；
+      会话历史在首次访问其 thread_id 时才从磁盘加载，淘汰后从内存中卸载
+    - 异步接口(包括 adelete_*)在需要读写数据库时转到线程中执行，不在事件循环上读写数据库
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        keep_last: int = 2,
+        flush_interval: float = 1.0,
+        flush_batch: int = 100,
+    ):
+        super().__init__()
+        self.path = path
+        self.keep_last = keep_last
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        # 内存数据锁(执行器模式下 put 来自线程池)
+        self._lock = threading.RLock()
+        # 数据库连接锁，落盘和加载互斥
+        self._db_lock = threading.Lock()
+        # 已从磁盘加载到内存的 thread_id
+        self._loaded = set()
+        # 待落盘的检查点和写入，键为主键，重复写入自动合并
+        self._pending_checkpoints: Dict[Tuple[str, str, str], tuple] = {}
+        self._pending_writes: Dict[Tuple[str, str, str, str, int], tuple] = {}
+        # (thread_id, checkpoint_ns) -> 保留的最旧检查点 ID，落盘时删除更旧的记录
+        self._pending_prunes: Dict[Tuple[str, str], str] = {}
+        self._conn = None
+        self._flusher = None
+        self._stopped = threading.Event()
+        self._wakeup = threading.Event()
+        if path:
+            self._open(path)
+
+    def _open(self, path: str) -> None:
+        """打开数据库并启动后台落盘线程"""
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL DEFAULT '',
+                checkpoint_id TEXT NOT NULL,
+                parent_checkpoint_id TEXT,
+                type TEXT,
+                checkpoint BLOB,
+                metadata_type TEXT,
+                metadata BLOB,
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+            );
+            CREATE TABLE IF NOT EXISTS writes (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL DEFAULT '',
+                checkpoint_id TEXT NOT NULL,
+                task_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                channel TEXT NOT NULL,
+                type TEXT,
+                value BLOB,
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+            );
+            """
+        )
+        self._flusher = threading.Thread(
+            target=self._flush_loop, name="checkpoint-flusher", daemon=True
+        )
+        self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                logger.error(f"检查点落盘失败: {e}")
+
+    def flush(self) -> None:
+        """将缓冲中的检查点写入磁盘，并删除超出保留数量的旧记录"""
+        if self._conn is None:
+            return
+        with self._db_lock:
+            with self._lock:
+                if not (self._pending_checkpoints or self._pending_writes or self._pending_prunes):
+                    return
+                checkpoints = list(self._pending_checkpoints.values())
+                writes = list(self._pending_writes.values())
+                prunes = list(self._pending_prunes.items())
+                self._pending_checkpoints.clear()
+                self._pending_writes.clear()
+                self._pending_prunes.clear()
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    checkpoints,
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    writes,
+                )
+                for (thread_id, checkpoint_ns), oldest_id in prunes:
+                    params = (thread_id, checkpoint_ns, oldest_id)
+                    self._conn.execute(
+                        "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+                        params,
+                    )
+                    self._conn.execute(
+                        "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+                        params,
+                    )
+
+    def close(self) -> None:
+        """停止后台线程，写入剩余缓冲并关闭数据库"""
+        if self._conn is None:
+            return
+        self._stopped.set()
+        self._wakeup.set()
+        self._flusher.join()
+        self.flush()
+        self._conn.close()
+        self._conn = None
+
+    def _ensure_loaded(self, thread_id: str) -> None:
+        """首次访问 thread_id 时从磁盘加载其检查点"""
+        if self._conn is None or thread_id in self._loaded:
+            return
+        # 先落盘该会话可能残留的缓冲，保证读到最新数据
+        self.flush()
+        with self._db_lock:
+            checkpoint_rows = self._conn.execute(
+                "SELECT checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata "
+                "FROM checkpoints WHERE thread_id = ?",
+                (thread_id,),
+            ).fetchall()
+            write_rows = self._conn.execute(
+                "SELECT checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value "
+                "FROM writes WHERE thread_id = ?",
+                (thread_id,),
+            ).fetchall()
+        with self._lock:
+            if thread_id in self._loaded:
+                return
+            for ns, checkpoint_id, parent_id, type_, checkpoint, metadata_type, metadata in checkpoint_rows:
+                self.storage[thread_id][ns].setdefault(
+                    checkpoint_id, ((type_, checkpoint), (metadata_type, metadata), parent_id)
+                )
+            for ns, checkpoint_id, task_id, idx, channel, type_, value in write_rows:
+                self.writes[(thread_id, ns, checkpoint_id)].setdefault(
+                    (task_id, idx), (task_id, channel, (type_, value))
+                )
+            self._loaded.add(thread_id)
+
+    def _prune(self, thread_id: str, checkpoint_ns: str) -> None:
+        """只保留最近 keep_last 个检查点，调用方需持有 _lock"""
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        if len(checkpoints) <= self.keep_last:
+            return
+        checkpoint_ids = sorted(checkpoints)
+        for checkpoint_id in checkpoint_ids[:-self.keep_last]:
+            del checkpoints[checkpoint_id]
+            self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+            self._pending_checkpoints.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+        if self._conn is not None:
+            self._pending_prunes[(thread_id, checkpoint_ns)] = checkpoint_ids[-self.keep_last]
+
+    def get_tuple(self, config: RunnableConfig):
+        self._ensure_loaded(config["configurable"]["thread_id"])
+        with self._lock:
+            return super().get_tuple(config)
+
+    def list(self, config: Optional[RunnableConfig], **kwargs: Any):
+        """列出检查点；未指定 thread_id 时只包含已加载到内存的会话"""
+        if config:
+            self._ensure_loaded(config["configurable"]["thread_id"])
+        with self._lock:
+            items = list(super().list(config, **kwargs))
+        yield from items
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        self._ensure_loaded(thread_id)
+        with self._lock:
+            next_config = super().put(config, checkpoint, metadata, new_versions)
+            if self._conn is not None:
+                saved, metadata_saved, parent_id = self.storage[thread_id][checkpoint_ns][checkpoint["id"]]
+                self._pending_checkpoints[(thread_id, checkpoint_ns, checkpoint["id"])] = (
+                    thread_id, checkpoint_ns, checkpoint["id"], parent_id,
+                    saved[0], saved[1], metadata_saved[0], metadata_saved[1],
+                )
+            self._prune(thread_id, checkpoint_ns)
+            pending = len(self._pending_checkpoints) + len(self._pending_writes)
+        if pending >= self.flush_batch:
+            self._wakeup.set()
+        return next_config
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        self._ensure_loaded(thread_id)
+        with self._lock:
+            super().put_writes(config, writes, task_id)
+            if self._conn is None:
+                return
+            saved_writes = self.writes.get((thread_id, checkpoint_ns, checkpoint_id), {})
+            for (write_task_id, idx), (_, channel, value) in saved_writes.items():
+                if write_task_id != task_id:
+                    continue
+                self._pending_writes[(thread_id, checkpoint_ns, checkpoint_id, task_id, idx)] = (
+                    thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, value[0], value[1],
+                )
+
+    async def _offload(self, thread_id: str, func: Callable, *args: Any) -> Any:
+        """会话已在内存中时直接执行，需要从磁盘加载时放到线程中执行"""
+        if self._conn is None or thread_id in self._loaded:
+            return func(*args)
+        return await asyncio.to_thread(func, *args)
+
+    async def aget_tuple(self, config: RunnableConfig):
+        return await self._offload(config["configurable"]["thread_id"], self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], **kwargs: Any) -> AsyncIterator:
+        if config:
+            thread_id = config["configurable"]["thread_id"]
+            items = await self._offload(thread_id, lambda: list(self.list(config, **kwargs)))
+        else:
+            items = list(self.list(config, **kwargs))
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await self._offload(
+            config["configurable"]["thread_id"], self.put, config, checkpoint, metadata, new_versions
+        )
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+    ) -> None:
+        await self._offload(config["configurable"]["thread_id"], self.put_writes, config, writes, task_id)
+
+    def _drop_memory(self, thread_id: str) -> None:
+        """从内存中移除会话的检查点，调用方需持有 _lock"""
+        namespaces = self.storage.pop(thread_id, {})
+        for checkpoint_ns, checkpoints in namespaces.items():
+            for checkpoint_id in checkpoints:
+                self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+        self._loaded.discard(thread_id)
+
+    def evict(self, thread_id: str) -> None:
+        """
+        从内存卸载会话，持久化模式下磁盘数据保留，下次访问时重新加载
+        纯内存模式下等同于删除
+        """
+        if self._conn is None:
+            self.delete_thread(thread_id)
+            return
+        # 未落盘的缓冲留给后台线程写入，重新加载前 _ensure_loaded 会先落盘
+        with self._lock:
+            self._drop_memory(thread_id)
+        self._wakeup.set()
+
+    def delete_thread(self, thread_id: str) -> None:
+        """彻底删除会话的全部检查点"""
+        with self._db_lock:
+            with self._lock:
+                self._drop_memory(thread_id)
+                for key in [key for key in self._pending_checkpoints if key[0] == thread_id]:
+                    del self._pending_checkpoints[key]
+                for key in [key for key in self._pending_writes if key[0] == thread_id]:
+                    del self._pending_writes[key]
+                for key in [key for key in self._pending_prunes if key[0] == thread_id]:
+                    del self._pending_prunes[key]
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+                    self._conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+
+    def delete_where(self, predicate: Callable[[str], bool]) -> None:
+        """删除 thread_id 满足条件的会话(包括未加载到内存的会话)"""
+        with self._lock:
+            thread_ids = set(self.storage)
+        if self._conn is not None:
+            with self._db_lock:
+                rows = self._conn.execute("SELECT DISTINCT thread_id FROM checkpoints").fetchall()
+            thread_ids.update(row[0] for row in rows)
+        for thread_id in thread_ids:
+            if predicate(thread_id):
+                self.delete_thread(thread_id)
+
+    async def _run_io(self, func: Callable, *args: Any) -> Any:
+        """持久化模式下放到线程中执行，纯内存模式直接执行"""
+        if self._conn is None:
+            return func(*args)
+        return await asyncio.to_thread(func, *args)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await self._run_io(self.delete_thread, thread_id)
+
+    async def adelete_where(self, predicate: Callable[[str], bool]) -> None:
+        await self._run_io(self.delete_where, predicate)
+
+    async def adelete_all(self) -> None:
+        await self._run_io(self.delete_all)
+
+    def delete_all(self) -> None:
+        """删除所有会话的检查点"""
+        with self._db_lock:
+            with self._lock:
+                self.storage.clear()
+                self.writes.clear()
+                self._loaded.clear()
+                self._pending_checkpoints.clear()
+                self._pending_writes.clear()
+                self._pending_prunes.clear()
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute("DELETE FROM checkpoints")
+                    self._conn.execute("DELETE FROM writes")
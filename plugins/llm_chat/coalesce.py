@@ -0,0 +1,55 @@
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import time
+
+
+class _Burst:
+    def __init__(self, content: str, raw: str):
+        now = time.monotonic()
+        self.parts: List[str] = [content]
+        self.raw_parts: List[str] = [raw]
+        self.first = now
+        self.last = now
+
+
+class BurstCoalescer:
+    """
+    连发消息合并
+    同一 thread_id 在窗口期内连续到达的消息合并为一条，由第一条消息的处理者统一提交给模型，
+    每来一条新消息窗口顺延，但总等待时间不超过 max_wait
+    """
+
+    def __init__(self, window: float, max_wait: float):
+        self.window = window
+        self.max_wait = max_wait
+        self._bursts: Dict[str, _Burst] = {}
+        # 收到的消息数和实际提交给模型的轮数
+        self.messages = 0
+        self.turns = 0
+
+    async def collect(self, thread_id: str, content: str, raw: Optional[str] = None) -> Optional[Tuple[str, str]]:
+        """
+        提交一条消息，raw 为不带用户名等前缀的原始文本(默认同 content)
+        返回合并后的内容和原始文本，若消息已并入同一会话中正在等待的消息则返回 None
+        """
+        self.messages += 1
+        raw = content if raw is None else raw
+        burst = self._bursts.get(thread_id)
+        if burst is not None:
+            burst.parts.append(content)
+            burst.raw_parts.append(raw)
+            burst.last = time.monotonic()
+            return None
+
+        burst = self._bursts[thread_id] = _Burst(content, raw)
+        try:
+            while True:
+                deadline = min(burst.last + self.window, burst.first + self.max_wait)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                await asyncio.sleep(remaining)
+        finally:
+            del self._bursts[thread_id]
+        self.turns += 1
+        return "\n".join(burst.parts), "\n".join(burst.raw_parts)
@@ -0,0 +1,178 @@
+from typing import Any, Dict, List, Optional, Tuple
+import json
+import re
+import threading
+
+from langchain_core.tools import BaseTool, StructuredTool
+
+from .bulkhead import ainvoke_inner, has_coroutine, invoke_inner
+from .metrics import registry as metrics
+from .tokens import get_counter
+
+_MISSING = object()
+# 路径片段，如 hourly[:12] -> ("hourly", 12)，weather[] -> ("weather", -1)，普通字段的数量为 None
+_SEGMENT_PATTERN = re.compile(r"^([^\[\]]*)(?:\[(?::(\d+))?\])?$")
+_HTML_TAG_PATTERN = re.compile(r"<[^<>\n]+>")
+_MD_IMAGE_PATTERN = re.compile(r"!\[([^\]]*)\]\([^)]*\)")
+_SPACES_PATTERN = re.compile(r"[ \t　]+")
+_BLANK_LINES_PATTERN = re.compile(r"\n{3,}")
+
+
+def parse_path(path: str) -> List[Tuple[str, Optional[int]]]:
+    """解析字段路径：用 . 分隔，列表字段后加 [] 表示取全部元素，[:N] 表示只取前 N 个"""
+    segments = []
+    for part in path.split("."):
+        match = _SEGMENT_PATTERN.match(part)
+        if match is None:
+            raise ValueError(f"无效的字段路径: {path}")
+        name, limit = match.groups()
+        if "[" not in part:
+            segments.append((name, None))
+        else:
+            segments.append((name, int(limit) if limit else -1))
+    return segments
+
+
+def _extract(value: Any, segments: List[Tuple[str, Optional[int]]]) -> Any:
+    if not segments:
+        return value
+    (name, limit), rest = segments[0], segments[1:]
+    if name:
+        if not isinstance(value, dict) or name not in value:
+            return _MISSING
+        value = value[name]
+    if limit is None:
+        inner = _extract(value, rest)
+    else:
+        if not isinstance(value, list):
+            return _MISSING
+        items = value if limit < 0 else value[:limit]
+        inner = [item for item in (_extract(item, rest) for item in items) if item is not _MISSING]
+    if inner is _MISSING:
+        return _MISSING
+    return {name: inner} if name else inner
+
+
+def _merge(a: Any, b: Any) -> Any:
+    if isinstance(a, dict) and isinstance(b, dict):
+        for key, value in b.items():
+            a[key] = _merge(a[key], value) if key in a else value
+        return a
+    if isinstance(a, list) and isinstance(b, list) and len(a) == len(b):
+        return [_merge(x, y) for x, y in zip(a, b)]
+    return b
+
+
+def project(data: Any, paths: List[List[Tuple[str, Optional[int]]]]) -> Any:
+    """只保留指定路径的字段，各路径的结果合并为一棵树；没有任何路径命中时返回原数据"""
+    result = _MISSING
+    for segments in paths:
+        value = _extract(data, segments)
+        if value is not _MISSING:
+            result = value if result is _MISSING else _merge(result, value)
+    return data if result is _MISSING else result
+
+
+def strip_markup(text: str) -> str:
+    """去掉 HTML 标签和 markdown 图片，压缩多余的空白和空行"""
+    text = _MD_IMAGE_PATTERN.sub(lambda m: m.group(1), text)
+    text = _HTML_TAG_PATTERN.sub("", text)
+    text = _SPACES_PATTERN.sub(" ", text)
+    text = "\n".join(line.strip() for line in text.splitlines())
+    return _BLANK_LINES_PATTERN.sub("\n\n", text).strip()
+
+
+class Compactor:
+    """
+    工具输出压缩
+    工具结果会作为 ToolMessage 保存在历史中，之后每一轮都会发给模型，写入历史前按工具配置压缩：
+    JSON 结果只保留指定字段并去掉缩进，文本结果去掉标记和多余空白，最后按 token 上限截断
+    """
+
+    def __init__(self, name: str, max_tokens: int, fields: Optional[List[str]] = None, markup: bool = False):
+        self.name = name
+        self.max_tokens = max_tokens
+        self.paths = [parse_path(path) for path in fields or []]
+        self.markup = markup
+        self.counter = get_counter(None)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.raw_tokens = 0
+        self.compacted_tokens = 0
+
+    def compact(self, output: Any) -> Any:
+        if not isinstance(output, str):
+            return output
+        text = output
+        stripped = output.lstrip()
+        if stripped[:1] in ("{", "["):
+            try:
+                data = json.loads(output)
+            except ValueError:
+                data = _MISSING
+            if data is not _MISSING:
+                if self.paths:
+                    data = project(data, self.paths)
+                text = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+        if self.markup:
+            text = strip_markup(text)
+        if self.max_tokens:
+            text = self.counter.truncate(text, self.max_tokens)
+        self._observe(output, text)
+        return text
+
+    def _observe(self, raw: str, compacted: str) -> None:
+        raw_tokens = self.counter.count_text(raw)
+        compacted_tokens = self.counter.count_text(compacted) if compacted is not raw else raw_tokens
+        with self._lock:
+            self.calls += 1
+            self.raw_tokens += raw_tokens
+            self.compacted_tokens += compacted_tokens
+        metrics.inc("llm_chat_tool_output_tokens_total", raw_tokens, tool=self.name, stage="raw")
+        metrics.inc("llm_chat_tool_output_tokens_total", compacted_tokens, tool=self.name, stage="compacted")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "calls": self.calls,
+            "raw_tokens": self.raw_tokens,
+            "compacted_tokens": self.compacted_tokens,
+            "saved": 1 - self.compacted_tokens / self.raw_tokens if self.raw_tokens else 0.0,
+        }
+
+
+def compacted(tool: BaseTool, compactor: Compactor) -> BaseTool:
+    """把工具包装为输出经过压缩的同名工具，参数结构保持不变"""
+
+    def func(**kwargs: Any) -> Any:
+        return compactor.compact(invoke_inner(tool, kwargs))
+
+    async def coroutine(**kwargs: Any) -> Any:
+        return compactor.compact(await ainvoke_inner(tool, kwargs))
+
+    return StructuredTool.from_function(
+        func=func,
+        # 只有同步实现的工具不提供异步版本，由隔舱放进自己的线程池执行
+        coroutine=coroutine if has_coroutine(tool) else None,
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+        return_direct=tool.return_direct,
+        handle_tool_error=True,
+    )
+
+
+# 工具名 -> 输出压缩
+compactors: Dict[str, Compactor] = {}
+
+
+def get_compactor(name: str, options: Dict[str, Any]) -> Compactor:
+    compactor = compactors.get(name)
+    if compactor is None:
+        compactor = compactors[name] = Compactor(
+            name,
+            max_tokens=options.get("max_tokens", 0),
+            fields=options.get("fields"),
+            markup=options.get("strip_markup", False),
+        )
+    return compactor
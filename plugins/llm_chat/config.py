@@ -1,8 +1,20 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic import BaseModel, Field
 from pathlib import Path
+import os
 import tomli
 
+class BackendConfig(BaseModel):
+    """模型服务后端配置，同一服务商可配置多个地址/密钥做负载均衡和故障转移"""
+    name: str
+    provider: str = "openai"  # openai / groq / google
+    base_url: str = ""
+    api_key: str = ""
+    weight: int = Field(default=1, ge=1)
+    rpm: int = Field(default=0, ge=0)
+    failure_threshold: int = Field(default=3, ge=1)
+    cooldown: float = Field(default=30.0, gt=0)
+
 class LLMConfig(BaseModel):
     """LLM 配置"""
     model: str
@@ -14,7 +26,11 @@ class LLMConfig(BaseModel):
     top_p: float = 1.0
     max_tokens: int = 1000
     system_prompt: Optional[str] = None
-    max_context_messages: int = 10
+    max_context_messages: int = Field(default=10, ge=0)
+    max_context_tokens: int = Field(default=3000, gt=0)
+    max_system_prompt_tokens: int = Field(default=1500, gt=0)
+    max_tool_output_tokens: int = Field(default=1000, gt=0)
+    backends: List[BackendConfig] = []
 
 class ChunkConfig(BaseModel):
     """分段发送配置"""
@@ -22,6 +38,79 @@ class ChunkConfig(BaseModel):
     words: List[str] = ["||"]
     max_time: float = 5.0
     char_per_s: int = 5
+    stream: bool = False
+    sentence_ends: List[str] = []
+
+class CheckpointConfig(BaseModel):
+    """会话检查点存储配置"""
+    backend: str = "memory"
+    path: str = "data/checkpoints.db"
+    keep_last: int = Field(default=2, ge=1)
+    flush_interval: float = Field(default=1.0, gt=0)
+    flush_batch: int = Field(default=100, gt=0)
+
+class CoalesceConfig(BaseModel):
+    """连发消息合并配置"""
+    enable: bool = False
+    window_ms: int = Field(default=1500, ge=0)
+    max_wait_ms: int = Field(default=4000, ge=0)
+
+class RecorderConfig(BaseModel):
+    """流量录制与回放配置"""
+    mode: str = "off"  # off / record / replay
+    path: str = "data/trace.jsonl"
+    latency_scale: float = Field(default=1.0, ge=0)
+
+class LogConfig(BaseModel):
+    """日志配置"""
+    enqueue: bool = True
+    sample_rate: float = Field(default=1.0, ge=0, le=1)
+    max_per_second: int = Field(default=20, ge=0)
+
+class HedgeConfig(BaseModel):
+    """对冲请求配置"""
+    enable: bool = False
+    percentile: float = Field(default=95, gt=0, lt=100)
+    min_delay_ms: int = Field(default=300, ge=0)
+    default_delay_ms: int = Field(default=2000, ge=0)
+    min_samples: int = Field(default=20, ge=1)
+
+class OutboxConfig(BaseModel):
+    """出站消息调度配置"""
+    global_rpm: int = Field(default=120, ge=0)
+    target_interval_ms: int = Field(default=1000, ge=0)
+    retries: int = Field(default=2, ge=0)
+    retry_backoff_ms: int = Field(default=1000, ge=0)
+    shutdown_timeout: float = Field(default=5.0, ge=0)
+
+class SummaryConfig(BaseModel):
+    """滚动摘要配置"""
+    enable: bool = False
+    keep_ratio: float = Field(default=0.5, gt=0, lt=1)
+    max_summary_tokens: int = Field(default=400, gt=0)
+    model: str = ""
+
+class RouterConfig(BaseModel):
+    """工具路由配置"""
+    enable: bool = False
+    similarity: bool = True
+    threshold: float = Field(default=0.35, ge=0, le=1)
+    sticky_turns: int = Field(default=1, ge=0)
+    always: List[str] = []
+    keywords: Dict[str, List[str]] = {}
+
+class FastPathRule(BaseModel):
+    """快速应答规则"""
+    name: str = ""
+    patterns: List[str]
+    handler: str = "reply"  # time / help / reply
+    replies: List[str]
+    timezone: str = "Asia/Shanghai"
+
+class FastPathConfig(BaseModel):
+    """快速应答配置"""
+    enable: bool = False
+    rules: List[FastPathRule] = []
 
 class PluginConfig(BaseModel):
     """插件配置"""
@@ -31,8 +120,25 @@ class PluginConfig(BaseModel):
     enable_private: bool = True
     enable_group: bool = True
     max_sessions: int = Field(default=1000, gt=0)
+    session_ttl: float = Field(default=0, ge=0)
+    session_sweep_interval: float = Field(default=60, gt=0)
     enable_username: bool = False
+    username_cache_ttl: float = Field(default=3600, gt=0)
+    username_cache_size: int = Field(default=10000, gt=0)
+    async_mode: bool = False
+    max_concurrency: int = Field(default=32, gt=0)
     chunk: ChunkConfig = ChunkConfig()
+    checkpoint: CheckpointConfig = CheckpointConfig()
+    coalesce: CoalesceConfig = CoalesceConfig()
+    recorder: RecorderConfig = RecorderConfig()
+    log: LogConfig = LogConfig()
+    hedge: HedgeConfig = HedgeConfig()
+    outbox: OutboxConfig = OutboxConfig()
+    summary: SummaryConfig = SummaryConfig()
+    router: RouterConfig = RouterConfig()
+    fastpath: FastPathConfig = FastPathConfig()
+    # 会话/群固定使用的模型，键为 thread_id(如 private_123、group_123_456)或 group_<群号>
+    model_pins: Dict[str, str] = {}
     command_start: str = "?"
     superusers: str = ""
 
@@ -52,7 +158,8 @@ class Config(BaseModel):
     def load_config(cls) -> "Config":
         """从 config.toml 加载配置"""
         root_path = Path(__file__).resolve().parents[2]
-        config_path = root_path / "config.toml"
+        # 环境变量 LLMQ_CONFIG 可指定其他配置文件(如压测)
+        config_path = Path(os.environ.get("LLMQ_CONFIG", root_path / "config.toml"))
         
         if not config_path.exists():
             raise RuntimeError(f"Config file not found at {config_path}")
@@ -68,9 +175,14 @@ class Config(BaseModel):
                 temperature=toml_config["llm"].get("temperature", 0.7),
                 max_tokens=toml_config["llm"].get("max_tokens", 2000),
                 system_prompt=toml_config["llm"]["system_prompt"],
+                max_context_messages=toml_config["llm"].get("max_context_messages", 10),
+                max_context_tokens=toml_config["llm"].get("max_context_tokens", 3000),
+                max_system_prompt_tokens=toml_config["llm"].get("max_system_prompt_tokens", 1500),
+                max_tool_output_tokens=toml_config["llm"].get("max_tool_output_tokens", 1000),
                 google_api_key=toml_config["llm"].get("google_api_key", ""),
                 top_p=toml_config["llm"].get("top_p", 1.0),
                 groq_api_key=toml_config["llm"].get("groq_api_key", ""),
+                backends=[BackendConfig(**backend) for backend in toml_config["llm"].get("backends", [])],
             )
             
             plugin_config = PluginConfig(
@@ -80,14 +192,77 @@ class Config(BaseModel):
                 enable_private=toml_config["plugin_settings"]["enable_private"],
                 enable_group=toml_config["plugin_settings"]["enable_group"],
                 max_sessions=toml_config["plugin_settings"].get("max_sessions", 1000),
+                session_ttl=toml_config["plugin_settings"].get("session_ttl", 0),
+                session_sweep_interval=toml_config["plugin_settings"].get("session_sweep_interval", 60),
                 enable_username=toml_config["plugin_settings"].get("enable_username", False),
+                username_cache_ttl=toml_config["plugin_settings"].get("username_cache_ttl", 3600),
+                username_cache_size=toml_config["plugin_settings"].get("username_cache_size", 10000),
+                async_mode=toml_config["plugin_settings"].get("async_mode", False),
+                max_concurrency=toml_config["plugin_settings"].get("max_concurrency", 32),
                 command_start=toml_config["plugin_settings"].get("command_start", "?"),
                 superusers=toml_config["plugin_settings"].get("superusers", ""),
                 chunk=ChunkConfig(
                     enable=toml_config.get("chunk", {}).get("enable", False),
                     words=toml_config.get("chunk", {}).get("words", ["||"]),
                     max_time=toml_config.get("chunk", {}).get("max_time", 5.0),
-                    char_per_s=toml_config.get("chunk", {}).get("char_per_s", 5)
+                    char_per_s=toml_config.get("chunk", {}).get("char_per_s", 5),
+                    stream=toml_config.get("chunk", {}).get("stream", False),
+                    sentence_ends=toml_config.get("chunk", {}).get("sentence_ends", [])
+                ),
+                checkpoint=CheckpointConfig(
+                    backend=toml_config.get("checkpoint", {}).get("backend", "memory"),
+                    path=toml_config.get("checkpoint", {}).get("path", "data/checkpoints.db"),
+                    keep_last=toml_config.get("checkpoint", {}).get("keep_last", 2),
+                    flush_interval=toml_config.get("checkpoint", {}).get("flush_interval", 1.0),
+                    flush_batch=toml_config.get("checkpoint", {}).get("flush_batch", 100)
+                ),
+                coalesce=CoalesceConfig(
+                    enable=toml_config.get("coalesce", {}).get("enable", False),
+                    window_ms=toml_config.get("coalesce", {}).get("window_ms", 1500),
+                    max_wait_ms=toml_config.get("coalesce", {}).get("max_wait_ms", 4000)
+                ),
+                recorder=RecorderConfig(
+                    mode=toml_config.get("recorder", {}).get("mode", "off"),
+                    path=toml_config.get("recorder", {}).get("path", "data/trace.jsonl"),
+                    latency_scale=toml_config.get("recorder", {}).get("latency_scale", 1.0)
+                ),
+                model_pins=toml_config.get("model_pins", {}),
+                log=LogConfig(
+                    enqueue=toml_config.get("log", {}).get("enqueue", True),
+                    sample_rate=toml_config.get("log", {}).get("sample_rate", 1.0),
+                    max_per_second=toml_config.get("log", {}).get("max_per_second", 20)
+                ),
+                hedge=HedgeConfig(
+                    enable=toml_config.get("hedge", {}).get("enable", False),
+                    percentile=toml_config.get("hedge", {}).get("percentile", 95),
+                    min_delay_ms=toml_config.get("hedge", {}).get("min_delay_ms", 300),
+                    default_delay_ms=toml_config.get("hedge", {}).get("default_delay_ms", 2000),
+                    min_samples=toml_config.get("hedge", {}).get("min_samples", 20)
+                ),
+                outbox=OutboxConfig(
+                    global_rpm=toml_config.get("outbox", {}).get("global_rpm", 120),
+                    target_interval_ms=toml_config.get("outbox", {}).get("target_interval_ms", 1000),
+                    retries=toml_config.get("outbox", {}).get("retries", 2),
+                    retry_backoff_ms=toml_config.get("outbox", {}).get("retry_backoff_ms", 1000),
+                    shutdown_timeout=toml_config.get("outbox", {}).get("shutdown_timeout", 5.0)
+                ),
+                summary=SummaryConfig(
+                    enable=toml_config.get("summary", {}).get("enable", False),
+                    keep_ratio=toml_config.get("summary", {}).get("keep_ratio", 0.5),
+                    max_summary_tokens=toml_config.get("summary", {}).get("max_summary_tokens", 400),
+                    model=toml_config.get("summary", {}).get("model", "")
+                ),
+                router=RouterConfig(
+                    enable=toml_config.get("router", {}).get("enable", False),
+                    similarity=toml_config.get("router", {}).get("similarity", True),
+                    threshold=toml_config.get("router", {}).get("threshold", 0.35),
+                    sticky_turns=toml_config.get("router", {}).get("sticky_turns", 1),
+                    always=toml_config.get("router", {}).get("always", []),
+                    keywords=toml_config.get("router", {}).get("keywords", {})
+                ),
+                fastpath=FastPathConfig(
+                    enable=toml_config.get("fastpath", {}).get("enable", False),
+                    rules=[FastPathRule(**rule) for rule in toml_config.get("fastpath", {}).get("rules", [])]
                 )
             )
             
@@ -0,0 +1,93 @@
+from datetime import datetime
+from random import choice
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from zoneinfo import ZoneInfo
+import re
+
+from .log import logger
+from .metrics import registry as metrics
+
+WEEKDAYS = ["星期一", "星期二", "星期三", "星期四", "星期五", "星期六", "星期日"]
+
+
+def time_fields(timezone: str) -> Dict[str, Any]:
+    """时间类回复可用的占位符"""
+    try:
+        now = datetime.now(ZoneInfo(timezone))
+    except Exception:
+        logger.warning(f"无效的时区名称 '{timezone}'，改用本地时间")
+        now = datetime.now()
+    return {
+        "time": now.strftime("%H:%M"),
+        "date": now.strftime("%Y-%m-%d"),
+        "datetime": now.strftime("%Y-%m-%d %H:%M:%S"),
+        "weekday": WEEKDAYS[now.weekday()],
+        "hour": now.hour,
+        "minute": now.minute,
+    }
+
+
+class _Rule:
+    __slots__ = ("name", "patterns", "handler", "replies", "timezone")
+
+    def __init__(self, name: str, patterns: Sequence[str], handler: str, replies: Sequence[str], timezone: str):
+        self.name = name
+        self.patterns = [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+        self.handler = handler
+        self.replies = list(replies)
+        self.timezone = timezone
+
+    def matches(self, text: str) -> bool:
+        return any(pattern.search(text) for pattern in self.patterns)
+
+
+class FastPath:
+    """
+    快速应答
+    调用模型之前按配置的规则匹配简单意图(问时间、帮助、固定寒暄等)并直接回复，省去模型和工具调用；
+    回复文本在配置中填写，用人设的口吻保持角色一致。快速应答不写入会话历史
+    """
+
+    def __init__(self, rules: List[Any], help_fields: Optional[Dict[str, Any]] = None):
+        self.handlers: Dict[str, Callable[[_Rule], Dict[str, Any]]] = {
+            "time": lambda rule: time_fields(rule.timezone),
+            "help": lambda rule: self.help_fields,
+            "reply": lambda rule: {},
+        }
+        self.help_fields = help_fields or {}
+        self.rules = []
+        for index, rule in enumerate(rules):
+            if rule.handler not in self.handlers:
+                raise ValueError(f"快速应答规则 {rule.name or index} 的 handler 无效: {rule.handler}")
+            if not rule.replies:
+                raise ValueError(f"快速应答规则 {rule.name or index} 没有配置回复")
+            self.rules.append(_Rule(rule.name or rule.handler, rule.patterns, rule.handler, rule.replies, rule.timezone))
+        self.checked = 0
+        self.handled: Dict[str, int] = {}
+
+    def answer(self, text: str) -> Optional[str]:
+        """命中规则时返回回复文本，否则返回 None 交给模型处理"""
+        self.checked += 1
+        text = text.strip()
+        for rule in self.rules:
+            if not rule.matches(text):
+                continue
+            reply = choice(rule.replies)
+            try:
+                reply = reply.format(**self.handlers[rule.handler](rule))
+            except (KeyError, IndexError, ValueError) as e:
+                logger.warning(f"快速应答规则 {rule.name} 的回复模板有误: {e}")
+                return None
+            self.handled[rule.name] = self.handled.get(rule.name, 0) + 1
+            metrics.inc("llm_chat_fastpath_total", rule=rule.name)
+            return reply
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        handled = sum(self.handled.values())
+        return {
+            "checked": self.checked,
+            "handled": handled,
+            "rate": handled / self.checked if self.checked else 0.0,
+            "rules": dict(self.handled),
+        }
@@ -1,15 +1,27 @@
-from typing import Annotated, List, Union, Any, Optional, Dict
+from typing import Annotated, List, Union, Any, Optional, Dict, FrozenSet, Callable
 from typing_extensions import TypedDict
 from langgraph.graph import StateGraph, START
 from langgraph.graph.message import add_messages
 from langgraph.prebuilt import ToolNode, tools_condition
-from langchain_core.messages import SystemMessage, trim_messages, HumanMessage, AIMessage, ToolMessage
+from langgraph.utils.runnable import RunnableCallable
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, ToolMessage
 from langchain_openai import ChatOpenAI
 from langchain_groq import ChatGroq
 from langchain_core.language_models import LanguageModelInput
+from langchain_core.runnables import Runnable, RunnableConfig
 from langchain_google_genai import ChatGoogleGenerativeAI
 from .tools import load_tools
 from .config import Config
+from .metrics import registry as metrics
+from .log import logger, turn_messages
+from .models import ModelRegistry
+from .backends import Backend, BackendPool, is_retryable
+from .hedge import CallbackRelay, ChunkRelay, Hedger, stream_until_done
+from .tokens import get_counter, preload_counters, trim_last
+from .summary import summary_message
+from .router import ToolRouter
+import asyncio
+import time
 import json
 
 plugin_config = Config.load_config()
@@ -33,74 +45,288 @@ class MyOpenAI(ChatOpenAI):
             payload["max_tokens"] = payload.pop("max_completion_tokens")
         return payload
 
-def get_llm(model=None):
-    """根据配置获取适当的 LLM 实例"""
+def get_provider(model: str) -> str:
+    """模型所属的服务商"""
+    if model in groq_models:
+        return "groq"
+    if "gemini" in model:
+        return "google"
+    return "openai"
+
+# 服务商 -> 后端池，未配置 [[llm.backends]] 的服务商使用 [llm] 中的单个密钥
+backend_pools: Dict[str, BackendPool] = {}
+for backend_config in plugin_config.llm.backends:
+    backend_pools.setdefault(backend_config.provider, BackendPool([])).backends.append(
+        Backend(**backend_config.model_dump())
+    )
+
+def get_backend_pool(model: str) -> Optional[BackendPool]:
+    return backend_pools.get(get_provider(model))
+
+hedge_config = plugin_config.plugin.hedge
+hedger = Hedger(
+    percentile=hedge_config.percentile,
+    min_delay=hedge_config.min_delay_ms / 1000,
+    default_delay=hedge_config.default_delay_ms / 1000,
+    min_samples=hedge_config.min_samples,
+) if hedge_config.enable else None
+
+def get_llm(model=None, backend: Optional[Backend] = None):
+    """
+    根据配置获取适当的 LLM 实例
+    指定后端时使用该后端的地址和密钥，并关闭客户端自身的重试，由后端池换后端重试
+    """
     model = model.lower() if model else plugin_config.llm.model
-    print(f"使用模型: {model}")
+    logger.info(f"使用模型: {model}" + (f" (后端 {backend.name})" if backend else ""))
+    retry_options = {"max_retries": 0} if backend else {}
 
     try:
-        if model in groq_models:
-            print("使用groq")
+        provider = get_provider(model)
+        if provider == "groq":
+            logger.debug("使用groq")
             return ChatGroq(
                 model=model,
                 temperature=plugin_config.llm.temperature,
                 max_tokens=plugin_config.llm.max_tokens,
-                api_key=plugin_config.llm.groq_api_key,
+                api_key=backend.api_key if backend else plugin_config.llm.groq_api_key,
+                **({"base_url": backend.base_url} if backend and backend.base_url else {}),
+                **retry_options,
             )
-        elif "gemini" in model:
-            print("使用google")
+        elif provider == "google":
+            logger.debug("使用google")
             return ChatGoogleGenerativeAI(
                 model=model,
                 temperature=plugin_config.llm.temperature,
                 max_tokens=plugin_config.llm.max_tokens,
-                google_api_key=plugin_config.llm.google_api_key,
+                google_api_key=backend.api_key if backend else plugin_config.llm.google_api_key,
                 top_p=plugin_config.llm.top_p,
+                **retry_options,
             )
         else:
-            print("使用 OpenAI")
+            logger.debug("使用 OpenAI")
             return MyOpenAI(
                 model=model,
                 temperature=plugin_config.llm.temperature,
                 max_tokens=plugin_config.llm.max_tokens,
-                api_key=plugin_config.llm.api_key,
-                base_url=plugin_config.llm.base_url,
+                api_key=backend.api_key if backend else plugin_config.llm.api_key,
+                base_url=backend.base_url if backend else plugin_config.llm.base_url,
                 top_p=plugin_config.llm.top_p,
+                **retry_options,
             )
     except Exception as e:
-        print(f"模型初始化失败: {str(e)}")
+        logger.error(f"模型初始化失败: {str(e)}")
+        raise
+
+def on_backend_failure(pool: BackendPool, backend: Backend, error: Exception) -> None:
+    pool.record_failure(backend)
+    metrics.inc("llm_chat_backend_requests_total", backend=backend.name, result="failure")
+    logger.warning(f"后端 {backend.name} 请求失败，尝试下一个后端: {error}")
+
+def on_backend_success(pool: BackendPool, backend: Backend) -> None:
+    pool.record_success(backend)
+    metrics.inc("llm_chat_backend_requests_total", backend=backend.name, result="success")
+
+def on_backend_client_error(pool: BackendPool, backend: Backend) -> None:
+    """请求本身有误(如 400)，后端可用但本次失败，不计入熔断也不当作成功"""
+    pool.record_cancel(backend)
+    metrics.inc("llm_chat_backend_requests_total", backend=backend.name, result="client_error")
+
+def invoke_pooled(name: str, messages, bind: Callable[[Optional[Backend]], Runnable]):
+    """
+    调用模型，bind(backend) 返回要调用的模型(可绑定工具)
+    配置了后端池时遇到限流/服务端错误自动换下一个后端重试
+    """
+    pool = get_backend_pool(name)
+    if pool is None:
+        return bind(None).invoke(messages)
+    error = None
+    for backend, delay in pool.attempts():
+        if delay:
+            time.sleep(delay)
+        try:
+            response = bind(backend).invoke(messages)
+        except Exception as e:
+            if not is_retryable(e):
+                on_backend_client_error(pool, backend)
+                raise
+            on_backend_failure(pool, backend, e)
+            error = e
+            continue
+        on_backend_success(pool, backend)
+        return response
+    raise error
+
+async def acall_backend(bind: Callable[[Optional[Backend]], Runnable], messages, pool: BackendPool,
+                        backend: Backend, delay: float, relay: Optional[ChunkRelay] = None):
+    """向指定后端发起一次请求并反馈结果；传入 relay 时不挂上层回调流式调用，分块交给 relay"""
+    if delay:
+        await asyncio.sleep(delay)
+    model = bind(backend)
+    try:
+        if relay is None:
+            response = await model.ainvoke(messages)
+        else:
+            response = await stream_until_done(model, messages, relay)
+    except asyncio.CancelledError:
+        pool.record_cancel(backend)
+        raise
+    except Exception as e:
+        if is_retryable(e):
+            on_backend_failure(pool, backend, e)
+        else:
+            on_backend_client_error(pool, backend)
         raise
+    on_backend_success(pool, backend)
+    return response
+
+async def ainvoke_pooled(name: str, messages, bind: Callable[[Optional[Backend]], Runnable],
+                         run_config: Optional[RunnableConfig] = None, hedge: bool = True):
+    """
+    invoke_pooled 的异步版本
+    开启对冲时，首个后端超时未出首字则同时请求下一个后端，两边都失败后再按顺序尝试剩余后端
+    对冲的请求不挂回调，胜出一方的回复按 run_config 的回调重新发出；
+    hedge=False 时不对冲(如后台摘要，也避免其耗时计入对冲延迟统计)
+    """
+    pool = get_backend_pool(name)
+    if pool is None:
+        return await bind(None).ainvoke(messages)
+    attempts = pool.attempts()
+    error = None
+    if hedge and hedger is not None and len(pool.backends) > 1:
+        primary = next(attempts)
+
+        def secondary():
+            attempt = next(attempts, None)
+            if attempt is None:
+                return None
+            return lambda relay: acall_backend(bind, messages, pool, *attempt, relay)
+
+        try:
+            return await hedger.race(
+                name,
+                lambda relay: acall_backend(bind, messages, pool, *primary, relay),
+                secondary,
+                CallbackRelay(name, messages, run_config or {}),
+            )
+        except Exception as e:
+            if not is_retryable(e):
+                raise
+            error = e
+    for backend, delay in attempts:
+        try:
+            return await acall_backend(bind, messages, pool, backend, delay)
+        except Exception as e:
+            if not is_retryable(e):
+                raise
+            error = e
+    raise error
 
 class State(TypedDict):
     messages: Annotated[list, add_messages]
+    # 较早对话的滚动摘要，由后台折叠任务更新
+    summary: str
+
+def build_graph(config: Config, models: ModelRegistry, tools: Optional[list] = None,
+                router: Optional[ToolRouter] = None):
+    """
+    构建并返回对话图，未指定工具时按配置加载
+    每次调用使用的模型由 configurable["model"] 指定，未指定时使用注册表的默认模型
+    传入 router 时每次调用只绑定路由选出的工具
+    """
+    if tools is None:
+        tools = load_tools()
+    # 启动时在后台加载已配置模型的分词器(最多等待 5 秒)，之后固定的新模型同样在后台加载，加载完成前按估算计数
+    preload_counters([models.default, *models.pins.values(), None], timeout=5)
+    # (模型名, 后端名, 工具子集) -> 绑定了工具的模型
+    bound_models = {}
+
+    def get_model_name(run_config: RunnableConfig) -> str:
+        return (run_config.get("configurable", {}).get("model") or models.default).lower()
+
+    def select_tools(state: State, model_name: str, run_config: RunnableConfig) -> Optional[FrozenSet[str]]:
+        """按本轮用户原文(configurable["route_text"])挑选要绑定的工具，未开启路由时返回 None 表示全部工具"""
+        if router is None:
+            return None
+        selected = router.select(state["messages"], run_config.get("configurable", {}).get("route_text"))
+        router.record(model_name, selected)
+        return selected
+
+    def bind_model(name: str, backend: Optional[Backend] = None, selected: Optional[FrozenSet[str]] = None):
+        key = (name, backend.name if backend else None, selected)
+        llm_with_tools = bound_models.get(key)
+        if llm_with_tools is None:
+            bound_tools = tools if selected is None else router.tools_for(selected)
+            llm_with_tools = bound_models[key] = models.get(name, backend).bind_tools(bound_tools)
+        return llm_with_tools
 
-def build_graph(config: Config, llm):
-    """构建并返回对话图"""
-    tools = load_tools()
-    llm_with_tools = llm.bind_tools(tools)
+    def invoke_model(name: str, messages, selected: Optional[FrozenSet[str]] = None):
+        return invoke_pooled(name, messages, lambda backend: bind_model(name, backend, selected))
+
+    async def ainvoke_model(name: str, messages, selected: Optional[FrozenSet[str]] = None,
+                            run_config: Optional[RunnableConfig] = None):
+        return await ainvoke_pooled(name, messages, lambda backend: bind_model(name, backend, selected), run_config)
     
-    trimmer = trim_messages(
-        strategy="last",
-        max_tokens=config.llm.max_context_messages,
-        token_counter=len,
-        include_system=True,
-        allow_partial=False,
-        start_on="human",
-        end_on=("human", "tool"),
-    )
+    # 计数方式(分词器名或估算) -> 截断到预算内的系统提示词
+    system_messages = {}
+
+    def get_system_message(counter) -> SystemMessage:
+        system_message = system_messages.get(counter.mode)
+        if system_message is None:
+            system_message = system_messages[counter.mode] = SystemMessage(
+                content=counter.truncate(config.llm.system_prompt, config.llm.max_system_prompt_tokens)
+            )
+        return system_message
 
-    def chatbot(state: State):
+    def prepare_messages(state: State, model_name: str):
+        """
+        按 token 预算裁剪上下文并拼接系统提示词和滚动摘要
+        超长的工具输出先截断，再从最近的消息往前保留到历史预算(和可选的条数上限)用完为止，
+        只访问保留下来的消息，历史再长每轮的开销也只和预算有关
+        """
+        counter = get_counter(model_name)
+        max_tool_tokens = config.llm.max_tool_output_tokens
         messages = state["messages"]
-        if config.llm.system_prompt:
-            messages = [SystemMessage(content=config.llm.system_prompt)] + messages
-        trimmed_messages = trimmer.invoke(messages)
+        start, end, tokens = trim_last(
+            messages,
+            config.llm.max_context_tokens,
+            lambda message: counter.count(counter.cap_tool_output(message, max_tool_tokens)),
+            max_messages=config.llm.max_context_messages,
+            end_on=(HumanMessage, ToolMessage),
+        )
+        # 本轮消息本身就超出预算时至少保留本轮
+        kept = messages[start:end] if start < end else turn_messages(messages)
+        trimmed = [counter.cap_tool_output(message, max_tool_tokens) for message in kept]
+        if start == end:
+            tokens = counter.count_messages(trimmed)
+        metrics.observe("llm_chat_context_tokens", tokens, model=model_name)
+        system_message = get_system_message(counter) if config.llm.system_prompt else None
+        summary = state.get("summary")
+        if summary:
+            system_message = summary_message(system_message.content if system_message else None, summary)
+        if system_message is not None:
+            trimmed = [system_message] + trimmed
+        return trimmed
+
+    def chatbot(state: State, config: RunnableConfig):
+        model_name = get_model_name(config)
+        trimmed_messages = prepare_messages(state, model_name)
         # print("-" * 50)
         # print(format_messages_for_print(trimmed_messages))
-        response = llm_with_tools.invoke(trimmed_messages)
+        with metrics.span("llm_chat_node_seconds", node="chatbot", model=model_name):
+            response = invoke_model(model_name, trimmed_messages, select_tools(state, model_name, config))
         # print(f"chatbot: {response}")
         return {"messages": [response]}
 
+    async def achatbot(state: State, config: RunnableConfig):
+        """chatbot 的异步版本，供 ainvoke/astream 在事件循环上直接调用模型"""
+        model_name = get_model_name(config)
+        trimmed_messages = prepare_messages(state, model_name)
+        with metrics.span("llm_chat_node_seconds", node="chatbot", model=model_name):
+            response = await ainvoke_model(model_name, trimmed_messages, select_tools(state, model_name, config), config)
+        return {"messages": [response]}
+
     graph_builder = StateGraph(State)
-    graph_builder.add_node("chatbot", chatbot)
+    graph_builder.add_node("chatbot", RunnableCallable(chatbot, achatbot, name="chatbot"))
     tool_node = ToolNode(tools=tools)
     graph_builder.add_node("tools", tool_node)
     graph_builder.add_conditional_edges("chatbot", tools_condition)
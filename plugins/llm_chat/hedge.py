@@ -0,0 +1,196 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import time
+
+from langchain_core.messages import BaseMessage, BaseMessageChunk, message_chunk_to_message
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, LLMResult
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import get_async_callback_manager_for_config, var_child_runnable_config
+
+from .metrics import Summary, registry as metrics
+
+
+class ChunkRelay:
+    """
+    单个对冲请求的分块中转
+    胜出前只缓存分块，胜出后先补发缓存的分块，再把之后的分块直接转发给 sink
+    """
+
+    def __init__(self):
+        self.first_token = asyncio.Event()
+        self.buffer: List[BaseMessageChunk] = []
+        self.sink: Optional[Callable[[BaseMessageChunk], Awaitable[None]]] = None
+        # 补发缓存和转发新分块互斥，保证分块顺序
+        self._lock = asyncio.Lock()
+
+    async def put(self, chunk: BaseMessageChunk) -> None:
+        self.first_token.set()
+        async with self._lock:
+            if self.sink is None:
+                self.buffer.append(chunk)
+            else:
+                await self.sink(chunk)
+
+    async def attach(self, sink: Callable[[BaseMessageChunk], Awaitable[None]]) -> None:
+        async with self._lock:
+            for chunk in self.buffer:
+                await sink(chunk)
+            self.buffer.clear()
+            self.sink = sink
+
+
+class CallbackRelay:
+    """
+    把胜出一方的回复作为一次模型调用发给上层回调
+    流式输出、录制等回调只看到这一份回复，分块的消息 id 保持一致
+    """
+
+    def __init__(self, model: str, messages: List[BaseMessage], config: RunnableConfig):
+        self.model = model
+        self.messages = messages
+        self.config = config
+        self.run_manager = None
+
+    async def start(self) -> None:
+        if self.run_manager is None:
+            manager = get_async_callback_manager_for_config(self.config)
+            run_managers = await manager.on_chat_model_start(
+                {"name": self.model}, [self.messages], name=self.model
+            )
+            self.run_manager = run_managers[0]
+
+    async def chunk(self, chunk: BaseMessageChunk) -> None:
+        await self.start()
+        await self.run_manager.on_llm_new_token(
+            chunk.content if isinstance(chunk.content, str) else "",
+            chunk=ChatGenerationChunk(message=chunk),
+        )
+
+    async def end(self, message: BaseMessage) -> None:
+        await self.start()
+        await self.run_manager.on_llm_end(LLMResult(generations=[[ChatGeneration(message=message)]]))
+
+    async def error(self, error: BaseException) -> None:
+        await self.start()
+        await self.run_manager.on_llm_error(error)
+
+
+# 接收分块中转、返回模型回复的调用
+ModelCall = Callable[[ChunkRelay], Awaitable[Any]]
+
+
+async def stream_until_done(llm, messages, relay: ChunkRelay):
+    """
+    不挂上层回调流式调用模型，分块交给 relay，返回合并后的完整回复
+    绑定了工具的模型会从上下文变量合并上层回调，传入空的 callbacks 不够，需要清空当前任务的上下文配置
+    """
+    token = var_child_runnable_config.set(None)
+    try:
+        message = None
+        async for chunk in llm.astream(messages, {"callbacks": []}):
+            await relay.put(chunk)
+            message = chunk if message is None else message + chunk
+    finally:
+        var_child_runnable_config.reset(token)
+    relay.first_token.set()
+    return message_chunk_to_message(message)
+
+
+class Hedger:
+    """
+    对冲请求
+    主请求在 delay 内没有返回首字时，向另一个后端发出相同请求，先出首字的一方胜出，另一方被取消
+    delay 取该模型近期首字耗时的指定分位数，样本不足时使用默认值
+    """
+
+    def __init__(self, percentile: float, min_delay: float, default_delay: float, min_samples: int):
+        self.quantile = percentile / 100
+        self.min_delay = min_delay
+        self.default_delay = default_delay
+        self.min_samples = min_samples
+        # 模型名 -> 首字耗时
+        self.first_token: Dict[str, Summary] = {}
+        self.requests = 0
+        self.fired = 0
+        self.won = 0
+
+    def delay(self, model: str) -> float:
+        summary = self.first_token.get(model)
+        if summary is None or len(summary.samples) < self.min_samples:
+            return self.default_delay
+        return max(self.min_delay, summary.quantiles((self.quantile,))[self.quantile])
+
+    def _observe(self, model: str, seconds: float) -> None:
+        self.first_token.setdefault(model, Summary(512)).observe(seconds)
+
+    async def _deliver(self, relay: ChunkRelay, task: asyncio.Task, sink: CallbackRelay):
+        """把胜出请求的分块转发给上层回调并等待完整回复"""
+        await relay.attach(sink.chunk)
+        try:
+            response = await task
+        except Exception as e:
+            await sink.error(e)
+            raise
+        await sink.end(response)
+        return response
+
+    async def race(self, model: str, primary: ModelCall, secondary: Callable[[], Optional[ModelCall]],
+                   sink: CallbackRelay):
+        """
+        执行主请求，超过 delay 没有首字时调用 secondary() 取得对冲请求并发出
+        secondary() 返回 None 表示没有可用的对冲后端，此时只等待主请求
+        一方出首字即取消另一方，只有胜出一方的分块经 sink 发给上层回调
+        """
+        self.requests += 1
+        start = time.monotonic()
+        relays = {"primary": ChunkRelay(), "secondary": ChunkRelay()}
+        tasks = {"primary": asyncio.create_task(primary(relays["primary"]))}
+        watchers = {"primary": asyncio.create_task(relays["primary"].first_token.wait())}
+        try:
+            done, _ = await asyncio.wait(
+                [tasks["primary"], watchers["primary"]],
+                timeout=self.delay(model),
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            hedge = None if done else secondary()
+            if hedge is None:
+                await asyncio.wait([tasks["primary"], watchers["primary"]], return_when=asyncio.FIRST_COMPLETED)
+                if relays["primary"].first_token.is_set():
+                    self._observe(model, time.monotonic() - start)
+                return await self._deliver(relays["primary"], tasks["primary"], sink)
+
+            self.fired += 1
+            metrics.inc("llm_chat_hedge_total", result="fired")
+            tasks["secondary"] = asyncio.create_task(hedge(relays["secondary"]))
+            watchers["secondary"] = asyncio.create_task(relays["secondary"].first_token.wait())
+            winner = None
+            while winner is None:
+                pending = [t for t in [*tasks.values(), *watchers.values()] if not t.done()]
+                if pending:
+                    await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for name in ("primary", "secondary"):
+                    task = tasks[name]
+                    if relays[name].first_token.is_set() and not (task.done() and task.exception()):
+                        winner = name
+                        break
+                else:
+                    # 两边都失败时抛出主请求的错误
+                    if all(task.done() for task in tasks.values()):
+                        return await tasks["primary"]
+            # 出首字后立即取消落败的一方，不再让两个后端同时生成
+            loser = "secondary" if winner == "primary" else "primary"
+            for task in (tasks[loser], *watchers.values()):
+                if not task.done():
+                    task.cancel()
+            self._observe(model, time.monotonic() - start)
+            if winner == "secondary":
+                self.won += 1
+                metrics.inc("llm_chat_hedge_total", result="won")
+            return await self._deliver(relays[winner], tasks[winner], sink)
+        finally:
+            for task in [*tasks.values(), *watchers.values()]:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"requests": self.requests, "fired": self.fired, "won": self.won}
@@ -0,0 +1,70 @@
+from typing import List
+import random
+import sys
+import time
+
+import nonebot.log
+from nonebot import get_driver
+from nonebot.log import logger, default_filter, default_format
+from langchain_core.messages import BaseMessage, HumanMessage
+
+__all__ = ["logger", "setup_logging", "TurnSampler", "turn_messages"]
+
+
+def setup_logging(enqueue: bool) -> None:
+    """
+    将 NoneBot 默认的 stdout 日志处理器替换为队列写入，日志在后台线程中输出，不阻塞事件循环
+    处理器的最低等级设为配置的 log_level，低于该等级的 lazy 日志不会被格式化
+    """
+    if not enqueue:
+        return
+    log_level = get_driver().config.log_level
+    level = logger.level(log_level).no if isinstance(log_level, str) else log_level
+    try:
+        logger.remove(nonebot.log.logger_id)
+    except ValueError:
+        # 默认处理器已被替换(如用户自定义了日志)，保持不变
+        return
+    nonebot.log.logger_id = logger.add(
+        sys.stdout,
+        level=level,
+        diagnose=False,
+        filter=default_filter,
+        format=default_format,
+        enqueue=True,
+    )
+
+
+class TurnSampler:
+    """
+    对话内容日志采样
+    按比例采样，并限制每秒最多记录的轮数，负载高时自动丢弃多余的详细日志
+    """
+
+    def __init__(self, rate: float, max_per_second: int):
+        self.rate = rate
+        self.max_per_second = max_per_second
+        self._window = 0
+        self._count = 0
+        self.dropped = 0
+
+    def __call__(self) -> bool:
+        if self.rate < 1 and random.random() >= self.rate:
+            return False
+        now = int(time.monotonic())
+        if now != self._window:
+            self._window = now
+            self._count = 0
+        if self.max_per_second and self._count >= self.max_per_second:
+            self.dropped += 1
+            return False
+        self._count += 1
+        return True
+
+
+def turn_messages(messages: List[BaseMessage]) -> List[BaseMessage]:
+    """取出本轮新增的消息(最后一条用户消息及之后的模型、工具消息)"""
+    for i in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[i], HumanMessage):
+            return messages[i:]
+    return messages
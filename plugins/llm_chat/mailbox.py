@@ -0,0 +1,59 @@
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, List, Tuple
+import asyncio
+
+
+class Mailbox:
+    """
+    按 thread_id 串行处理的会话信箱
+    同一会话的消息严格按到达顺序逐条执行，不同会话并行执行，总并发受全局上限约束
+    """
+
+    def __init__(self, max_concurrency: int):
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # thread_id -> 会话锁(asyncio.Lock 按等待顺序唤醒，保证先到先处理)
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # thread_id -> 排队中和执行中的消息数
+        self._depths: Dict[str, int] = {}
+        # thread_id -> 信箱清空后要执行的回调
+        self._idle_callbacks: Dict[str, List[Callable[[], None]]] = {}
+
+    @asynccontextmanager
+    async def slot(self, thread_id: str):
+        """进入会话的执行槽位，退出时自动让给下一条消息"""
+        lock = self._locks.get(thread_id)
+        if lock is None:
+            lock = self._locks[thread_id] = asyncio.Lock()
+        self._depths[thread_id] = self._depths.get(thread_id, 0) + 1
+        try:
+            async with lock:
+                async with self._semaphore:
+                    yield
+        finally:
+            self._depths[thread_id] -= 1
+            # 信箱清空后释放锁对象，避免会话数增长导致内存常驻
+            if not self._depths[thread_id]:
+                del self._depths[thread_id]
+                del self._locks[thread_id]
+                for callback in self._idle_callbacks.pop(thread_id, []):
+                    callback()
+
+    def when_idle(self, thread_id: str, callback: Callable[[], None]) -> None:
+        """会话信箱为空时立即执行 callback，否则等排队和执行中的消息全部完成后再执行"""
+        if not self._depths.get(thread_id):
+            callback()
+        else:
+            self._idle_callbacks.setdefault(thread_id, []).append(callback)
+
+    def depth(self, thread_id: str) -> int:
+        """返回会话当前排队中和执行中的消息数"""
+        return self._depths.get(thread_id, 0)
+
+    def depths(self, top: int = 10) -> List[Tuple[str, int]]:
+        """返回队列最深的若干会话"""
+        return sorted(self._depths.items(), key=lambda x: x[1], reverse=True)[:top]
+
+    @property
+    def total(self) -> int:
+        """所有会话排队中和执行中的消息总数"""
+        return sum(self._depths.values())
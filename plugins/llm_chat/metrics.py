@@ -0,0 +1,220 @@
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+from uuid import UUID
+import threading
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Summary:
+    """
+    耗时摘要
+    保留最近 window 个样本计算分位数，count/sum 为累计值
+    """
+
+    def __init__(self, window: int = 1024):
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.samples.append(value)
+        self.count += 1
+        self.sum += value
+
+    def quantiles(self, qs: Tuple[float, ...] = QUANTILES) -> Dict[float, float]:
+        if not self.samples:
+            return {q: 0.0 for q in qs}
+        ordered = sorted(self.samples)
+        last = len(ordered) - 1
+        return {q: ordered[min(last, int(q * len(ordered)))] for q in qs}
+
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class MetricsRegistry:
+    """
+    进程内指标注册表
+    耗时按 名称 + 标签 聚合为摘要，另有计数器和采集时读取的仪表，导出为 Prometheus 文本格式
+    """
+
+    def __init__(self, window: int = 1024):
+        self.window = window
+        self._summaries: Dict[str, Dict[LabelKey, Summary]] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, Callable[[], float]]] = {}
+        self._help: Dict[str, str] = {}
+        # 工具可能在线程池中执行，更新指标时加锁
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, text: str) -> None:
+        self._help[name] = text
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._summaries.setdefault(name, {})
+            summary = series.get(key)
+            if summary is None:
+                summary = series[key] = Summary(self.window)
+            summary.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def gauge(self, name: str, func: Callable[[], float], **labels: Any) -> None:
+        """注册仪表，导出时调用 func 取当前值"""
+        self._gauges.setdefault(name, {})[_label_key(labels)] = func
+
+    @contextmanager
+    def span(self, name: str, **labels: Any):
+        """记录代码块耗时(秒)，代码块抛出异常(包括 finish)时同样记录"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self, name: str, **labels: Any) -> Optional[Dict[str, float]]:
+        """读取某个摘要的当前统计，不存在时返回 None"""
+        with self._lock:
+            summary = self._summaries.get(name, {}).get(_label_key(labels))
+            if summary is None:
+                return None
+            result = {f"p{int(q * 100)}": v for q, v in summary.quantiles().items()}
+            result.update(count=summary.count, sum=summary.sum)
+            return result
+
+    def render(self) -> str:
+        lines: List[str] = []
+
+        def header(name: str, kind: str) -> None:
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            for name, series in sorted(self._summaries.items()):
+                header(name, "summary")
+                for key, summary in series.items():
+                    for q, value in summary.quantiles().items():
+                        lines.append(f"{name}{_format_labels(key, ('quantile', str(q)))} {value:.6f}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {summary.sum:.6f}")
+                    lines.append(f"{name}_count{_format_labels(key)} {summary.count}")
+            for name, series in sorted(self._counters.items()):
+                header(name, "counter")
+                for key, value in series.items():
+                    lines.append(f"{name}{_format_labels(key)} {value:g}")
+        for name, series in sorted(self._gauges.items()):
+            values = []
+            for key, func in list(series.items()):
+                try:
+                    values.append((key, float(func())))
+                except Exception:
+                    continue
+            if not values:
+                continue
+            header(name, "gauge")
+            for key, value in values:
+                lines.append(f"{name}{_format_labels(key)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+registry.describe("llm_chat_stage_seconds", "handle_chat 各阶段耗时")
+registry.describe("llm_chat_request_seconds", "一次对话从进入 handle_chat 到模型返回的总耗时")
+registry.describe("llm_chat_rule_seconds", "触发规则判断耗时")
+registry.describe("llm_chat_node_seconds", "对话图节点耗时")
+registry.describe("llm_chat_summary_folded_messages_total", "折叠进滚动摘要的消息数")
+registry.describe("llm_chat_summary_discarded_total", "生成期间历史被改动而放弃的摘要数")
+registry.describe("llm_chat_context_tokens", "裁剪后发给模型的历史消息 token 数(不含系统提示词)")
+registry.describe("llm_chat_tool_seconds", "工具调用耗时")
+registry.describe("llm_chat_tool_errors_total", "工具调用失败次数")
+registry.describe("llm_chat_tool_rejected_total", "工具隔舱拒绝(busy)和超时(timeout)的调用次数")
+registry.describe("llm_chat_fastpath_total", "各快速应答规则直接回复(未调用模型)的消息数")
+registry.describe("llm_chat_router_total", "工具路由按消息选择工具(routed)和绑定全部工具(fallback)的次数")
+registry.describe("llm_chat_tool_schema_tokens_saved_total", "工具路由少发送的工具定义 token 数")
+registry.describe("llm_chat_tool_output_tokens_total", "工具输出压缩前(raw)和压缩后(compacted)的 token 数")
+registry.describe("llm_chat_tool_cache_total", "工具结果缓存命中(hit)、未命中(miss)和合并到进行中请求(shared)的次数")
+registry.describe("llm_chat_tool_queue_seconds", "工具调用在隔舱中等待执行名额的时间")
+registry.describe("llm_chat_tool_running", "各工具执行中的调用数")
+registry.describe("llm_chat_tool_queued", "各工具排队等待执行的调用数")
+registry.describe("llm_chat_backend_requests_total", "各模型后端的请求结果")
+registry.describe("llm_chat_hedge_total", "对冲请求触发(fired)和备用请求胜出(won)的次数")
+registry.describe("llm_chat_api_seconds", "OneBot API 调用耗时")
+registry.describe("llm_chat_api_errors_total", "OneBot API 调用失败次数")
+registry.describe("llm_chat_send_retries_total", "出站消息发送重试次数")
+registry.describe("llm_chat_send_failures_total", "出站消息重试后仍发送失败的次数")
+
+
+class ToolTimingHandler(BaseCallbackHandler):
+    """记录 ToolNode 中每次工具调用的耗时"""
+
+    run_inline = True
+
+    def __init__(self, metrics: MetricsRegistry = registry):
+        self.metrics = metrics
+        # run_id -> (工具名, 开始时间)
+        self._running: Dict[UUID, Tuple[str, float]] = {}
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any) -> None:
+        name = (serialized or {}).get("name") or kwargs.get("name") or "unknown"
+        self._running[run_id] = (name, time.perf_counter())
+
+    def _finish(self, run_id: UUID, error: bool) -> None:
+        item = self._running.pop(run_id, None)
+        if item is None:
+            return
+        name, start = item
+        self.metrics.observe("llm_chat_tool_seconds", time.perf_counter() - start, tool=name)
+        if error:
+            self.metrics.inc("llm_chat_tool_errors_total", tool=name)
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id, error=False)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id, error=True)
+
+
+tool_timer = ToolTimingHandler()
+
+# OneBot API 调用耗时，按 data 对象区分同时进行的调用
+_api_started: Dict[int, float] = {}
+
+
+async def on_calling_api(bot, api: str, data: Dict[str, Any]) -> None:
+    _api_started[id(data)] = time.perf_counter()
+
+
+async def on_called_api(bot, exception: Optional[Exception], api: str, data: Dict[str, Any], result: Any) -> None:
+    start = _api_started.pop(id(data), None)
+    if start is None:
+        return
+    registry.observe("llm_chat_api_seconds", time.perf_counter() - start, api=api)
+    if exception is not None:
+        registry.inc("llm_chat_api_errors_total", api=api)
@@ -0,0 +1,47 @@
+from typing import Any, Callable, Dict, Optional
+import threading
+
+
+class ModelRegistry:
+    """
+    模型注册表
+    按 (模型名, 后端) 缓存已创建的 LLM 客户端，并记录各会话/群固定使用的模型，未固定的会话使用默认模型
+    """
+
+    def __init__(self, factory: Callable[..., Any], default: str, pins: Optional[Dict[str, str]] = None):
+        self.factory = factory
+        self.default = default.lower()
+        # 作用域(thread_id 或 group_<群号>) -> 模型名
+        self.pins: Dict[str, str] = {scope: name.lower() for scope, name in (pins or {}).items()}
+        self._clients: Dict[tuple, Any] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: Optional[str] = None, backend: Any = None) -> Any:
+        """获取模型客户端，首次使用时创建；指定后端时使用该后端的地址和密钥"""
+        name = (name or self.default).lower()
+        key = (name, backend.name if backend else None)
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = self._clients[key] = self.factory(name, backend)
+        return client
+
+    def set_default(self, name: str) -> None:
+        self.get(name)
+        self.default = name.lower()
+
+    def pin(self, scope: str, name: str) -> None:
+        self.get(name)
+        self.pins[scope] = name.lower()
+
+    def unpin(self, scope: str) -> bool:
+        return self.pins.pop(scope, None) is not None
+
+    def resolve(self, thread_id: str, group_scope: Optional[str] = None) -> str:
+        """会话使用的模型：会话固定 > 群固定 > 默认"""
+        name = self.pins.get(thread_id)
+        if name is None and group_scope:
+            name = self.pins.get(group_scope)
+        return name or self.default
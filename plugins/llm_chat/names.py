@@ -0,0 +1,75 @@
+from typing import Any, Dict
+from nonebot.adapters.onebot.v11 import Bot, MessageEvent, GroupMessageEvent
+from .cache import TTLCache
+from .log import logger
+
+
+class UserNameResolver:
+    """
+    发送者显示名称解析
+    (群号, QQ号) -> 名称 缓存在内存中，来源依次为：消息自带的 sender、群成员列表批量拉取、单个成员查询
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        # 私聊的群号记为 0
+        self.names = TTLCache(max_size, ttl)
+        # 近期已批量拉取过成员列表的群，避免反复拉取
+        self.member_list_fetched = TTLCache(1024, ttl)
+        self.api_calls = 0
+
+    @staticmethod
+    def _key(event: MessageEvent) -> tuple:
+        return (getattr(event, "group_id", 0) or 0, event.user_id)
+
+    def remember(self, event: MessageEvent) -> None:
+        """记录消息自带的发送者名称"""
+        name = event.sender.nickname or event.sender.card
+        if name:
+            self.names.set(self._key(event), name)
+
+    async def _fetch_member_list(self, bot: Bot, event: GroupMessageEvent) -> None:
+        """批量拉取群成员列表填充缓存，拉取成功后才记为已拉取，失败时下次仍会重试"""
+        self.api_calls += 1
+        members = await bot.get_group_member_list(group_id=event.group_id)
+        self.member_list_fetched.set(event.group_id, True)
+        for member in members:
+            name = member.get("nickname") or member.get("card")
+            if name:
+                self.names.set((event.group_id, member["user_id"]), name)
+
+    async def _query_name(self, bot: Bot, event: MessageEvent) -> str:
+        """查询单个用户的名称，查不到时返回空字符串"""
+        self.api_calls += 1
+        if isinstance(event, GroupMessageEvent):
+            user_info = await bot.get_group_member_info(group_id=event.group_id, user_id=event.user_id)
+            return user_info.get("nickname") or user_info.get("card") or ""
+        user_info = await bot.get_stranger_info(user_id=event.user_id)
+        return user_info.get("nickname") or ""
+
+    async def resolve(self, bot: Bot, event: MessageEvent) -> str:
+        """获取发送者显示名称，都查不到时返回 QQ 号(不缓存，之后的消息会重新查询)"""
+        name = event.sender.nickname or event.sender.card
+        if name:
+            return name
+        key = self._key(event)
+        name = self.names.get(key)
+        if name:
+            return name
+        if isinstance(event, GroupMessageEvent) and event.group_id not in self.member_list_fetched:
+            try:
+                await self._fetch_member_list(bot, event)
+                name = self.names.get(key)
+            except Exception as e:
+                logger.warning(f"获取群成员列表失败，改为查询单个成员: {e}")
+        if not name:
+            try:
+                name = await self._query_name(bot, event)
+            except Exception as e:
+                logger.warning(f"获取用户信息失败: {e}")
+            if not name:
+                return str(event.user_id)
+            self.names.set(key, name)
+        return name
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.names.stats(), "api_calls": self.api_calls}
@@ -0,0 +1,126 @@
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+import asyncio
+import time
+
+from nonebot.adapters.onebot.v11 import Bot, Event, GroupMessageEvent
+from nonebot.adapters.onebot.v11.exception import ActionFailed
+
+from .backends import TokenBucket
+from .log import logger
+from .metrics import registry as metrics
+
+
+class _Item:
+    __slots__ = ("bot", "event", "message", "fallback", "delay", "queued_at")
+
+    def __init__(self, bot: Bot, event: Event, message: Any, fallback: Any, delay: float):
+        self.bot = bot
+        self.event = event
+        self.message = message
+        self.fallback = fallback
+        self.delay = delay
+        self.queued_at = time.monotonic()
+
+
+def get_target(event: Event) -> Tuple[str, int]:
+    """消息发送的目标(群或私聊对象)"""
+    if isinstance(event, GroupMessageEvent):
+        return "group", event.group_id
+    return "private", event.user_id
+
+
+class Outbox:
+    """
+    出站消息调度
+    按目标(群/私聊)排队，同一目标按顺序发送并保持最小间隔，所有目标共用每分钟条数上限；
+    分段之间的打字延迟由调度器等待，处理消息的 handler 入队后即可返回。
+    发送失败(ActionFailed)时退避重试，仍失败则改发备用消息(如媒体发送失败时的文字说明)
+    """
+
+    def __init__(self, rpm: int, target_interval: float, retries: int, backoff: float):
+        self.bucket = TokenBucket(rpm)
+        self.target_interval = target_interval
+        self.retries = retries
+        self.backoff = backoff
+        self._queues: Dict[Tuple[str, int], Deque[_Item]] = {}
+        self._workers: Dict[Tuple[str, int], asyncio.Task] = {}
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+
+    def put(self, bot: Bot, event: Event, message: Any, fallback: Any = None, delay: float = 0.0) -> None:
+        """
+        消息入队
+        delay 为发送前额外等待的秒数(模拟打字)，fallback 为重试仍失败时改发的消息
+        """
+        target = get_target(event)
+        queue = self._queues.get(target)
+        if queue is None:
+            queue = self._queues[target] = deque()
+        queue.append(_Item(bot, event, message, fallback, delay))
+        if target not in self._workers:
+            self._workers[target] = asyncio.create_task(self._run(target, queue))
+
+    async def _run(self, target: Tuple[str, int], queue: Deque[_Item]) -> None:
+        last_sent = 0.0
+        try:
+            while queue:
+                item = queue.popleft()
+                wait = max(item.delay, last_sent + self.target_interval - time.monotonic())
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                wait = self.bucket.reserve()
+                if wait:
+                    await asyncio.sleep(wait)
+                await self._send(target, item)
+                last_sent = time.monotonic()
+                metrics.observe("llm_chat_stage_seconds", last_sent - item.queued_at, stage="outbox")
+                if not queue:
+                    # 队列清空后等满最小间隔再退出，保证与下一条回复的间隔
+                    await asyncio.sleep(max(0.0, last_sent + self.target_interval - time.monotonic()))
+        finally:
+            del self._queues[target]
+            del self._workers[target]
+
+    async def _send(self, target: Tuple[str, int], item: _Item) -> None:
+        error: Optional[Exception] = None
+        for attempt in range(self.retries + 1):
+            try:
+                await item.bot.send(item.event, item.message)
+                self.sent += 1
+                return
+            except ActionFailed as e:
+                error = e
+                if attempt < self.retries:
+                    self.retried += 1
+                    metrics.inc("llm_chat_send_retries_total")
+                    await asyncio.sleep(self.backoff * 2 ** attempt)
+            except Exception as e:
+                error = e
+                break
+        self.failed += 1
+        metrics.inc("llm_chat_send_failures_total")
+        logger.warning(f"消息发送失败 {target[0]}_{target[1]}: {error}")
+        if item.fallback is not None:
+            try:
+                await item.bot.send(item.event, item.fallback)
+                self.sent += 1
+            except Exception as e:
+                logger.warning(f"备用消息发送失败 {target[0]}_{target[1]}: {e}")
+
+    @property
+    def pending(self) -> int:
+        """所有目标排队中的消息总数"""
+        return sum(len(queue) for queue in self._queues.values())
+
+    async def close(self, timeout: float) -> None:
+        """等待排队中的消息发送完毕，超时后放弃剩余消息"""
+        workers = list(self._workers.values())
+        if not workers:
+            return
+        _, pending = await asyncio.wait(workers, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning(f"关闭时丢弃 {self.pending} 条未发送的消息")
@@ -0,0 +1,256 @@
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+import asyncio
+import json
+import queue
+import threading
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult, LLMResult
+from langchain_core.tools import BaseTool, StructuredTool
+from nonebot.adapters.onebot.v11 import MessageEvent
+
+
+def turn_key(messages: Sequence[BaseMessage]) -> Tuple[str, int]:
+    """
+    模型调用的回放键：(最后一条用户消息内容, 本轮中第几次调用模型)
+    同一条用户消息触发的多轮工具调用依次编号
+    """
+    human, index = "", 0
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            human = message.content if isinstance(message.content, str) else json.dumps(message.content, ensure_ascii=False)
+            break
+        if isinstance(message, AIMessage):
+            index += 1
+    return human, index
+
+
+def tool_key(name: str, args: Any) -> Tuple[str, str]:
+    """工具调用的回放键：(工具名, 规范化后的参数)"""
+    if isinstance(args, str):
+        try:
+            args = json.loads(args)
+        except json.JSONDecodeError:
+            pass
+    return name, json.dumps(args, sort_keys=True, ensure_ascii=False)
+
+
+def _compact(value: Any) -> Any:
+    """去掉值为 None 的字段"""
+    if isinstance(value, dict):
+        return {k: _compact(v) for k, v in value.items() if v is not None}
+    if isinstance(value, list):
+        return [_compact(v) for v in value]
+    return value
+
+
+class TraceRecorder:
+    """
+    流量录制
+    将收到的消息事件及其引起的模型、工具输出写入 JSONL 文件，写盘在后台线程中进行
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._queue: "queue.Queue[Optional[dict]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._write_loop, name="trace-recorder", daemon=True)
+        self._thread.start()
+        self.handler = RecordingHandler(self)
+
+    def record(self, kind: str, **data: Any) -> None:
+        self._queue.put({"kind": kind, "t": round(time.time(), 3), **data})
+
+    def record_event(self, event: MessageEvent) -> None:
+        data = event.model_dump(mode="json")
+        # 保留适配器处理前的原始消息，回放时由适配器重新处理 @ 和回复
+        data["message"] = data.pop("original_message")
+        data.pop("to_me", None)
+        reply = data.pop("reply", None)
+        self.record("event", event=_compact(data), reply=_compact(reply) if reply else None)
+
+    def _write_loop(self) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                f.write(json.dumps(item, ensure_ascii=False, separators=(",", ":")) + "\n")
+                # 队列暂时清空时刷新，避免进程异常退出丢失过多记录
+                if self._queue.empty():
+                    f.flush()
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+
+class RecordingHandler(BaseCallbackHandler):
+    """记录每次模型调用和工具调用的输出"""
+
+    run_inline = True
+
+    def __init__(self, recorder: TraceRecorder):
+        self.recorder = recorder
+        # run_id -> (回放键, 开始时间)
+        self._running: Dict[UUID, Tuple[Any, float]] = {}
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[BaseMessage]], *,
+                            run_id: UUID, metadata: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        human, index = turn_key(messages[0])
+        thread_id = (metadata or {}).get("thread_id")
+        self._running[run_id] = ((thread_id, human, index), time.perf_counter())
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        item = self._running.pop(run_id, None)
+        if item is None:
+            return
+        (thread_id, human, index), start = item
+        message = response.generations[0][0].message
+        self.recorder.record(
+            "llm",
+            thread_id=thread_id,
+            human=human,
+            index=index,
+            content=message.content,
+            tool_calls=[
+                {"name": call["name"], "args": call["args"], "id": call["id"]}
+                for call in getattr(message, "tool_calls", [])
+            ],
+            latency=round(time.perf_counter() - start, 3),
+        )
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._running.pop(run_id, None)
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID,
+                      inputs: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        name = (serialized or {}).get("name") or kwargs.get("name")
+        self._running[run_id] = (tool_key(name, inputs if inputs is not None else input_str), time.perf_counter())
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        item = self._running.pop(run_id, None)
+        if item is None:
+            return
+        (name, args), start = item
+        content = getattr(output, "content", output)
+        self.recorder.record(
+            "tool",
+            name=name,
+            args=args,
+            output=content if isinstance(content, str) else str(content),
+            latency=round(time.perf_counter() - start, 3),
+        )
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._running.pop(run_id, None)
+
+
+class ReplayStore:
+    """
+    回放数据
+    按回放键查找录制的模型和工具输出，同一个键出现多次时按录制顺序依次返回
+    """
+
+    def __init__(self, records: List[dict], latency_scale: float = 1.0):
+        self.latency_scale = latency_scale
+        self.llm: Dict[tuple, List[dict]] = {}
+        self.tools: Dict[tuple, List[dict]] = {}
+        for record in records:
+            if record["kind"] == "llm":
+                self.llm.setdefault((record["thread_id"], record["human"], record["index"]), []).append(record)
+                # 会话 ID 对不上时(如切换了群聊隔离)退化为只按消息内容匹配
+                self.llm.setdefault((None, record["human"], record["index"]), []).append(record)
+            elif record["kind"] == "tool":
+                self.tools.setdefault((record["name"], record["args"]), []).append(record)
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def load(cls, path: str, latency_scale: float = 1.0) -> "ReplayStore":
+        with open(path, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        return cls(records, latency_scale)
+
+    def _take(self, table: Dict[tuple, List[dict]], *keys: tuple) -> Optional[dict]:
+        for key in keys:
+            records = table.get(key)
+            if records:
+                # 保留最后一条，重复回放时继续使用
+                record = records.pop(0) if len(records) > 1 else records[0]
+                self.hits += 1
+                return record
+        self.misses += 1
+        return None
+
+    def llm_output(self, thread_id: Optional[str], messages: Sequence[BaseMessage]) -> Tuple[AIMessage, float]:
+        human, index = turn_key(messages)
+        record = self._take(self.llm, (thread_id, human, index), (None, human, index))
+        if record is None:
+            return AIMessage(content="(回放记录中没有对应的模型输出)"), 0.0
+        tool_calls = [{**call, "type": "tool_call"} for call in record["tool_calls"]]
+        return AIMessage(content=record["content"], tool_calls=tool_calls), record["latency"] * self.latency_scale
+
+    def tool_output(self, name: str, args: Dict[str, Any]) -> Tuple[str, float]:
+        record = self._take(self.tools, tool_key(name, args))
+        if record is None:
+            return "(回放记录中没有对应的工具输出)", 0.0
+        return record["output"], record["latency"] * self.latency_scale
+
+
+class ReplayChatModel(BaseChatModel):
+    """回放录制的模型输出，并按录制时的耗时等待"""
+
+    store: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "ReplayChatModel":
+        # 工具调用已包含在录制的输出中
+        return self
+
+    @staticmethod
+    def _thread_id(run_manager) -> Optional[str]:
+        return (getattr(run_manager, "metadata", None) or {}).get("thread_id")
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        message, latency = self.store.llm_output(self._thread_id(run_manager), messages)
+        time.sleep(latency)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        message, latency = self.store.llm_output(self._thread_id(run_manager), messages)
+        await asyncio.sleep(latency)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def stub_tools(tools: List[BaseTool], store: ReplayStore) -> List[BaseTool]:
+    """将工具替换为返回录制输出的同名工具，参数结构保持不变"""
+
+    def stub(tool: BaseTool) -> BaseTool:
+        def func(**kwargs: Any) -> str:
+            output, latency = store.tool_output(tool.name, kwargs)
+            time.sleep(latency)
+            return output
+
+        async def coroutine(**kwargs: Any) -> str:
+            output, latency = store.tool_output(tool.name, kwargs)
+            await asyncio.sleep(latency)
+            return output
+
+        return StructuredTool.from_function(
+            func=func,
+            coroutine=coroutine,
+            name=tool.name,
+            description=tool.description,
+            args_schema=tool.args_schema,
+        )
+
+    return [stub(tool) for tool in tools]
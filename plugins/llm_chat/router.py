@@ -0,0 +1,151 @@
+from collections import Counter
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional
+import json
+import math
+import re
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.tools import BaseTool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from .metrics import registry as metrics
+from .tokens import content_text, get_counter
+
+# 只保留文字和数字参与相似度计算
+_NON_WORD_PATTERN = re.compile(r"[\W_]+")
+
+
+def char_ngrams(text: str, n: int = 2) -> Counter:
+    """字符 n-gram 计数，中文不分词也能比较，英文按单词内的字符组合比较"""
+    grams = Counter()
+    for word in _NON_WORD_PATTERN.split(text.lower()):
+        if not word:
+            continue
+        if len(word) < n:
+            grams[word] += 1
+            continue
+        for i in range(len(word) - n + 1):
+            grams[word[i:i + n]] += 1
+    return grams
+
+
+def _normalize(vector: Dict[str, float]) -> Dict[str, float]:
+    norm = math.sqrt(sum(v * v for v in vector.values()))
+    return {k: v / norm for k, v in vector.items()} if norm else {}
+
+
+class ToolRouter:
+    """
+    工具路由
+    每次调用模型前按本轮用户消息挑选相关的工具，只绑定这些工具以减少每次请求携带的工具定义：
+    先匹配配置的关键词，再用字符 n-gram 的 TF-IDF 余弦相似度与工具名称和描述比较(本地计算，不请求网络)；
+    两者都没有把握时绑定全部工具。本轮和最近几轮已调用过的工具始终保留，保证多步调用和追问可以继续
+    """
+
+    def __init__(self, tools: List[BaseTool], keywords: Dict[str, List[str]], always: Iterable[str],
+                 threshold: float, similarity: bool = True, sticky_turns: int = 1):
+        self.tools = {tool.name: tool for tool in tools}
+        self.all_names: FrozenSet[str] = frozenset(self.tools)
+        self.keywords = {
+            name: [word.lower() for word in words]
+            for name, words in keywords.items()
+            if name in self.tools
+        }
+        self.always = frozenset(name for name in always if name in self.tools)
+        self.threshold = threshold
+        self.similarity = similarity
+        self.sticky_turns = sticky_turns
+        self._build_index()
+        # 计数方式(分词器名或估算) -> 工具名 -> 工具定义的 token 数
+        self._schema_tokens: Dict[str, Dict[str, int]] = {}
+        self.routed = 0
+        self.fallbacks = 0
+        self.schema_tokens_saved = 0
+
+    def _build_index(self) -> None:
+        documents = {
+            name: char_ngrams(" ".join([name.replace("_", " "), tool.description, *self.keywords.get(name, [])]))
+            for name, tool in self.tools.items()
+        }
+        # 出现在越多工具描述中的片段区分度越低
+        df = Counter(gram for grams in documents.values() for gram in grams)
+        total = len(documents)
+        self.idf = {gram: math.log((1 + total) / (1 + count)) + 1 for gram, count in df.items()}
+        self.vectors = {
+            name: _normalize({gram: (1 + math.log(tf)) * self.idf[gram] for gram, tf in grams.items()})
+            for name, grams in documents.items()
+        }
+
+    def scores(self, text: str) -> Dict[str, float]:
+        """本轮消息与各工具的相似度"""
+        grams = char_ngrams(text)
+        query = _normalize({
+            gram: (1 + math.log(tf)) * self.idf[gram]
+            for gram, tf in grams.items()
+            if gram in self.idf
+        })
+        return {
+            name: sum(weight * vector.get(gram, 0.0) for gram, weight in query.items())
+            for name, vector in self.vectors.items()
+        }
+
+    def _recent_calls(self, messages: List[BaseMessage]) -> set:
+        """本轮及之前 sticky_turns 轮中调用过的工具"""
+        names = set()
+        turns = 0
+        for message in reversed(messages):
+            if isinstance(message, AIMessage):
+                names.update(call["name"] for call in message.tool_calls)
+            elif isinstance(message, HumanMessage):
+                turns += 1
+                if turns > self.sticky_turns:
+                    break
+        return names & self.all_names
+
+    def select(self, messages: List[BaseMessage], text: Optional[str] = None) -> FrozenSet[str]:
+        """返回本次调用要绑定的工具名，text 为本轮用户原文，未提供时使用最后一条用户消息"""
+        if not self.tools:
+            return self.all_names
+        if text is None:
+            human = next((m for m in reversed(messages) if isinstance(m, HumanMessage)), None)
+            text = content_text(human.content) if human is not None else ""
+        text = text.lower()
+        matched = {name for name, words in self.keywords.items() if any(word in text for word in words)}
+        if self.similarity and text:
+            matched.update(name for name, score in self.scores(text).items() if score >= self.threshold)
+        if not matched:
+            self.fallbacks += 1
+            metrics.inc("llm_chat_router_total", result="fallback")
+            return self.all_names
+        self.routed += 1
+        metrics.inc("llm_chat_router_total", result="routed")
+        return frozenset(matched | self.always | self._recent_calls(messages))
+
+    def schema_tokens(self, model: Optional[str]) -> Dict[str, int]:
+        counter = get_counter(model)
+        tokens = self._schema_tokens.get(counter.mode)
+        if tokens is None:
+            tokens = self._schema_tokens[counter.mode] = {
+                name: counter.count_text(json.dumps(convert_to_openai_tool(tool), ensure_ascii=False))
+                for name, tool in self.tools.items()
+            }
+        return tokens
+
+    def record(self, model: Optional[str], selected: FrozenSet[str]) -> None:
+        """记录本次少发送的工具定义 token 数"""
+        tokens = self.schema_tokens(model)
+        saved = sum(count for name, count in tokens.items() if name not in selected)
+        if saved:
+            self.schema_tokens_saved += saved
+            metrics.inc("llm_chat_tool_schema_tokens_saved_total", saved)
+
+    def tools_for(self, selected: FrozenSet[str]) -> List[BaseTool]:
+        # 保持加载顺序，相同的子集绑定出相同的请求
+        return [tool for name, tool in self.tools.items() if name in selected]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "routed": self.routed,
+            "fallbacks": self.fallbacks,
+            "schema_tokens_saved": self.schema_tokens_saved,
+        }
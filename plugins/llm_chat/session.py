@@ -0,0 +1,111 @@
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+import asyncio
+import time
+
+
+# 会话模板
+class Session:
+    def __init__(self, thread_id: str):
+        self.thread_id = thread_id
+        # 最后访问时间(单调时钟)
+        self.last_accessed = time.monotonic()
+
+
+class SessionStore:
+    """
+    LRU + 空闲过期的会话存储
+    会话按最近访问顺序保存在 OrderedDict 中，访问和淘汰均为 O(1)，
+    过期清理由后台任务从最久未访问的一端扫描，不再占用消息处理路径
+    """
+
+    def __init__(
+        self,
+        max_sessions: int,
+        ttl: float = 0,
+        on_evict: Optional[Callable[[str], None]] = None,
+    ):
+        self.max_sessions = max_sessions
+        # 空闲多少秒后清理会话，0 表示不按时间清理
+        self.ttl = ttl
+        # 会话因容量或过期被淘汰时的回调(参数为 thread_id)，主动删除不触发
+        self.on_evict = on_evict
+        # "group_123456_789012": Session对象1，越靠后越新
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, thread_id: str) -> bool:
+        return thread_id in self._sessions
+
+    def get_or_create(self, thread_id: str) -> Session:
+        """获取或创建会话，并标记为最近访问"""
+        session = self._sessions.get(thread_id)
+        if session is None:
+            self.misses += 1
+            session = self._sessions[thread_id] = Session(thread_id)
+            # 超出上限时淘汰最久未访问的会话
+            while len(self._sessions) > self.max_sessions:
+                evicted_id, _ = self._sessions.popitem(last=False)
+                self.evictions += 1
+                if self.on_evict:
+                    self.on_evict(evicted_id)
+        else:
+            self.hits += 1
+            self._sessions.move_to_end(thread_id)
+        session.last_accessed = time.monotonic()
+        return session
+
+    def remove(self, thread_id: str) -> Optional[Session]:
+        """删除指定会话"""
+        return self._sessions.pop(thread_id, None)
+
+    def remove_where(self, predicate: Callable[[str], bool]) -> List[str]:
+        """删除 thread_id 满足条件的会话，返回被删除的 thread_id"""
+        keys = [key for key in self._sessions if predicate(key)]
+        for key in keys:
+            del self._sessions[key]
+        return keys
+
+    def clear(self) -> None:
+        """清空所有会话"""
+        self._sessions.clear()
+
+    def sweep(self) -> int:
+        """清理空闲超过 ttl 的会话，返回清理数量"""
+        if not self.ttl:
+            return 0
+        deadline = time.monotonic() - self.ttl
+        expired = 0
+        # 从最久未访问的一端开始，遇到未过期的会话即可停止
+        while self._sessions:
+            thread_id, session = next(iter(self._sessions.items()))
+            if session.last_accessed > deadline:
+                break
+            del self._sessions[thread_id]
+            expired += 1
+            if self.on_evict:
+                self.on_evict(thread_id)
+        self.expirations += expired
+        return expired
+
+    async def run_sweeper(self, interval: float) -> None:
+        """后台定期清理过期会话"""
+        while True:
+            await asyncio.sleep(interval)
+            self.sweep()
+
+    def stats(self) -> Dict[str, int]:
+        """会话存储统计"""
+        return {
+            "resident": len(self._sessions),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
@@ -0,0 +1,48 @@
+from typing import List
+
+
+class StreamSplitter:
+    """
+    流式输出分段器
+    不断接收模型输出的文本片段，遇到分隔符(不保留)或句末标点(保留)时切出完整的一段
+    """
+
+    def __init__(self, separators: List[str], sentence_ends: List[str] = None):
+        self.separators = [sep for sep in separators if sep]
+        self.sentence_ends = [end for end in (sentence_ends or []) if end]
+        self._buffer = ""
+
+    def feed(self, text: str) -> List[str]:
+        """追加文本，返回已经完整的分段"""
+        self._buffer += text
+        pieces = []
+        while True:
+            cut = self._find_cut()
+            if cut is None:
+                break
+            end, next_start = cut
+            piece = self._buffer[:end].strip()
+            self._buffer = self._buffer[next_start:]
+            if piece:
+                pieces.append(piece)
+        return pieces
+
+    def _find_cut(self):
+        """查找最靠前的切分点，返回 (分段结束位置, 剩余文本起始位置)"""
+        best = None
+        for sep in self.separators:
+            index = self._buffer.find(sep)
+            if index != -1 and (best is None or index < best[0]):
+                best = (index, index + len(sep))
+        for end in self.sentence_ends:
+            index = self._buffer.find(end)
+            if index != -1 and (best is None or index < best[0]):
+                best = (index + len(end), index + len(end))
+        return best
+
+    def flush(self) -> str:
+        """取出剩余未成段的文本"""
+        rest, self._buffer = self._buffer, ""
+        for sep in self.separators:
+            rest = rest.replace(sep, "")
+        return rest.strip()
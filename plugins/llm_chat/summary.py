@@ -0,0 +1,140 @@
+from typing import Any, Awaitable, Callable, List, Optional, Set
+import asyncio
+
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    RemoveMessage,
+    SystemMessage,
+    ToolMessage,
+)
+
+from .log import logger, turn_messages
+from .mailbox import Mailbox
+from .metrics import registry as metrics
+from .tokens import content_text, get_counter, trim_last
+
+SUMMARY_PROMPT = """你负责为一段群聊/私聊维护滚动摘要。
+根据已有摘要和新增的早期对话，写出一份更新后的摘要：保留人物、称呼、约定、偏好、未完成的问题和重要事实，省略寒暄和工具调用细节。
+直接输出摘要正文，不超过 {max_tokens} 个 token。"""
+
+SUMMARY_HEADER = "以下是更早对话的摘要："
+
+
+def format_for_summary(messages: List[BaseMessage], counter, max_tool_tokens: int = 200) -> str:
+    """把待折叠的消息整理成摘要模型的输入"""
+    lines = []
+    for message in messages:
+        text = content_text(message.content).strip()
+        if isinstance(message, HumanMessage):
+            lines.append(f"用户: {text}")
+        elif isinstance(message, AIMessage):
+            if text:
+                lines.append(f"助手: {text}")
+            for tool_call in message.tool_calls:
+                lines.append(f"助手调用工具 {tool_call['name']}")
+        elif isinstance(message, ToolMessage):
+            lines.append(f"工具 {message.name or ''} 返回: {counter.truncate(text, max_tool_tokens)}")
+    return "\n".join(lines)
+
+
+class Summarizer:
+    """
+    滚动摘要
+    会话历史超过 token 预算时，在后台把较早的轮次连同已有摘要压缩成新的摘要，并从检查点中移除这些消息；
+    摘要保存在对话图状态的 summary 字段中，随检查点持久化，调用模型时拼接在系统提示词之后。
+    生成摘要时不占用会话信箱，只有写回检查点时才进入信箱与同一会话的对话串行，
+    期间早期历史或摘要被改动(如清空会话)时放弃本次结果
+    """
+
+    def __init__(self, graph, invoke: Callable[[str, List[BaseMessage]], Awaitable[BaseMessage]],
+                 mailbox: Mailbox, max_context_tokens: int,
+                 keep_ratio: float, max_summary_tokens: int, model: Optional[str] = None):
+        """invoke(模型名, 消息) 调用摘要模型，应与对话共用后端池(限流、熔断和换后端重试)"""
+        self.graph = graph
+        self.invoke = invoke
+        self.mailbox = mailbox
+        self.max_context_tokens = max_context_tokens
+        self.keep_tokens = int(max_context_tokens * keep_ratio)
+        self.max_summary_tokens = max_summary_tokens
+        self.model = model
+        self._pending: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self.folds = 0
+        self.folded_messages = 0
+
+    def schedule(self, thread_id: str, model_name: str) -> None:
+        """在后台检查并折叠会话历史，同一会话同时只有一个折叠任务"""
+        if thread_id in self._pending:
+            return
+        self._pending.add(thread_id)
+        task = asyncio.create_task(self._run(thread_id, model_name))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, thread_id: str, model_name: str) -> None:
+        try:
+            await self.fold(thread_id, model_name)
+        except Exception as e:
+            logger.opt(exception=e).warning(f"[{thread_id}] 生成对话摘要失败: {e}")
+        finally:
+            self._pending.discard(thread_id)
+
+    async def fold(self, thread_id: str, model_name: str) -> bool:
+        """历史超出预算时把较早的轮次折叠进摘要，只保留最近 keep_tokens 以内的完整轮次"""
+        config = {"configurable": {"thread_id": thread_id}}
+        snapshot = await self.graph.aget_state(config)
+        messages = snapshot.values.get("messages", [])
+        counter = get_counter(model_name)
+        if counter.count_messages(messages) <= self.max_context_tokens:
+            return False
+        start, _, _ = trim_last(messages, self.keep_tokens, counter.count)
+        keep = messages[start:] or turn_messages(messages)
+        old = messages[:len(messages) - len(keep)]
+        if not old:
+            return False
+        previous = snapshot.values.get("summary", "")
+        with metrics.span("llm_chat_stage_seconds", stage="summary"):
+            summary = await self.summarize(previous, old, model_name)
+        async with self.mailbox.slot(thread_id):
+            current = (await self.graph.aget_state(config)).values
+            current_ids = [message.id for message in current.get("messages", [])[:len(old)]]
+            if current_ids != [message.id for message in old] or current.get("summary", "") != previous:
+                metrics.inc("llm_chat_summary_discarded_total")
+                logger.debug(f"[{thread_id}] 生成摘要期间历史已改动，放弃本次摘要")
+                return False
+            await self.graph.aupdate_state(
+                config,
+                {"messages": [RemoveMessage(id=message.id) for message in old], "summary": summary},
+                as_node="chatbot",
+            )
+        self.folds += 1
+        self.folded_messages += len(old)
+        metrics.inc("llm_chat_summary_folded_messages_total", len(old))
+        logger.debug(f"[{thread_id}] {len(old)} 条消息已折叠进摘要")
+        return True
+
+    async def summarize(self, summary: str, messages: List[BaseMessage], model_name: str) -> str:
+        counter = get_counter(model_name)
+        content = f"已有摘要：\n{summary or '(无)'}\n\n新增的早期对话：\n{format_for_summary(messages, counter)}"
+        response = await self.invoke(self.model or model_name, [
+            SystemMessage(content=SUMMARY_PROMPT.format(max_tokens=self.max_summary_tokens)),
+            HumanMessage(content=content),
+        ])
+        return counter.truncate(content_text(response.content).strip(), self.max_summary_tokens)
+
+    def stats(self) -> dict:
+        return {"folds": self.folds, "folded_messages": self.folded_messages, "pending": len(self._pending)}
+
+    async def close(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+
+
+def summary_message(system_prompt: Optional[str], summary: Any) -> Optional[SystemMessage]:
+    """把摘要拼接在系统提示词之后，合并为一条系统消息(部分模型只接受一条系统消息)"""
+    if not summary:
+        return None
+    section = f"{SUMMARY_HEADER}\n{summary}"
+    return SystemMessage(content=f"{system_prompt}\n\n{section}" if system_prompt else section)
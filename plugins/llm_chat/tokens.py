@@ -0,0 +1,223 @@
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import json
+import re
+import threading
+import time
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+
+from .log import logger
+
+# 每条消息的角色、分隔符等固定开销
+MESSAGE_OVERHEAD = 4
+TRUNCATED_MARK = "…(内容过长已截断)"
+# 中日韩字符约一个字一个 token，其余按约 4 个字符一个 token 估算
+_CJK_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]")
+
+
+def encoding_name(model: str) -> str:
+    """模型对应的分词器，未知模型(gemini、llama 等)按 cl100k_base 近似"""
+    try:
+        import tiktoken.model
+
+        return tiktoken.model.encoding_name_for_model(model)
+    except (ImportError, KeyError):
+        return "cl100k_base"
+
+
+@lru_cache(maxsize=None)
+def load_encoding(name: str):
+    """加载分词器，首次使用时可能需要下载词表(没有超时)，只在后台线程中调用；失败时返回 None 并改用估算"""
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        logger.warning(f"分词器 {name} 加载失败，改为按字符估算 token 数: {e}")
+        return None
+
+
+def content_text(content: Any) -> str:
+    """消息内容转为纯文本(多模态内容只取文本部分)"""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(
+            part if isinstance(part, str) else str(part.get("text", ""))
+            for part in content
+        )
+    return str(content)
+
+
+class TokenCounter:
+    """
+    按分词器计算消息 token 数
+    计数按消息 id 缓存，每轮重新裁剪同一段历史时不必重复分词
+    分词器在后台线程中加载，加载完成前按字符估算，不阻塞事件循环
+    """
+
+    def __init__(self, encoding_name: str, cache_size: int = 50000):
+        self.encoding_name = encoding_name
+        self.encoding = None
+        self.cache_size = cache_size
+        # (消息 id, 内容长度) -> token 数
+        self._cache: "OrderedDict[tuple, int]" = OrderedDict()
+        # (消息 id, 预算) -> 截断后的工具消息
+        self._capped: "OrderedDict[tuple, BaseMessage]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.ready = threading.Event()
+        threading.Thread(target=self._load, name=f"tokenizer-{encoding_name}", daemon=True).start()
+
+    def _load(self) -> None:
+        encoding = load_encoding(self.encoding_name)
+        if encoding is not None:
+            with self._lock:
+                # 丢弃按估算得到的计数
+                self._cache.clear()
+                self._capped.clear()
+                self.encoding = encoding
+        self.ready.set()
+
+    @property
+    def mode(self) -> str:
+        """当前的计数方式，按 token 数缓存结果时用作键"""
+        return self.encoding_name if self.encoding is not None else "estimate"
+
+    def count_text(self, text: str) -> int:
+        if not text:
+            return 0
+        encoding = self.encoding
+        if encoding is not None:
+            return len(encoding.encode(text, disallowed_special=()))
+        cjk = len(_CJK_PATTERN.findall(text))
+        return cjk + (len(text) - cjk + 3) // 4
+
+    def _count_message(self, message: BaseMessage) -> int:
+        tokens = MESSAGE_OVERHEAD + self.count_text(content_text(message.content))
+        if isinstance(message, AIMessage) and message.tool_calls:
+            for tool_call in message.tool_calls:
+                tokens += self.count_text(tool_call["name"])
+                tokens += self.count_text(json.dumps(tool_call["args"], ensure_ascii=False))
+        return tokens
+
+    def count(self, message: BaseMessage) -> int:
+        if message.id is None:
+            return self._count_message(message)
+        key = (message.id, len(content_text(message.content)))
+        with self._lock:
+            tokens = self._cache.get(key)
+            if tokens is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return tokens
+        encoding = self.encoding
+        tokens = self._count_message(message)
+        with self._lock:
+            self.misses += 1
+            if self.encoding is not encoding:
+                # 计数期间分词器刚加载完成，不缓存估算值
+                return tokens
+            self._cache[key] = tokens
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return tokens
+
+    def count_messages(self, messages: List[BaseMessage]) -> int:
+        return sum(self.count(message) for message in messages)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """把文本截断到 max_tokens 以内，截断时在末尾加上提示"""
+        encoding = self.encoding
+        if self.count_text(text) <= max_tokens:
+            return text
+        if encoding is not None:
+            tokens = encoding.encode(text, disallowed_special=())
+            return encoding.decode(tokens[:max_tokens]) + TRUNCATED_MARK
+        # 估算模式下按比例截取字符
+        keep = len(text) * max_tokens // self.count_text(text)
+        return text[:keep] + TRUNCATED_MARK
+
+    def cap_tool_output(self, message: BaseMessage, max_tokens: int) -> BaseMessage:
+        """工具输出超过预算时返回截断后的副本，原消息(检查点中的历史)不变"""
+        if not isinstance(message, ToolMessage) or self.count(message) - MESSAGE_OVERHEAD <= max_tokens:
+            return message
+        key = (message.id, max_tokens)
+        capped = self._capped.get(key) if message.id is not None else None
+        if capped is None:
+            capped = message.model_copy(
+                update={"content": self.truncate(content_text(message.content), max_tokens)}
+            )
+            if message.id is not None:
+                with self._lock:
+                    self._capped[key] = capped
+                    if len(self._capped) > self.cache_size // 10:
+                        self._capped.popitem(last=False)
+        return capped
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "encoding": self.mode,
+            "cached": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def trim_last(messages: List[BaseMessage], max_tokens: int, count: Callable[[BaseMessage], int],
+              max_messages: int = 0, end_on: Tuple[type, ...] = ()) -> Tuple[int, int, int]:
+    """
+    从最近的消息往前保留到 token 预算(和可选的条数上限)用完为止，每条消息只计数一次，只访问保留的消息
+    结果与 trim_messages(strategy="last", allow_partial=False, start_on="human", end_on=end_on) 相同：
+    末尾不是 end_on 类型的消息先去掉，保留部分从第一条用户消息开始
+    返回 (起始下标, 结束下标, 保留部分的 token 数)，没有可保留的完整轮次时起止下标相等
+    """
+    end = len(messages)
+    if end_on:
+        while end and not isinstance(messages[end - 1], end_on):
+            end -= 1
+    start = end
+    total = 0
+    # 已保留消息的 token 数，从最近的消息往前依次追加
+    counts = []
+    while start > 0:
+        if max_messages and end - start >= max_messages:
+            break
+        tokens = count(messages[start - 1])
+        if total + tokens > max_tokens:
+            break
+        total += tokens
+        counts.append(tokens)
+        start -= 1
+    # 去掉开头不是用户消息的部分
+    while start < end and not isinstance(messages[start], HumanMessage):
+        total -= counts.pop()
+        start += 1
+    return start, end, total
+
+
+_counters: Dict[str, TokenCounter] = {}
+_counters_lock = threading.Lock()
+
+
+def get_counter(model: Optional[str]) -> TokenCounter:
+    """获取模型所用分词器的计数器，同一分词器的模型共用计数缓存"""
+    name = encoding_name(model or "")
+    counter = _counters.get(name)
+    if counter is None:
+        with _counters_lock:
+            counter = _counters.get(name)
+            if counter is None:
+                counter = _counters[name] = TokenCounter(name)
+    return counter
+
+
+def preload_counters(models: Iterable[Optional[str]], timeout: float = 0) -> None:
+    """提前开始加载各模型的分词器，timeout 大于 0 时最多等待这么久，超时后先按估算计数"""
+    counters = {get_counter(model) for model in models}
+    deadline = time.monotonic() + timeout
+    for counter in counters:
+        counter.ready.wait(max(0.0, deadline - time.monotonic()))
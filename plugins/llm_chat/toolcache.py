@@ -0,0 +1,166 @@
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Iterable, Tuple
+import asyncio
+import json
+import threading
+
+from langchain_core.tools import BaseTool, StructuredTool, ToolException
+
+from .bulkhead import ainvoke_inner, invoke_inner
+from .cache import TTLCache
+from .metrics import registry as metrics
+
+_MISSING = object()
+
+
+class ToolCache:
+    """
+    工具结果缓存
+    按规范化后的参数缓存幂等工具(天气、搜索、网页读取等)的输出，只缓存成功的结果；
+    相同参数的调用同时到达时只有第一个请求上游，其余等待并共用它的结果(single-flight)
+    输出中随调用时刻变化的字段(如查询时的日期时间)由 strip_fields 指定，缓存前去掉，命中时不会返回过时的值
+    """
+
+    def __init__(self, name: str, ttl: float, max_size: int, strip_fields: Iterable[str] = ()):
+        self.name = name
+        self.cache = TTLCache(max_size, ttl)
+        self.strip_fields = list(strip_fields)
+        # 同步工具在线程池中执行，缓存和进行中的请求都需要加锁
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+
+    def _claim(self, key: str) -> Tuple[Any, Future, bool]:
+        """返回 (缓存值, 进行中的请求, 是否由本次调用请求上游)"""
+        with self._lock:
+            value = self.cache.get(key, _MISSING)
+            if value is not _MISSING:
+                self.hits += 1
+                metrics.inc("llm_chat_tool_cache_total", tool=self.name, result="hit")
+                return value, None, False
+            future = self._inflight.get(key)
+            if future is not None:
+                self.shared += 1
+                metrics.inc("llm_chat_tool_cache_total", tool=self.name, result="shared")
+                return _MISSING, future, False
+            self.misses += 1
+            metrics.inc("llm_chat_tool_cache_total", tool=self.name, result="miss")
+            future = self._inflight[key] = Future()
+            return _MISSING, future, True
+
+    def _settle(self, key: str, future: Future, value: Any = _MISSING, error: BaseException = None) -> None:
+        with self._lock:
+            del self._inflight[key]
+            if error is None:
+                self.cache.set(key, value)
+        if error is None:
+            future.set_result(value)
+        else:
+            # 请求方被取消时，等待同一结果的调用不应跟着被取消
+            future.set_exception(
+                error if isinstance(error, Exception) else ToolException(f"工具 {self.name} 调用已取消")
+            )
+
+    def _strip(self, value: Any) -> Any:
+        """去掉 JSON 输出中的 strip_fields 顶层字段，非 JSON 对象的输出原样返回"""
+        if not self.strip_fields or not isinstance(value, str) or value.lstrip()[:1] != "{":
+            return value
+        try:
+            data = json.loads(value)
+        except ValueError:
+            return value
+        for field in self.strip_fields:
+            data.pop(field, None)
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+    def call(self, key: str, func: Callable[[], Any]) -> Any:
+        value, future, leader = self._claim(key)
+        if value is not _MISSING:
+            return value
+        if not leader:
+            return future.result()
+        try:
+            value = self._strip(func())
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        self._settle(key, future, value)
+        return value
+
+    async def acall(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        value, future, leader = self._claim(key)
+        if value is not _MISSING:
+            return value
+        if not leader:
+            return await asyncio.wrap_future(future)
+        try:
+            value = self._strip(await factory())
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        self._settle(key, future, value)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses + self.shared
+        return {
+            "name": self.name,
+            "size": len(self.cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared": self.shared,
+            "evictions": self.cache.evictions,
+            "inflight": len(self._inflight),
+            # 合并到进行中请求的调用同样没有请求上游，计入命中
+            "hit_rate": (self.hits + self.shared) / total if total else 0.0,
+        }
+
+
+def cache_key(tool: BaseTool, kwargs: Dict[str, Any]) -> str:
+    """规范化参数：补全默认值、去掉空值和字符串首尾空白，按键排序序列化"""
+    if tool.args_schema is not None and hasattr(tool.args_schema, "model_validate"):
+        kwargs = tool.args_schema.model_validate(kwargs).model_dump()
+    normalized = {
+        k: v.strip() if isinstance(v, str) else v
+        for k, v in kwargs.items()
+        if v is not None
+    }
+    return json.dumps(normalized, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def cached(tool: BaseTool, cache: ToolCache) -> BaseTool:
+    """把工具包装为带结果缓存的同名工具，参数结构保持不变"""
+
+    def func(**kwargs: Any) -> Any:
+        return cache.call(cache_key(tool, kwargs), lambda: invoke_inner(tool, kwargs))
+
+    async def coroutine(**kwargs: Any) -> Any:
+        return await cache.acall(cache_key(tool, kwargs), lambda: ainvoke_inner(tool, kwargs))
+
+    return StructuredTool.from_function(
+        func=func,
+        coroutine=coroutine,
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+        return_direct=tool.return_direct,
+        handle_tool_error=True,
+    )
+
+
+# 工具名 -> 结果缓存
+tool_caches: Dict[str, ToolCache] = {}
+
+
+def get_tool_cache(name: str, options: Dict[str, Any]) -> ToolCache:
+    cache = tool_caches.get(name)
+    if cache is None:
+        cache = tool_caches[name] = ToolCache(
+            name,
+            ttl=options.get("ttl", 600),
+            max_size=options.get("max_size", 256),
+            strip_fields=options.get("strip_fields", ()),
+        )
+    return cache
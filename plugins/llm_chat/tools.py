@@ -1,4 +1,4 @@
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional
 from langchain.tools import BaseTool
 from langchain_community.tools.tavily_search import TavilySearchResults
 import importlib.util
@@ -6,6 +6,10 @@ import sys
 import os
 from pathlib import Path
 import tomli
+from .bulkhead import get_bulkhead, isolate
+from .compaction import compacted, get_compactor
+from .log import logger
+from .toolcache import cached, get_tool_cache
 
 def _get_builtin_tools(config: dict) -> Dict[str, BaseTool]:
     """根据配置返回内置工具的初始化方法字典。"""
@@ -15,13 +19,24 @@ def _get_builtin_tools(config: dict) -> Dict[str, BaseTool]:
         )
     }
 
-def load_tools(enabled_tools: Optional[List[str]] = None, tool_paths: Optional[List[str]] = None) -> List[BaseTool]:
-    """加载启用的工具"""
+def load_tools(
+    enabled_tools: Optional[List[str]] = None,
+    tool_paths: Optional[List[str]] = None,
+    stub: Optional[Callable[[List[BaseTool]], List[BaseTool]]] = None,
+) -> List[BaseTool]:
+    """
+    加载启用的工具，并按配置依次包装：
+    [compaction] 压缩工具输出，[bulkhead] 为每个工具套上独立的隔舱，[cache] 缓存幂等工具的结果
+    stub 在包装前替换原始工具(如回放模式)，替换后的工具仍经过上述各层
+    """
     tools_list = []
+    compaction_config = {}
+    bulkhead_config = {}
+    cache_config = {}
 
     if enabled_tools is None:
         root_path = Path(__file__).resolve().parents[2]
-        config_path = root_path / "config-tools.toml"
+        config_path = Path(os.environ.get("LLMQ_TOOLS_CONFIG", root_path / "config-tools.toml"))
 
         try:
             with open(config_path, "rb") as f:
@@ -41,9 +56,12 @@ def load_tools(enabled_tools: Optional[List[str]] = None, tool_paths: Optional[L
             if factory:
                 tools_list.append(factory())
             else:
-                print(f"Warning: Built-in tool {name} not found")
+                logger.warning(f"Built-in tool {name} not found")
 
         enabled_tools = config.get("tools", {}).get("enabled", [])
+        compaction_config = config.get("compaction", {})
+        bulkhead_config = config.get("bulkhead", {})
+        cache_config = config.get("cache", {})
 
     search_paths = [str(Path(__file__).resolve().parents[2])]
     if tool_paths:
@@ -58,6 +76,38 @@ def load_tools(enabled_tools: Optional[List[str]] = None, tool_paths: Optional[L
             tool_module = importlib.import_module(f"tools.{name.replace('-', '_')}")
             tools_list.extend(tool_module.tools if hasattr(tool_module, 'tools') else [])
         except (ModuleNotFoundError, ImportError) as e:
-            print(f"Error loading tool {name}: {str(e)}")
+            logger.error(f"Error loading tool {name}: {str(e)}")
 
-    return tools_list
\ No newline at end of file
+    if stub:
+        tools_list = stub(tools_list)
+
+    # 只压缩单独配置了的工具，其余工具的输出只在组装上下文时按 max_tool_output_tokens 截断
+    if compaction_config.get("enable", True):
+        defaults = _tool_defaults(compaction_config)
+        tools_list = [
+            compacted(tool, get_compactor(tool.name, {**defaults, **compaction_config[tool.name]}))
+            if isinstance(compaction_config.get(tool.name), dict) else tool
+            for tool in tools_list
+        ]
+
+    if bulkhead_config.get("enable", True):
+        defaults = _tool_defaults(bulkhead_config)
+        tools_list = [
+            isolate(tool, get_bulkhead(tool.name, {**defaults, **bulkhead_config.get(tool.name, {})}))
+            for tool in tools_list
+        ]
+
+    # 缓存套在隔舱外层，命中时不占用工具的执行名额；只缓存单独配置了的工具
+    if cache_config.get("enable", True):
+        defaults = _tool_defaults(cache_config)
+        tools_list = [
+            cached(tool, get_tool_cache(tool.name, {**defaults, **cache_config[tool.name]}))
+            if isinstance(cache_config.get(tool.name), dict) else tool
+            for tool in tools_list
+        ]
+
+    return tools_list
+
+def _tool_defaults(section: dict) -> dict:
+    """配置节中的公共选项(各工具的子表除外)"""
+    return {k: v for k, v in section.items() if not isinstance(v, dict)}
\ No newline at end of file
@@ -0,0 +1,42 @@
+from functools import lru_cache
+from typing import Sequence, Tuple
+import re
+
+
+class TriggerMatcher:
+    """
+    触发词多模式匹配器
+    将所有触发词预编译为一个正则(长词优先)，一次扫描即可同时判断关键词命中和前缀命中
+    """
+
+    def __init__(self, words: Sequence[str]):
+        words = sorted({word for word in words if word}, key=len, reverse=True)
+        self.pattern = re.compile("|".join(map(re.escape, words))) if words else None
+
+    def scan(self, text: str) -> Tuple[bool, bool]:
+        """返回 (是否包含触发词, 是否以触发词开头)"""
+        if self.pattern is None:
+            return False, False
+        match = self.pattern.search(text)
+        if match is None:
+            return False, False
+        return True, match.start() == 0
+
+    def strip_prefix(self, text: str) -> str:
+        """移除开头的触发词(多个触发词同时匹配时移除最长的一个)"""
+        if self.pattern is None:
+            return text
+        match = self.pattern.match(text)
+        if match is None:
+            return text
+        return text[match.end():].strip()
+
+
+@lru_cache(maxsize=4)
+def _build_matcher(words: Tuple[str, ...]) -> TriggerMatcher:
+    return TriggerMatcher(words)
+
+
+def get_trigger_matcher(words: Sequence[str]) -> TriggerMatcher:
+    """获取触发词匹配器，触发词列表变化时自动重建"""
+    return _build_matcher(tuple(words))
@@ -1,18 +1,54 @@
 import os
+import asyncio
 import base64
-import requests
-from openai import OpenAI
-from langchain_core.tools import tool
+import httpx
+from openai import OpenAI, AsyncOpenAI
+from langchain_core.tools import StructuredTool
 from .config import config
+from . import http_client
+from loguru import logger
 
 img_config = config.get("img_analysis", {})
 
 client = OpenAI(
     api_key=img_config.get("new_api_key"),
     base_url=img_config.get("new_base_url"),
+    http_client=http_client.get_client(),
 )
 
-@tool(parse_docstring=True)
+# 连接池客户端 -> 异步 OpenAI 客户端，连接池按事件循环区分，异步客户端随之复用
+_async_clients = {}
+
+def _async_client() -> AsyncOpenAI:
+    pool = http_client.get_async_client()
+    async_client = _async_clients.get(pool)
+    if async_client is None:
+        async_client = _async_clients[pool] = AsyncOpenAI(
+            api_key=img_config.get("new_api_key"),
+            base_url=img_config.get("new_base_url"),
+            http_client=pool,
+        )
+    return async_client
+
+def _download_url(image_input: str) -> str:
+    if "multimedia.nt.qq.com.cn" in image_input and image_input.startswith("https"):
+        image_input = image_input.replace("https", "http", 1)
+    return image_input
+
+def _encode_download(content: bytes) -> str:
+    img_folder = img_config.get("img_folder")
+    os.makedirs(img_folder, exist_ok=True)
+    file_path = os.path.join(img_folder, "downloaded_image.jpg")
+    with open(file_path, "wb") as f:
+        f.write(content)
+    encoded_image = base64.b64encode(content).decode("utf-8")
+    return f"data:image/jpeg;base64,{encoded_image}"
+
+def _inline_image_url(image_input: str) -> str:
+    if image_input.startswith(("data:image/", "data:application/")):
+        return image_input
+    return f"data:image/jpeg;base64,{image_input}"
+
 def analyze_image(query: str, image_input: str) -> str:
     """Get and return the content and information in the image according to the query requirements.  It can also analyze the image.
 
@@ -21,37 +57,48 @@ def analyze_image(query: str, image_input: str) -> str:
         image_input: The image source, which can be an image URL (http:// or https://), a Base64 encoded image string, or a Base64 image string with the "image/" prefix.
     """
 
-    img_folder = img_config.get("img_folder")
-    os.makedirs(img_folder, exist_ok=True)
-    image_url = None
-
     if image_input.startswith(("http://", "https://")):
         try:
-            if "multimedia.nt.qq.com.cn" in image_input and image_input.startswith("https"):
-                image_input = image_input.replace("https", "http", 1)
-            file_path = os.path.join(img_folder, "downloaded_image.jpg")
-            response = requests.get(image_input, timeout=10)
+            response = http_client.get(_download_url(image_input), timeout=10)
             response.raise_for_status()
-            with open(file_path, "wb") as f:
-                f.write(response.content)
-            with open(file_path, "rb") as f:
-                encoded_image = base64.b64encode(f.read()).decode("utf-8")
-            image_url = f"data:image/jpeg;base64,{encoded_image}"
-        except requests.exceptions.RequestException as e:
-            print(f"下载失败，错误：{e}")
+            image_url = _encode_download(response.content)
+        except httpx.HTTPError as e:
+            logger.error(f"下载失败，错误：{e}")
             raise
     else:
-        if image_input.startswith(("data:image/", "data:application/")):
-            image_url = image_input
-        else:
-            image_url = f"data:image/jpeg;base64,{image_input}"
+        image_url = _inline_image_url(image_input)
 
     completion = client.chat.completions.create(
         model=img_config.get("model"),
-        messages=[
-            {
-                "role": "system",
-                "content": """You are now a pair of keen eyes. Your task is to observe and understand the images uploaded by the user and, based on the user's instructions, return the required information and a detailed description of the image.
+        messages=_analysis_messages(query, image_url),
+    )
+    return f"tool result: {completion.choices[0].message.content}"
+
+async def aanalyze_image(query: str, image_input: str) -> str:
+    """analyze_image 的异步版本"""
+    if image_input.startswith(("http://", "https://")):
+        try:
+            response = await http_client.aget(_download_url(image_input), timeout=10)
+            response.raise_for_status()
+            # 写文件和编码放到线程中，不阻塞事件循环
+            image_url = await asyncio.to_thread(_encode_download, response.content)
+        except httpx.HTTPError as e:
+            logger.error(f"下载失败，错误：{e}")
+            raise
+    else:
+        image_url = _inline_image_url(image_input)
+
+    completion = await _async_client().chat.completions.create(
+        model=img_config.get("model"),
+        messages=_analysis_messages(query, image_url),
+    )
+    return f"tool result: {completion.choices[0].message.content}"
+
+def _analysis_messages(query: str, image_url: str) -> list:
+    return [
+        {
+            "role": "system",
+            "content": """You are now a pair of keen eyes. Your task is to observe and understand the images uploaded by the user and, based on the user's instructions, return the required information and a detailed description of the image.
 
 Please note the following requirements:
 1. You can only output in plain text format. You cannot use any text rendering formats, such as Markdown, LaTeX, **bold**, *italics*, etc.
@@ -62,24 +109,22 @@ Please note the following requirements:
 6. You need to respond in the language used by the user. If the user uses Chinese, you need to respond in Chinese; if the user uses English, you need to respond in English, and so on.
 
 After understanding the image uploaded by the user and their instructions, please begin your observation and description.""" 
-            },
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": query,
+        },
+        {
+            "role": "user",
+            "content": [
+                {
+                    "type": "text",
+                    "text": query,
+                },
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": image_url
                     },
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": image_url
-                        },
-                    },
-                ],
-            }
-        ],
-    )
-    return f"tool result: {completion}"
+                },
+            ],
+        }
+    ]
 
-tools = [analyze_image]
\ No newline at end of file
+tools = [StructuredTool.from_function(func=analyze_image, coroutine=aanalyze_image, parse_docstring=True)]
\ No newline at end of file
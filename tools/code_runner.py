@@ -1,15 +1,19 @@
 # judge0
 # 测试通过语言: Assembly,Bash,C,C++,Clojure,C#,COBOL,Common Lisp,D,Elixir,F#,Fortran,Go,Groovy,Haskell,Java,JavaScript,Kotlin,Lua,OCaml,Octave,Pascal,Perl,PHP,Plain Text,Python,Python2,R,Ruby,Rust,Scala,SQL,Swift,TypeScript,Visual Basic.Net
-from langchain_core.tools import tool
+from langchain_core.tools import StructuredTool
 from datetime import datetime, timezone, timedelta
 from .config import config
-import requests
+from . import http_client
+import httpx
+import asyncio
 import codecs
 import base64
 import json
+import threading
 import time
 import re
 import os
+from loguru import logger
 code_runner = config.get("code_runner", {})
 
 judge0_api_key = code_runner.get("judge0_api_key")
@@ -22,6 +26,10 @@ UPDATE_INTERVAL = 2 * 24 * 60 * 60
 submit_fields = "stdout,stderr,compile_output,message,exit_code,exit_signal,status,created_at,finished_at,time,wall_time,memory,compile_output,language,status"
 
 _language_cache = None
+_language_expires = 0.0
+_language_lock = threading.Lock()
+# 语言列表获取失败后，隔多久再向 API 重试(秒)
+LANGUAGE_RETRY_INTERVAL = 60
 
 MAX_OUTPUT_LENGTH = 300  # 限制输出长度为1000字符
 
@@ -29,13 +37,13 @@ def _fetch_languages_from_api_():
     """
     从 API 获取数据并更新缓存文件
     """
-    print("Fetching languages from API...")
+    logger.info("Fetching languages from API...")
     url = f"{judge0_url}/languages"
     headers = {
         'X-Auth-Token': judge0_api_key,
     }
     try:
-        response = requests.get(url, headers=headers)
+        response = http_client.get(url, headers=headers)
         response.raise_for_status()
         languages = response.json()
         formatted_languages = {}
@@ -55,13 +63,13 @@ def _fetch_languages_from_api_():
         with open(CACHE_FILE, "w") as f:
             json.dump({"timestamp": time.time(), "data": formatted_languages}, f)
         return formatted_languages
-    except requests.exceptions.RequestException as e:
-        print(f"An error occurred: {e}")
+    except httpx.HTTPError as e:
+        logger.error(f"An error occurred: {e}")
         # 如果API请求失败且有缓存文件，则返回缓存数据
         if os.path.exists(CACHE_FILE):
             with open(CACHE_FILE, "r") as f:
                 cached_data = json.load(f)
-                print("Using cached data due to API error.")
+                logger.warning("Using cached data due to API error.")
                 return cached_data["data"]
         return None
 
@@ -77,18 +85,36 @@ def _get_formatted_languages_dict_():
                 cached_data = json.load(f)
                 timestamp = cached_data.get("timestamp", 0)
                 if time.time() - timestamp < UPDATE_INTERVAL:
-                    print("Using cached languages data.")
+                    logger.debug("Using cached languages data.")
                     return cached_data["data"]
                 else:
-                    print("Cached data is outdated.")
+                    logger.info("Cached data is outdated.")
                     return _fetch_languages_from_api_()
             except json.JSONDecodeError:
-                print("Error decoding cached data.")
+                logger.warning("Error decoding cached data.")
                 return _fetch_languages_from_api_()
     else:
-        print("Cache file not found.")
+        logger.info("Cache file not found.")
         return _fetch_languages_from_api_()
 
+def _get_languages_():
+    """
+    内存中的语言列表，过期后加锁刷新，并发的查询只触发一次刷新
+    刷新失败时沿用旧列表，并在 LANGUAGE_RETRY_INTERVAL 之后再重试，避免每次调用都请求 API
+    """
+    global _language_cache, _language_expires
+    if time.monotonic() < _language_expires:
+        return _language_cache
+    with _language_lock:
+        if time.monotonic() >= _language_expires:
+            languages = _get_formatted_languages_dict_()
+            if languages:
+                _language_cache = languages
+                _language_expires = time.monotonic() + UPDATE_INTERVAL
+            else:
+                _language_expires = time.monotonic() + LANGUAGE_RETRY_INTERVAL
+    return _language_cache
+
 def _normalize_lang_name_(query_name):
     """
     规范化语言名称
@@ -145,10 +171,8 @@ def _find_best_lang_match_(query):
     """
     根据查询字符串在语言字典中找到最佳匹配的语言ID
     """
-    global _language_cache
-    if _language_cache is None:
-         _language_cache = _get_formatted_languages_dict_()
-    if not _language_cache:
+    languages = _get_languages_()
+    if not languages:
         return None
 
     query = query.lower()
@@ -168,7 +192,7 @@ def _find_best_lang_match_(query):
         query_name = "c++"
     query_name = _normalize_lang_name_(query_name)
 
-    for lang_name, versions in _language_cache.items():
+    for lang_name, versions in languages.items():
         lang_name_lower = lang_name.lower()
 
         # 3. 名称匹配 
@@ -201,16 +225,14 @@ def _find_best_lang_match_(query):
         best_match = matches[0][0]
         
     if best_match:
-        print(f"Query: '{query}', Best Match: {best_match}")
+        logger.debug(f"Query: '{query}', Best Match: {best_match}")
     else:
-        print(f"Query: '{query}', No Match Found.")
+        logger.debug(f"Query: '{query}', No Match Found.")
     
     return best_match["id"]
 
-def submit_code(source_code, language_id=100, stdin=None):
-    """
-    提交代码并获取执行结果。
-    """
+def _submission_request(source_code, language_id=100, stdin=None):
+    """构建提交代码的请求地址、请求体和请求头"""
     url = f"{judge0_url}/submissions?base64_encoded=true&wait=true&fields={submit_fields}"
 
     payload = {
@@ -231,13 +253,30 @@ def submit_code(source_code, language_id=100, stdin=None):
        'Content-Type': 'application/json'
     }
 
-    response = requests.request("POST", url, headers=headers, data=payload)
-    
+    return url, payload, headers
+
+def submit_code(source_code, language_id=100, stdin=None):
+    """
+    提交代码并获取执行结果。
+    """
+    url, payload, headers = _submission_request(source_code, language_id, stdin)
     try:
+      response = http_client.post(url, headers=headers, content=payload)
       response.raise_for_status()
       return response.json()
-    except requests.exceptions.RequestException as e:
-      print(f"An error occurred: {e}")
+    except httpx.HTTPError as e:
+      logger.error(f"An error occurred: {e}")
+      return None
+
+async def asubmit_code(source_code, language_id=100, stdin=None):
+    """submit_code 的异步版本"""
+    url, payload, headers = _submission_request(source_code, language_id, stdin)
+    try:
+      response = await http_client.apost(url, headers=headers, content=payload)
+      response.raise_for_status()
+      return response.json()
+    except httpx.HTTPError as e:
+      logger.error(f"An error occurred: {e}")
       return None
 
 
@@ -324,7 +363,6 @@ def base64_code(source_code, stdin=None):
     return result
 
 
-@tool(parse_docstring=True)
 def code_runner(source_code: str, language: str, stdin: str = None) -> str:
     """Run the code and return detailed runtime data and results.
 
@@ -345,4 +383,17 @@ def code_runner(source_code: str, language: str, stdin: str = None) -> str:
     return f"Tool Response: {formatted_result}"
 
 
-tools = [code_runner]
\ No newline at end of file
+async def acode_runner(source_code: str, language: str, stdin: str = None) -> str:
+    """code_runner 的异步版本"""
+    # 语言列表读写本地缓存文件，只在首次使用或过期时请求接口，放到线程中执行
+    language_id = await asyncio.to_thread(_find_best_lang_match_, language)
+    if language_id is None:
+        return "未找到匹配的编程语言。"
+
+    base64_result = base64_code(source_code, stdin)
+    result = await asubmit_code(base64_result["source_code"], language_id, base64_result.get("stdin"))
+    formatted_result = format_submission_result(result)
+    return f"Tool Response: {formatted_result}"
+
+
+tools = [StructuredTool.from_function(func=code_runner, coroutine=acode_runner, parse_docstring=True)]
\ No newline at end of file
@@ -1,14 +1,17 @@
 import fal_client
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+import asyncio
 import os
 from pathlib import Path
 import base64
-import requests
+import httpx
 from datetime import datetime
 import json
 from .config import config
+from . import http_client
 from .prompt.prompt import prompt_all
-from langchain_core.tools import tool
+from langchain_core.tools import StructuredTool
+from loguru import logger
 
 root_path = Path(__file__).resolve().parents[1]
 temp_server_dir = root_path / "temp_server"
@@ -21,42 +24,84 @@ os.environ.update({
     "OPENAI_BASE_URL": create_art_config.get("openai_base_url")
 })
 
+client = OpenAI(http_client=http_client.get_client())
+# 连接池客户端 -> 异步 OpenAI 客户端，连接池按事件循环区分，异步客户端随之复用
+_async_clients = {}
+
+def _async_client() -> AsyncOpenAI:
+    pool = http_client.get_async_client()
+    async_client = _async_clients.get(pool)
+    if async_client is None:
+        async_client = _async_clients[pool] = AsyncOpenAI(http_client=pool)
+    return async_client
+
+def _optimize_messages(prompt: str) -> list:
+    return [
+        {"role": "system", "content": prompt_all.get("create_art")},
+        {"role": "user", "content": prompt}
+    ]
+
 def _optimize_prompt(prompt: str) -> str:
     """使用 AI 优化绘图提示词"""
-    client = OpenAI()
     completion = client.chat.completions.create(
         model=create_art_config.get("model"),
-        messages=[
-            {"role": "system", "content": prompt_all.get("create_art")},
-            {"role": "user", "content": prompt}
-        ]
+        messages=_optimize_messages(prompt)
     )
     optimized_prompt = completion.choices[0].message.content.strip()
-    print(f"优化后Prompt: [{optimized_prompt}]")
+    logger.debug(f"优化后Prompt: [{optimized_prompt}]")
     return optimized_prompt
 
+async def _aoptimize_prompt(prompt: str) -> str:
+    completion = await _async_client().chat.completions.create(
+        model=create_art_config.get("model"),
+        messages=_optimize_messages(prompt)
+    )
+    optimized_prompt = completion.choices[0].message.content.strip()
+    logger.debug(f"优化后Prompt: [{optimized_prompt}]")
+    return optimized_prompt
+
+def _fal_arguments(optimized_prompt: str, image_size: str, style: str) -> dict:
+    return {
+        "prompt": optimized_prompt,
+        "image_size": image_size,
+        "output_format": "png",
+        "style": style,
+        "sync_mode": True
+    }
+
+def _fal_image_url(result):
+    if result and result.get('images'):
+        return result['images'][0].get('url', '') or None
+    return None
+
 def _draw_via_fal(prompt: str, image_size: str = "square_hd", style: str = "any") -> str:
     """使用 FAL.ai 生成图片"""
     optimized_prompt = _optimize_prompt(prompt)
     
     result = fal_client.submit(
         "fal-ai/recraft-v3",
-        arguments={
-            "prompt": optimized_prompt,
-            "image_size": image_size,
-            "output_format": "png",
-            "style": style,
-            "sync_mode": True
-        }
+        arguments=_fal_arguments(optimized_prompt, image_size, style)
     )
     
     result = fal_client.result("fal-ai/recraft-v3", result.request_id)
-    if result and result.get('images'):
-        url = result['images'][0].get('url', '')
-        if url:
-            _save_image(url)
-            return url
-    return None
+    url = _fal_image_url(result)
+    if url:
+        _save_image(url)
+    return url
+
+async def _adraw_via_fal(prompt: str, image_size: str = "square_hd", style: str = "any") -> str:
+    optimized_prompt = await _aoptimize_prompt(prompt)
+
+    handle = await fal_client.submit_async(
+        "fal-ai/recraft-v3",
+        arguments=_fal_arguments(optimized_prompt, image_size, style)
+    )
+
+    result = await fal_client.result_async("fal-ai/recraft-v3", handle.request_id)
+    url = _fal_image_url(result)
+    if url:
+        await _asave_image(url)
+    return url
 
 def _convert_size_for_glm(fal_size: str) -> str:
     """将 FAL 的尺寸格式转换为 GLM 支持的尺寸格式"""
@@ -75,10 +120,9 @@ def _convert_size_for_glm(fal_size: str) -> str:
     }
     return size_mapping.get(fal_size, size_mapping["default"])
 
-def _draw_via_glm(prompt: str, size: str = "square_hd") -> str:
-    """使用智谱 GLM 生成图片"""
-    optimized_prompt = _optimize_prompt(prompt)
+def _glm_request(optimized_prompt: str, size: str):
     glm_size = _convert_size_for_glm(size)
+    logger.debug(f"使用GLM尺寸: {glm_size}")
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {create_art_config.get('glm_key')}"
@@ -90,61 +134,95 @@ def _draw_via_glm(prompt: str, size: str = "square_hd") -> str:
         "size": glm_size,
         "user_id": "default_user"
     }
-    
-    try:
-        print(f"使用GLM尺寸: {glm_size}")
-        response = requests.post(
-            "https://open.bigmodel.cn/api/paas/v4/images/generations",
-            headers=headers,
-            json=payload,
-            timeout=30
-        )
-        
-        response.raise_for_status()
-        
-        result = response.json()
-        if "data" in result and isinstance(result["data"], list) and result["data"]:
-            url = result["data"][0].get("url")
-            if url:
-                _save_image(url)
-                return url
-            else:
-                return f"未找到图片URL, 响应数据: {result}"
-        else:
-            return f"响应格式错误: {result}"
-            
-    except requests.exceptions.RequestException as e:
+    return headers, payload
+
+def _glm_image_url(result):
+    """从响应中取出图片地址，失败时返回 (None, 错误信息)"""
+    if "data" in result and isinstance(result["data"], list) and result["data"]:
+        url = result["data"][0].get("url")
+        if url:
+            return url, None
+        return None, f"未找到图片URL, 响应数据: {result}"
+    return None, f"响应格式错误: {result}"
+
+def _glm_error(e: Exception) -> str:
+    if isinstance(e, httpx.HTTPError):
         error_msg = f"GLM 绘图请求错误: {str(e)}"
-        print(error_msg)
-        return error_msg
-    except json.JSONDecodeError as e:
+    elif isinstance(e, json.JSONDecodeError):
         error_msg = f"GLM 响应解析错误: {str(e)}"
-        print(error_msg)
+    else:
+        error_msg = f"GLM 绘图其他错误: {str(e)}"
+    logger.error(error_msg)
+    return error_msg
+
+GLM_URL = "https://open.bigmodel.cn/api/paas/v4/images/generations"
+
+def _draw_via_glm(prompt: str, size: str = "square_hd") -> str:
+    """使用智谱 GLM 生成图片"""
+    optimized_prompt = _optimize_prompt(prompt)
+    headers, payload = _glm_request(optimized_prompt, size)
+    try:
+        response = http_client.post(GLM_URL, headers=headers, json=payload, timeout=30)
+        response.raise_for_status()
+        url, error_msg = _glm_image_url(response.json())
+        if url:
+            _save_image(url)
+            return url
         return error_msg
     except Exception as e:
-        error_msg = f"GLM 绘图其他错误: {str(e)}"
-        print(error_msg)
+        return _glm_error(e)
+
+async def _adraw_via_glm(prompt: str, size: str = "square_hd") -> str:
+    optimized_prompt = await _aoptimize_prompt(prompt)
+    headers, payload = _glm_request(optimized_prompt, size)
+    try:
+        response = await http_client.apost(GLM_URL, headers=headers, json=payload, timeout=30)
+        response.raise_for_status()
+        url, error_msg = _glm_image_url(response.json())
+        if url:
+            await _asave_image(url)
+            return url
         return error_msg
+    except Exception as e:
+        return _glm_error(e)
+
+def _image_path() -> Path:
+    filename = f"image_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
+    return temp_server_dir / filename
 
 def _save_image(url: str) -> None:
     """保存图片到临时目录"""
-    filename = f"image_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-    save_path = temp_server_dir / filename
+    save_path = _image_path()
     
     try:
         if url.startswith("data:image"):
             image_data = base64.b64decode(url.split(",")[1])
             save_path.write_bytes(image_data)
         else:
-            response = requests.get(url)
+            response = http_client.get(url)
             response.raise_for_status()
             save_path.write_bytes(response.content)
-        print(f"图像已保存到 {save_path}")
+        logger.info(f"图像已保存到 {save_path}")
+    except Exception as e:
+        logger.error(f"保存图像出错: {e}")
+
+async def _asave_image(url: str) -> None:
+    save_path = _image_path()
+
+    try:
+        if url.startswith("data:image"):
+            image_data = base64.b64decode(url.split(",")[1])
+            await asyncio.to_thread(save_path.write_bytes, image_data)
+        else:
+            response = await http_client.aget(url)
+            response.raise_for_status()
+            # 写文件放到线程中，不阻塞事件循环
+            await asyncio.to_thread(save_path.write_bytes, response.content)
+        logger.info(f"图像已保存到 {save_path}")
     except Exception as e:
-        print(f"保存图像出错: {e}")
+        logger.error(f"保存图像出错: {e}")
 
 
-@tool(parse_docstring=True)
 def create_art(prompt: str, image_size: str = "square_hd", style: str = "any", provider: str = "glm") -> str:
     """Create artwork based on the requirements and return an image link.
 
@@ -163,4 +241,15 @@ def create_art(prompt: str, image_size: str = "square_hd", style: str = "any", p
     else:
         return "不支持的绘图提供商"
 
-tools = [create_art]
\ No newline at end of file
+async def acreate_art(prompt: str, image_size: str = "square_hd", style: str = "any", provider: str = "glm") -> str:
+    """create_art 的异步版本"""
+    if provider == "fal":
+        result = await _adraw_via_fal(prompt, image_size, style)
+        return f"Tool Response: {result}"
+    elif provider == "glm":
+        result = await _adraw_via_glm(prompt, image_size)
+        return f"Tool Response: {result}"
+    else:
+        return "不支持的绘图提供商"
+
+tools = [StructuredTool.from_function(func=create_art, coroutine=acreate_art, parse_docstring=True)]
\ No newline at end of file
@@ -2,7 +2,7 @@ from langchain_core.prompts import ChatPromptTemplate
 from typing import Any, Optional, List, Dict
 from langchain_core.language_models import LanguageModelInput
 from langchain_openai import ChatOpenAI
-from langchain_core.tools import tool
+from langchain_core.tools import StructuredTool
 from .config import config
 import datetime
 import pytz
@@ -171,13 +171,8 @@ def _get_current_time_info():
     return lunar_time, gregorian_time, sizhu_cn, upper_trigram_number, lower_trigram_number, moving_yao_number, shanggua_name, xiagua_name
 
 
-@tool(parse_docstring=True)
-def divination(query: str) -> str:
-    """Plum Blossom Numerology Divination, Fortune Telling, and so on
-
-    Args:
-        query: Divination content and related information
-    """
+def _divination_prompt(query: str):
+    """按当前时间起卦，生成算卦的提示词"""
     lunar_time, gregorian_time, sizhu_cn, upper_trigram_number, lower_trigram_number, moving_yao_number, shanggua_name, xiagua_name = _get_current_time_info()
     
     system_prompt = f"""## 角色设定
@@ -336,13 +331,26 @@ def divination(query: str) -> str:
          [("system", system_prompt), ("user", "{query}")]
     )
     
-    prompt = messages.invoke({"query": query})
-    response = llm.invoke(prompt)
-    
+    return messages.invoke({"query": query})
+
+
+def divination(query: str) -> str:
+    """Plum Blossom Numerology Divination, Fortune Telling, and so on
+
+    Args:
+        query: Divination content and related information
+    """
+    response = llm.invoke(_divination_prompt(query))
+    return response.content
+
+
+async def adivination(query: str) -> str:
+    """divination 的异步版本"""
+    response = await llm.ainvoke(_divination_prompt(query))
     return response.content
 
 
-tools = [divination]
+tools = [StructuredTool.from_function(func=divination, coroutine=adivination, parse_docstring=True)]
 
 
 
@@ -1,45 +1,61 @@
-import requests
+import httpx
 from pyquery import PyQuery as pq
 import datetime
-from langchain_core.tools import tool
+from langchain_core.tools import StructuredTool, ToolException
+from . import http_client
+
+URL = 'https://github.com/trending'
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.7; rv:11.0) Gecko/20100101 Firefox/11.0',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Encoding': 'gzip,deflate',
+    'Accept-Language': 'zh-CN,zh;q=0.8'
+}
+
+def _parse_trending(content: bytes) -> str:
+    doc = pq(content)
+    items = doc('div.Box article.Box-row')
+
+    current_date = datetime.datetime.now().strftime('%Y-%m-%d')
+    trending_content = f"## {current_date}\n"
+
+    for item in items:
+        item_pq = pq(item)
+        title = item_pq(".lh-condensed a").text()
+        description = item_pq("p.col-9").text()
+        relative_url = item_pq(".lh-condensed a").attr("href")
+        absolute_url = f"https://github.com{relative_url}"
+
+        trending_content += f"* [{title}]({absolute_url}): {description}\n"
+
+    return trending_content
 
-@tool(parse_docstring=True)
 def get_github_trending() -> str:
     """Fetch the GitHub Trending page and return the content as a Markdown formatted list."""
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.7; rv:11.0) Gecko/20100101 Firefox/11.0',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Encoding': 'gzip,deflate,sdch',
-            'Accept-Language': 'zh-CN,zh;q=0.8'
-        }
-
-        url = 'https://github.com/trending'
-        response = requests.get(url, headers=headers)
+        response = http_client.get(URL, headers=HEADERS)
         response.raise_for_status()
+        return _parse_trending(response.content)
 
-        doc = pq(response.content)
-        items = doc('div.Box article.Box-row')
-
-        current_date = datetime.datetime.now().strftime('%Y-%m-%d')
-        trending_content = f"## {current_date}\n"
-
-        for item in items:
-            item_pq = pq(item)
-            title = item_pq(".lh-condensed a").text()
-            description = item_pq("p.col-9").text()
-            relative_url = item_pq(".lh-condensed a").attr("href")
-            absolute_url = f"https://github.com{relative_url}"
-
-            trending_content += f"* [{title}]({absolute_url}): {description}\n"
+    except httpx.HTTPError as e:
+        error_message = f"网络请求出错了: {e}"
+        raise ToolException(error_message)
+    except Exception as e:
+        error_message = f"抓取 GitHub Trending 时发生了未知错误: {e}"
+        raise ToolException(error_message)
 
-        return trending_content
+async def aget_github_trending() -> str:
+    """get_github_trending 的异步版本"""
+    try:
+        response = await http_client.aget(URL, headers=HEADERS)
+        response.raise_for_status()
+        return _parse_trending(response.content)
 
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         error_message = f"网络请求出错了: {e}"
-        return error_message
+        raise ToolException(error_message)
     except Exception as e:
         error_message = f"抓取 GitHub Trending 时发生了未知错误: {e}"
-        return error_message
+        raise ToolException(error_message)
     
-tools = [get_github_trending]
\ No newline at end of file
+tools = [StructuredTool.from_function(func=get_github_trending, coroutine=aget_github_trending, parse_docstring=True, handle_tool_error=True)]
\ No newline at end of file
@@ -1,6 +1,7 @@
 import datetime
 import pytz
 from langchain_core.tools import tool
+from loguru import logger
 
 @tool(parse_docstring=True)
 def get_time(timezone: str, format: str = "%Y-%m-%d %H:%M:%S") -> str:
@@ -15,7 +16,7 @@ def get_time(timezone: str, format: str = "%Y-%m-%d %H:%M:%S") -> str:
         now = datetime.datetime.now(tz)
         return now.strftime(format)
     except pytz.exceptions.UnknownTimeZoneError:
-        print(f"警告：无效的时区名称 '{timezone}'，将使用 UTC 时间。")
+        logger.warning(f"警告：无效的时区名称 '{timezone}'，将使用 UTC 时间。")
         tz = pytz.timezone("UTC")
         now = datetime.datetime.now(tz)
         return now.strftime(format)
@@ -1,35 +1,15 @@
 import os
-import requests
 from datetime import datetime
-from langchain_core.tools import tool
+from langchain_core.tools import StructuredTool
 from .config import config
+from . import http_client
 import pytz
 
 weather_config = config.get('openweather', {})
 os.environ["OPENWEATHER_API_KEY"] = weather_config.get('api_key', '')
 
-@tool(parse_docstring=True)
-def get_weather_data(location: str, country_code: str, query_time: str = None, query_type: str = 'current') -> str:
-    """Retrieve weather data for a specific location and time.
-
-    Args:
-        location: City name or a municipality/sub-provincial city in China. e.g., Chengdu, Beijing, Shanghai.
-        country_code: The ISO 3166 country code for the location. e.g., CN.
-        query_time: The time for which to retrieve weather data, in "YYYY-MM-DD HH:MM:SS" format. Optional.
-        query_type: The type of weather data to retrieve. Options include "current" (current), "today" (today), "hourly" (hourly), "daily" (daily). "daily" can query the weather for each day of the week. Optional.
-    """
-    api_key = os.environ.get('OPENWEATHER_API_KEY')
-
-    if not api_key:
-        return "API key not found. Please set the OPENWEATHER_API_KEY environment variable."
-
-    geo_url = f'http://api.openweathermap.org/geo/1.0/direct?q={location},{country_code}&appid={api_key}'
-    geo_response = requests.get(geo_url)
-    geo_data = geo_response.json()
-
-    if not geo_data:
-        return "Location not found."
-
+def _weather_url(geo_data, api_key: str, query_time: str = None, query_type: str = 'current') -> str:
+    """根据地理编码结果拼接天气查询地址"""
     lat = geo_data[0]['lat']
     lon = geo_data[0]['lon']
 
@@ -45,13 +25,11 @@ def get_weather_data(location: str, country_code: str, query_time: str = None, q
 
     if query_time:
         query_timestamp = int(datetime.strptime(query_time, '%Y-%m-%d %H:%M:%S').timestamp())
-        weather_url = f'https://api.openweathermap.org/data/3.0/onecall/timemachine?lat={lat}&lon={lon}&dt={query_timestamp}&appid={api_key}&units=metric'
-    else:
-        weather_url = f'https://api.openweathermap.org/data/3.0/onecall?lat={lat}&lon={lon}&exclude={exclude_param}&appid={api_key}&units=metric'
-
-    weather_response = requests.get(weather_url)
-    weather_data = weather_response.json()
+        return f'https://api.openweathermap.org/data/3.0/onecall/timemachine?lat={lat}&lon={lon}&dt={query_timestamp}&appid={api_key}&units=metric'
+    return f'https://api.openweathermap.org/data/3.0/onecall?lat={lat}&lon={lon}&exclude={exclude_param}&appid={api_key}&units=metric'
 
+def _format_weather(weather_data):
+    """把天气数据中的时间戳转换为当地时间"""
     def format_timestamp(timestamp, timezone_str):
       """格式化时间戳为指定时区的日期时间字符串。"""
       try:
@@ -91,4 +69,43 @@ def get_weather_data(location: str, country_code: str, query_time: str = None, q
         'weather_data': weather_data
     }
 
-tools = [get_weather_data]
\ No newline at end of file
+def get_weather_data(location: str, country_code: str, query_time: str = None, query_type: str = 'current') -> str:
+    """Retrieve weather data for a specific location and time.
+
+    Args:
+        location: City name or a municipality/sub-provincial city in China. e.g., Chengdu, Beijing, Shanghai.
+        country_code: The ISO 3166 country code for the location. e.g., CN.
+        query_time: The time for which to retrieve weather data, in "YYYY-MM-DD HH:MM:SS" format. Optional.
+        query_type: The type of weather data to retrieve. Options include "current" (current), "today" (today), "hourly" (hourly), "daily" (daily). "daily" can query the weather for each day of the week. Optional.
+    """
+    api_key = os.environ.get('OPENWEATHER_API_KEY')
+
+    if not api_key:
+        return "API key not found. Please set the OPENWEATHER_API_KEY environment variable."
+
+    geo_url = f'http://api.openweathermap.org/geo/1.0/direct?q={location},{country_code}&appid={api_key}'
+    geo_data = http_client.get(geo_url).json()
+
+    if not geo_data:
+        return "Location not found."
+
+    weather_response = http_client.get(_weather_url(geo_data, api_key, query_time, query_type))
+    return _format_weather(weather_response.json())
+
+async def aget_weather_data(location: str, country_code: str, query_time: str = None, query_type: str = 'current') -> str:
+    """get_weather_data 的异步版本"""
+    api_key = os.environ.get('OPENWEATHER_API_KEY')
+
+    if not api_key:
+        return "API key not found. Please set the OPENWEATHER_API_KEY environment variable."
+
+    geo_url = f'http://api.openweathermap.org/geo/1.0/direct?q={location},{country_code}&appid={api_key}'
+    geo_data = (await http_client.aget(geo_url)).json()
+
+    if not geo_data:
+        return "Location not found."
+
+    weather_response = await http_client.aget(_weather_url(geo_data, api_key, query_time, query_type))
+    return _format_weather(weather_response.json())
+
+tools = [StructuredTool.from_function(func=get_weather_data, coroutine=aget_weather_data, parse_docstring=True)]
\ No newline at end of file
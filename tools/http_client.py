@@ -0,0 +1,109 @@
+# tools/http_client.py
+# 工具共用的 HTTP 客户端：连接池复用 keep-alive 连接，统一超时，并限制对同一主机的并发连接数
+import asyncio
+import threading
+from typing import Dict
+
+import httpx
+from loguru import logger
+
+from .config import config
+
+http_config = config.get("http", {})
+
+TIMEOUT = httpx.Timeout(
+    http_config.get("timeout", 30),
+    connect=http_config.get("connect_timeout", 10),
+)
+LIMITS = httpx.Limits(
+    max_connections=http_config.get("max_connections", 100),
+    max_keepalive_connections=http_config.get("max_keepalive_connections", 20),
+    keepalive_expiry=http_config.get("keepalive_expiry", 30),
+)
+# 同一主机同时进行的请求数上限
+MAX_PER_HOST = http_config.get("max_per_host", 10)
+
+# requests 默认会跟随重定向，部分工具依赖重定向后的地址
+_client_options = dict(timeout=TIMEOUT, limits=LIMITS, follow_redirects=True)
+
+_lock = threading.Lock()
+_client = None
+_async_clients: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+_host_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+_async_host_semaphores: Dict[tuple, asyncio.Semaphore] = {}
+
+
+def get_client() -> httpx.Client:
+    """同步客户端，线程池中的同步工具共用"""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = httpx.Client(**_client_options)
+    return _client
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """异步客户端，按事件循环各建一个(连接不能跨事件循环使用)"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = httpx.AsyncClient(**_client_options)
+    return client
+
+
+def _host_semaphore(url: str) -> threading.BoundedSemaphore:
+    host = httpx.URL(url).host
+    semaphore = _host_semaphores.get(host)
+    if semaphore is None:
+        with _lock:
+            semaphore = _host_semaphores.setdefault(host, threading.BoundedSemaphore(MAX_PER_HOST))
+    return semaphore
+
+
+def _async_host_semaphore(url: str) -> asyncio.Semaphore:
+    key = (asyncio.get_running_loop(), httpx.URL(url).host)
+    semaphore = _async_host_semaphores.get(key)
+    if semaphore is None:
+        semaphore = _async_host_semaphores[key] = asyncio.Semaphore(MAX_PER_HOST)
+    return semaphore
+
+
+def request(method: str, url: str, **kwargs) -> httpx.Response:
+    with _host_semaphore(url):
+        return get_client().request(method, url, **kwargs)
+
+
+async def arequest(method: str, url: str, **kwargs) -> httpx.Response:
+    async with _async_host_semaphore(url):
+        return await get_async_client().request(method, url, **kwargs)
+
+
+def get(url: str, **kwargs) -> httpx.Response:
+    return request("GET", url, **kwargs)
+
+
+async def aget(url: str, **kwargs) -> httpx.Response:
+    return await arequest("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> httpx.Response:
+    return request("POST", url, **kwargs)
+
+
+async def apost(url: str, **kwargs) -> httpx.Response:
+    return await arequest("POST", url, **kwargs)
+
+
+async def aclose() -> None:
+    """关闭所有客户端的连接池"""
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+    for loop, client in list(_async_clients.items()):
+        if loop is asyncio.get_running_loop():
+            await client.aclose()
+        del _async_clients[loop]
+    _async_host_semaphores.clear()
+    logger.debug("工具 HTTP 连接池已关闭")
@@ -1,19 +1,21 @@
-import requests
-from langchain_core.tools import tool
+import httpx
+from langchain_core.tools import StructuredTool, ToolException
 from .config import config
+from . import http_client
 
 jina_api_key = config.get('jina', {}).get('api_key', '')
 top_n = config.get('jina', {}).get('top_n', 5)
 min_length = config.get('jina', {}).get('min_length', 10)
 
-@tool(parse_docstring=True)
-def jina_reader(url: str) -> str:
-    """Get URL Content.
-    
-    Args:
-        url: The URL whose content needs to be fetched
-    """
+def _format_result(response) -> str:
+    lines = response.text.splitlines()
+    filtered_lines = [line for line in lines if len(line.strip()) >= min_length]
+    truncated_lines = filtered_lines[:top_n]
+    result = '\n'.join(truncated_lines)
+
+    return f"tool result: {result}"
 
+def _build_request(url: str):
     url = f'https://r.jina.ai/{url}'
     headers = {
         "X-Retain-Images": "none"
@@ -21,21 +23,35 @@ def jina_reader(url: str) -> str:
 
     if jina_api_key:
         headers["Authorization"] = f"Bearer {jina_api_key}"
+    return url, headers
 
+def jina_reader(url: str) -> str:
+    """Get URL Content.
+    
+    Args:
+        url: The URL whose content needs to be fetched
+    """
+    url, headers = _build_request(url)
     try:
-        response = requests.get(url, headers=headers, timeout=20)
+        response = http_client.get(url, headers=headers, timeout=20)
         response.raise_for_status()
+        return _format_result(response)
+    except httpx.TimeoutException:
+        raise ToolException("内容过多，返回失败")
+    except httpx.HTTPError:
+        raise ToolException("未知错误")
+
+async def ajina_reader(url: str) -> str:
+    """jina_reader 的异步版本"""
+    url, headers = _build_request(url)
+    try:
+        response = await http_client.aget(url, headers=headers, timeout=20)
+        response.raise_for_status()
+        return _format_result(response)
+    except httpx.TimeoutException:
+        raise ToolException("内容过多，返回失败")
+    except httpx.HTTPError:
+        raise ToolException("未知错误")
 
-        lines = response.text.splitlines()
-        filtered_lines = [line for line in lines if len(line.strip()) >= min_length]
-        truncated_lines = filtered_lines[:top_n]
-        result = '\n'.join(truncated_lines)
-
-        return f"tool result: {result}"
-    except requests.exceptions.Timeout:
-        return "内容过多，返回失败"
-    except requests.exceptions.RequestException:
-        return "未知错误"
-
-tools = [jina_reader]
+tools = [StructuredTool.from_function(func=jina_reader, coroutine=ajina_reader, parse_docstring=True, handle_tool_error=True)]
 
@@ -1,18 +1,21 @@
-import requests
-from langchain_core.tools import tool
+import httpx
+from langchain_core.tools import StructuredTool, ToolException
 from .config import config
+from . import http_client
 
 jina_api_key = config.get('jina', {}).get('api_key', '')
 top_n = config.get('jina', {}).get('top_n', 5)
 min_length = config.get('jina', {}).get('min_length', 10)
 
-@tool(parse_docstring=True)
-def jina_search(query: str) -> str:
-    """Query in the search engine
-    
-    Args:
-        query: The content to query/search for/look up/inquire about
-    """
+def _format_result(response) -> str:
+    lines = response.text.splitlines()
+    filtered_lines = [line for line in lines if len(line.strip()) >= min_length]
+    truncated_lines = filtered_lines[:top_n]
+    result = '\n'.join(truncated_lines)
+
+    return f"tool result: {result}"
+
+def _build_request(query: str):
     url = f'https://s.jina.ai/{query}'
     headers = {
         'X-Retain-Images': 'none'
@@ -20,20 +23,34 @@ def jina_search(query: str) -> str:
     
     if jina_api_key:
         headers['Authorization'] = f'Bearer {jina_api_key}'
+    return url, headers
 
+def jina_search(query: str) -> str:
+    """Query in the search engine
+    
+    Args:
+        query: The content to query/search for/look up/inquire about
+    """
+    url, headers = _build_request(query)
     try:
-        response = requests.get(url, headers=headers, timeout=30)
+        response = http_client.get(url, headers=headers, timeout=30)
         response.raise_for_status()
+        return _format_result(response)
+    except httpx.TimeoutException:
+        raise ToolException("搜索超时")
+    except httpx.HTTPError:
+        raise ToolException("搜索失败")
 
-        lines = response.text.splitlines()
-        filtered_lines = [line for line in lines if len(line.strip()) >= min_length]
-        truncated_lines = filtered_lines[:top_n]
-        result = '\n'.join(truncated_lines)
-
-        return f"tool result: {result}"
-    except requests.exceptions.Timeout:
-        return "搜索超时"
-    except requests.exceptions.RequestException:
-        return "搜索失败"
+async def ajina_search(query: str) -> str:
+    """jina_search 的异步版本"""
+    url, headers = _build_request(query)
+    try:
+        response = await http_client.aget(url, headers=headers, timeout=30)
+        response.raise_for_status()
+        return _format_result(response)
+    except httpx.TimeoutException:
+        raise ToolException("搜索超时")
+    except httpx.HTTPError:
+        raise ToolException("搜索失败")
 
-tools = [jina_search]
\ No newline at end of file
+tools = [StructuredTool.from_function(func=jina_search, coroutine=ajina_search, parse_docstring=True, handle_tool_error=True)]
\ No newline at end of file
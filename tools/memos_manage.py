@@ -1,6 +1,7 @@
 from .config import config
-from langchain_core.tools import tool
-import requests
+from langchain_core.tools import StructuredTool
+from . import http_client
+from loguru import logger
 
 def _get_headers(memos_config):
     """获取 HTTP 请求头."""
@@ -12,17 +13,15 @@ def _get_headers(memos_config):
         headers["Authorization"] = f"Bearer {auth_token}"
     return headers
 
-def _create_memo(base_url, headers, content, visibility, user_name=None):
-    """创建备忘录."""
-    url = f"{base_url}/api/v1/memos"
-    
+def _create_payload(content, visibility, user_name=None):
     formatted_content = f"{user_name}: {content}" if user_name else content
     
-    payload = {
+    return {
         "content": formatted_content,
         "visibility": visibility,
     }
-    response = requests.post(url, headers=headers, json=payload)
+
+def _create_result(response):
     if (response.status_code == 200):
         data = response.json()
         return {
@@ -33,19 +32,19 @@ def _create_memo(base_url, headers, content, visibility, user_name=None):
     else:
         return {"error": f"Create failed: {response.text}"}
 
-def _search_memos(base_url, headers, page_size, user_id=None, search_keyword=None, limit=None, user_name=None):
-    """检索备忘录."""
+def _create_memo(base_url, headers, content, visibility, user_name=None):
+    """创建备忘录."""
     url = f"{base_url}/api/v1/memos"
-    params = {
-        "pageSize": page_size,
-    }
-    if (user_id):
-        params["filter"] = f"creator == 'users/{user_id}'"
+    response = http_client.post(url, headers=headers, json=_create_payload(content, visibility, user_name))
+    return _create_result(response)
 
-    # 使用传入的limit，如果没有则使用page_size
-    result_limit = limit if limit else page_size
-    
-    # 合并所有搜索关键词
+async def _acreate_memo(base_url, headers, content, visibility, user_name=None):
+    url = f"{base_url}/api/v1/memos"
+    response = await http_client.apost(url, headers=headers, json=_create_payload(content, visibility, user_name))
+    return _create_result(response)
+
+def _search_terms(search_keyword=None, user_name=None):
+    """合并所有搜索关键词"""
     search_terms = []
     
     # 处理search_keyword
@@ -65,58 +64,117 @@ def _search_memos(base_url, headers, page_size, user_id=None, search_keyword=Non
             search_terms.extend(user_name)
         else:
             search_terms.append(str(user_name))
-            
-    if not search_terms:
-        # 无搜索关键词时的逻辑保持不变
-        response = requests.get(url, headers=headers, params=params)
-        if (response.status_code == 200):
-            data = response.json()
-            if ("memos" in data):
-                filtered_memos = [{
-                    "name": memo["name"],
-                    "updateTime": memo["updateTime"].replace("T", " ").replace("Z", ""),
-                    "content": memo["content"]
-                } for memo in data["memos"]]
-                return {"memos": filtered_memos}
-            else:
-                print("No memos found.")
-                return {"memos": []}
+    return search_terms
+
+def _search_params(page_size, user_id=None):
+    params = {
+        "pageSize": page_size,
+    }
+    if (user_id):
+        params["filter"] = f"creator == 'users/{user_id}'"
+    return params
+
+def _latest_memos(response):
+    """无搜索关键词时返回最新的备忘录"""
+    if (response.status_code == 200):
+        data = response.json()
+        if ("memos" in data):
+            filtered_memos = [{
+                "name": memo["name"],
+                "updateTime": memo["updateTime"].replace("T", " ").replace("Z", ""),
+                "content": memo["content"]
+            } for memo in data["memos"]]
+            return {"memos": filtered_memos}
         else:
-            return {"error": f"Search failed: {response.text}"}
+            logger.debug("No memos found.")
+            return {"memos": []}
     else:
-        combined_memos = []
-        for kw in search_terms:
-            all_memos = []
-            page_token = None
-            while True:
-                response = requests.get(url, headers=headers, params=params)
-                if (response.status_code == 200):
-                    data = response.json()
-                    if ("memos" in data):
-                        for memo in data["memos"]:
-                            if (kw.lower() in memo.get("content", "").lower()):
-                                all_memos.append(memo)
-
-                    page_token = data.get("nextPageToken")
-                    if (not page_token):
-                        break
-                    params["pageToken"] = page_token
-                else:
-                    return {"error": f"Search failed: {response.text}"}
-
-            for memo in all_memos:
-                # 修改添加到combined_memos的数据结构
-                combined_memos.append({
-                    "name": memo["name"],
-                    "updateTime": memo["updateTime"].replace("T", " ").replace("Z", ""),
-                    "content": memo["content"].replace(
-                        kw, f"\033[91m{kw}\033[0m"
-                    )
-                })
-        # 去重并只取指定数量
-        unique_memos = {m["name"]: m for m in combined_memos}
-        result_list = list(unique_memos.values())[:result_limit]
-        return {"memos": result_list}
+        return {"error": f"Search failed: {response.text}"}
+
+def _match_page(data, kw, all_memos):
+    """收集一页中包含关键词的备忘录，返回下一页的 token"""
+    if ("memos" in data):
+        for memo in data["memos"]:
+            if (kw.lower() in memo.get("content", "").lower()):
+                all_memos.append(memo)
+    return data.get("nextPageToken")
+
+def _highlight(all_memos, kw):
+    return [{
+        "name": memo["name"],
+        "updateTime": memo["updateTime"].replace("T", " ").replace("Z", ""),
+        "content": memo["content"].replace(
+            kw, f"\033[91m{kw}\033[0m"
+        )
+    } for memo in all_memos]
+
+def _unique_memos(combined_memos, result_limit):
+    # 去重并只取指定数量
+    unique_memos = {m["name"]: m for m in combined_memos}
+    result_list = list(unique_memos.values())[:result_limit]
+    return {"memos": result_list}
+
+def _search_memos(base_url, headers, page_size, user_id=None, search_keyword=None, limit=None, user_name=None):
+    """检索备忘录."""
+    url = f"{base_url}/api/v1/memos"
+    params = _search_params(page_size, user_id)
+    # 使用传入的limit，如果没有则使用page_size
+    result_limit = limit if limit else page_size
+    search_terms = _search_terms(search_keyword, user_name)
+            
+    if not search_terms:
+        return _latest_memos(http_client.get(url, headers=headers, params=params))
+    combined_memos = []
+    for kw in search_terms:
+        all_memos = []
+        while True:
+            response = http_client.get(url, headers=headers, params=params)
+            if (response.status_code != 200):
+                return {"error": f"Search failed: {response.text}"}
+            page_token = _match_page(response.json(), kw, all_memos)
+            if (not page_token):
+                break
+            params["pageToken"] = page_token
+        combined_memos.extend(_highlight(all_memos, kw))
+    return _unique_memos(combined_memos, result_limit)
+
+async def _asearch_memos(base_url, headers, page_size, user_id=None, search_keyword=None, limit=None, user_name=None):
+    url = f"{base_url}/api/v1/memos"
+    params = _search_params(page_size, user_id)
+    result_limit = limit if limit else page_size
+    search_terms = _search_terms(search_keyword, user_name)
+
+    if not search_terms:
+        return _latest_memos(await http_client.aget(url, headers=headers, params=params))
+    combined_memos = []
+    for kw in search_terms:
+        all_memos = []
+        while True:
+            response = await http_client.aget(url, headers=headers, params=params)
+            if (response.status_code != 200):
+                return {"error": f"Search failed: {response.text}"}
+            page_token = _match_page(response.json(), kw, all_memos)
+            if (not page_token):
+                break
+            params["pageToken"] = page_token
+        combined_memos.extend(_highlight(all_memos, kw))
+    return _unique_memos(combined_memos, result_limit)
+
+def _memo_ids(memo_ids):
+    # 将输入统一转换为列表
+    if isinstance(memo_ids, str):
+        # 支持逗号分隔的字符串
+        return [id.strip() for id in memo_ids.split(',')]
+    elif isinstance(memo_ids, list):
+        return memo_ids
+    return [str(memo_ids)]
+
+def _delete_result(memo_id, response):
+    return {
+        "id": memo_id,
+        "status": "success" if response.status_code == 200 else "failed",
+        "message": "Delete successful." if response.status_code == 200 else f"Delete failed: {response.text}"
+    }
 
 def _delete_memo(base_url, headers, memo_ids):
     """删除备忘录.
@@ -127,31 +185,63 @@ def _delete_memo(base_url, headers, memo_ids):
     if not memo_ids:
         return {"error": "Memo not found."}
     
-    # 将输入统一转换为列表
-    if isinstance(memo_ids, str):
-        # 支持逗号分隔的字符串
-        ids = [id.strip() for id in memo_ids.split(',')]
-    elif isinstance(memo_ids, list):
-        ids = memo_ids
-    else:
-        ids = [str(memo_ids)]
-    
     results = []
-    for memo_id in ids:
-        memo_name = f"memos/{memo_id}"
-        url = f"{base_url}/api/v1/{memo_name}"
-        response = requests.delete(url, headers=headers)
-        results.append({
-            "id": memo_id,
-            "status": "success" if response.status_code == 200 else "failed",
-            "message": "Delete successful." if response.status_code == 200 else f"Delete failed: {response.text}"
-        })
+    for memo_id in _memo_ids(memo_ids):
+        url = f"{base_url}/api/v1/memos/{memo_id}"
+        response = http_client.request("DELETE", url, headers=headers)
+        results.append(_delete_result(memo_id, response))
     
     return {"results": results}
 
+async def _adelete_memo(base_url, headers, memo_ids):
+    if not memo_ids:
+        return {"error": "Memo not found."}
+
+    results = []
+    for memo_id in _memo_ids(memo_ids):
+        url = f"{base_url}/api/v1/memos/{memo_id}"
+        response = await http_client.arequest("DELETE", url, headers=headers)
+        results.append(_delete_result(memo_id, response))
+
+    return {"results": results}
+
 memos_config = config.get("memos", {})
 
-@tool(parse_docstring=True)
+def _prepare(operation, create_content=None, delete_id=None):
+    """检查配置和参数，返回 (错误, 请求参数)"""
+    global memos_config
+    if (memos_config is None):
+        memos_config = {}
+
+    base_url = memos_config.get("url")
+    if (not base_url):
+        return {"error": "Missing 'url' in memos_config."}, None
+
+    if (operation == "create"):
+        if (not create_content):
+            return {"error": "Missing 'create_content' for create operation."}, None
+    elif (operation == "delete"):
+        if (not delete_id):
+            return {"error": "Missing 'delete_id' for delete operation."}, None
+    elif (operation != "search"):
+        return {"error": f"Invalid operation: {operation}"}, None
+
+    return None, {
+        "base_url": base_url,
+        "headers": _get_headers(memos_config),
+        "visibility": memos_config.get("default_visibility", "PRIVATE"),
+        "page_size": memos_config.get("page_size", 10),
+        "user_id": memos_config.get("user_id"),
+    }
+
+def _split_contents(create_content):
+    MEMO_SEPARATOR = "###%%&"
+    if isinstance(create_content, str):
+        return [cnt.strip() for cnt in create_content.split(MEMO_SEPARATOR) if cnt.strip()]
+    elif isinstance(create_content, list):
+        return create_content
+    return [str(create_content)]
+
 def memos_manage(operation: str, create_content: str = None, search_keyword: str = None, 
                 delete_id: str = None, limit: int = None, user_name: str = None) -> str:
     """Create, retrieve, and delete memos, operate on memos, and use memos.
@@ -164,49 +254,45 @@ def memos_manage(operation: str, create_content: str = None, search_keyword: str
         limit: Limits the number of search results (only used when the operation is "search"). Optional.
         user_name: When the operation is "create", it is added as a prefix to the content; when the operation is "search", it is used as a search keyword. Optional.
     """
-    global memos_config
-    if (memos_config is None):
-        memos_config = {}
-
-    base_url = memos_config.get("url")
-    default_visibility = memos_config.get("default_visibility", "PRIVATE")
-    default_page_size = memos_config.get("page_size", 10)
-    user_id = memos_config.get("user_id")
-
-    if (not base_url):
-        return {"error": "Missing 'url' in memos_config."}
-
-    headers = _get_headers(memos_config)
+    error, options = _prepare(operation, create_content, delete_id)
+    if error:
+        return error
+    base_url, headers = options["base_url"], options["headers"]
 
     if (operation == "create"):
-        if (not create_content):
-            return {"error": "Missing 'create_content' for create operation."}
-        MEMO_SEPARATOR = "###%%&"
-        if isinstance(create_content, str):
-            contents_list = [cnt.strip() for cnt in create_content.split(MEMO_SEPARATOR) if cnt.strip()]
-        elif isinstance(create_content, list):
-            contents_list = create_content
-        else:
-            contents_list = [str(create_content)]
-
         results = []
-        for cnt in contents_list:
-            create_result = _create_memo(base_url, headers, cnt, default_visibility, user_name)
+        for cnt in _split_contents(create_content):
+            create_result = _create_memo(base_url, headers, cnt, options["visibility"], user_name)
             results.append(create_result)
         return {"results": results}
 
     elif (operation == "search"):
-        return _search_memos(base_url, headers, default_page_size, user_id, search_keyword, limit, user_name)
+        return _search_memos(base_url, headers, options["page_size"], options["user_id"], search_keyword, limit, user_name)
 
-    elif (operation == "delete"):
-        if (not delete_id):
-            return {"error": "Missing 'delete_id' for delete operation."}
+    else:
         return _delete_memo(base_url, headers, delete_id)
 
+async def amemos_manage(operation: str, create_content: str = None, search_keyword: str = None,
+                delete_id: str = None, limit: int = None, user_name: str = None) -> str:
+    """memos_manage 的异步版本"""
+    error, options = _prepare(operation, create_content, delete_id)
+    if error:
+        return error
+    base_url, headers = options["base_url"], options["headers"]
+
+    if (operation == "create"):
+        results = []
+        for cnt in _split_contents(create_content):
+            results.append(await _acreate_memo(base_url, headers, cnt, options["visibility"], user_name))
+        return {"results": results}
+
+    elif (operation == "search"):
+        return await _asearch_memos(base_url, headers, options["page_size"], options["user_id"], search_keyword, limit, user_name)
+
     else:
-        return {"error": f"Invalid operation: {operation}"}
+        return await _adelete_memo(base_url, headers, delete_id)
 
-tools = [memos_manage]
+tools = [StructuredTool.from_function(func=memos_manage, coroutine=amemos_manage, parse_docstring=True)]
 
 # 创建备忘录
 # create_result = memos("create", create_content="今天我最喜欢小猫")
@@ -1,6 +1,7 @@
 import toml
 from pathlib import Path
 from typing import Dict
+from loguru import logger
 
 def load_toml_data(folder_name: str) -> Dict[str, Dict]:
     """
@@ -10,7 +11,7 @@ def load_toml_data(folder_name: str) -> Dict[str, Dict]:
     all_data: Dict[str, Dict] = {}
 
     if not data_folder.exists():
-        print(f"错误：文件夹 '{data_folder}' 不存在。")
+        logger.error(f"错误：文件夹 '{data_folder}' 不存在。")
         return all_data
 
     for file_path in data_folder.glob("*.toml"):
@@ -22,11 +23,11 @@ def load_toml_data(folder_name: str) -> Dict[str, Dict]:
                 if variable_name in data:
                     all_data[variable_name] = data[variable_name]
                 else:
-                    print(f"警告：变量 '{variable_name}' 在文件 '{file_path.name}' 中未找到，已跳过。")
+                    logger.warning(f"警告：变量 '{variable_name}' 在文件 '{file_path.name}' 中未找到，已跳过。")
         except toml.TomlDecodeError as e:
-            print(f"错误：文件 '{file_path.name}' 不是有效的 TOML 文件 - {e}")
+            logger.error(f"错误：文件 '{file_path.name}' 不是有效的 TOML 文件 - {e}")
         except Exception as e:
-            print(f"处理文件 '{file_path.name}' 时发生意外错误：{e}")
+            logger.error(f"处理文件 '{file_path.name}' 时发生意外错误：{e}")
 
     return all_data
 
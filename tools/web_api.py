@@ -1,12 +1,53 @@
 # tools/web_api.py
-import requests
-from langchain_core.tools import tool
+from langchain_core.tools import StructuredTool
 from .config import config
+from . import http_client
 import os
 import re
+from loguru import logger
+
+# 短视频类型 -> 接口地址
+VIDEO_APIS = {
+    "玉足": "https://api.yuafeng.cn/API/ly/yzxl.php",
+    "纯情女高": "https://api.yuafeng.cn/API/ly/cqng.php",
+    "蛇姐": "https://api.yuafeng.cn/API/ly/sjxl.php",
+}
+DEFAULT_VIDEO_API = "http://tucdn.wpon.cn/api-girl/index.php?wpon=url"
+
+
+def _request_url(webside, music, video, select_api):
+    """根据选择的功能返回要请求的地址，不支持的功能返回 None"""
+    if select_api == "短视频":
+        return VIDEO_APIS.get(video, DEFAULT_VIDEO_API)
+    elif select_api == "TCPing":
+        return f"https://api.mmp.cc/api/ping?text={webside}"
+    elif select_api == "点歌":
+        return f"https://www.hhlqilongzhu.cn/api/dg_wyymusic.php?gm={music}&n=1&num=1&type=json"
+    return None
+
+
+def _parse_response(response, webside, video, select_api):
+    """从接口响应中提取返回给模型的结果"""
+    if select_api == "短视频":
+        if video in VIDEO_APIS:
+          url = str(response.url)
+        else:
+          url = "https://"+response.text[2:]
+        logger.debug(url)
+        return url
+    elif select_api == "TCPing":
+        logger.debug(response.url)
+        status = response.json()["status"]
+        delay = response.json()["延迟"]
+        IP = response.json()["IP"]
+        IP_addr = response.json()["IP地址"]
+        logger.debug(delay)
+        return f"网站地址:{webside}\n状态:{status}\n延迟:{delay}\nIP:{IP}\nIP的地址:{IP_addr}"
+    else:
+        musci_url = re.search(r"^(https?://[^\s]+?\.mp3)", response.json()["music_url"]).group(0)
+        return musci_url
+
 
-import os
-@tool(parse_docstring=True)
 def web_api(webside:str=None,music:str=None,video:str=None,select_api:str=None) -> str:
     """根据用户请求合理判断并请求相应的api接口然后返回。
     
@@ -21,41 +62,26 @@ def web_api(webside:str=None,music:str=None,video:str=None,select_api:str=None)
       video:str,根据用户选择视频类型,从这[“小姐姐”、“纯情女高”、“蛇姐”、“玉足”]其中选择一个，意思或读音大概即可，都匹配不上就选择“小姐姐”。
     """
     try:
-      if select_api == "短视频":
-          if video == "玉足":
-            response = requests.get("https://api.yuafeng.cn/API/ly/yzxl.php")
-            url = response.url
-          elif video == "纯情女高":
-            response = requests.get("https://api.yuafeng.cn/API/ly/cqng.php")
-            url = response.url
-          elif video == "蛇姐":
-            response = requests.get("https://api.yuafeng.cn/API/ly/sjxl.php")
-            url = response.url
-          else:
-            response = requests.get("http://tucdn.wpon.cn/api-girl/index.php?wpon=url")
-            url = "https://"+response.text[2:]
-          print(url)
-          return url
-      elif select_api == "TCPing":
-          response = requests.get(f"https://api.mmp.cc/api/ping?text={webside}")
-          print(response.url)
-          status = response.json()["status"]
-          delay = response.json()["延迟"]
-          IP = response.json()["IP"]
-          IP_addr = response.json()["IP地址"]
-          print(delay)
-          return f"网站地址:{webside}\n状态:{status}\n延迟:{delay}\nIP:{IP}\nIP的地址:{IP_addr}"
-      elif select_api == "点歌":
-        response = requests.get(f"https://www.hhlqilongzhu.cn/api/dg_wyymusic.php?gm={music}&n=1&num=1&type=json")
-        musci_url = re.search(r"^(https?://[^\s]+?\.mp3)", response.json()["music_url"]).group(0)
-        return musci_url
-      else:
-          return print(f"选择为:{select_api},未能获取请求！")
+      url = _request_url(webside, music, video, select_api)
+      if url is None:
+          logger.warning(f"选择为:{select_api},未能获取请求！")
+          return f"选择为:{select_api},未能获取请求！"
+      return _parse_response(http_client.get(url), webside, video, select_api)
     except Exception as e:
-      print(f"select_api出现错误: {e}")
+      logger.error(f"select_api出现错误: {e}")
       return None
-tools = [web_api]
-
 
 
+async def aweb_api(webside:str=None,music:str=None,video:str=None,select_api:str=None) -> str:
+    """web_api 的异步版本"""
+    try:
+      url = _request_url(webside, music, video, select_api)
+      if url is None:
+          logger.warning(f"选择为:{select_api},未能获取请求！")
+          return f"选择为:{select_api},未能获取请求！"
+      return _parse_response(await http_client.aget(url), webside, video, select_api)
+    except Exception as e:
+      logger.error(f"select_api出现错误: {e}")
+      return None
 
+tools = [StructuredTool.from_function(func=web_api, coroutine=aweb_api, parse_docstring=True)]